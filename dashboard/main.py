@@ -19,16 +19,23 @@ from starlette.requests import Request
 import sys
 sys.path.insert(0, "/opt/zipper/app")
 
-from storage.conversations import list_conversations, get_conversation, create_conversation as create_conv, get_latest_version, get_full_history, delete_conversation
+from storage.conversations import query_conversations, count_conversations, get_conversation, create_conversation as create_conv, get_latest_version, get_full_history, delete_conversation
 from storage.memory import get, set, delete, all as list_all
 from storage.tasks import list_tasks, create_task, update_task_status, patch_task
 from storage.todos import list_todos, add_todo, update_todo
 from llm import run_conversation, client as llm_client, load_system_prompt
+from llm.governor import governor, call as governed_call
 from llm.messages import _sanitize_messages
 from tools import TOOLS
+from utils.http_utils import close_sessions
 
 app = FastAPI(title="Zipper Dashboard", version="0.1")
 
+
+@app.on_event("shutdown")
+async def close_http_sessions():
+    await close_sessions()
+
 USER_NAME = os.environ.get("USER", "You")
 
 # Serve static files (CSS, JS)
@@ -45,16 +52,10 @@ async def index():
 
 
 @app.get("/api/conversations", response_class=HTMLResponse)
-async def list_convos(offset: int = 0):
-    """Return paginated conversation list as HTML (for sidebar)."""
-    conversations = list_conversations()
-    
-    # Sort by updated_at (most recent first)
-    conversations.sort(key=lambda c: c.get("updated_at", c.get("created_at", "")), reverse=True)
-    
-    total = len(conversations)
+async def list_convos(cursor: str = None):
+    """Return one page of the conversation list as HTML (for sidebar)."""
     page_size = 20
-    paginated = conversations[offset : offset + page_size]
+    paginated, next_cursor = query_conversations(limit=page_size, cursor=cursor)
     
     html = '<div class="space-y-0.5" id="conversation-list-items">'
     for convo in paginated:
@@ -84,10 +85,9 @@ async def list_convos(offset: int = 0):
     <button class="conv-delete-btn" onclick="deleteConversation(event, \'{convo_id}\')" title="Delete conversation">×</button>
 </div>'''
 
-    if offset + page_size < total:
-        remaining = total - (offset + page_size)
-        html += f'''<button class="load-more" onclick="loadMoreConversations({offset + page_size})">
-    Load {min(page_size, remaining)} more…
+    if next_cursor:
+        html += f'''<button class="load-more" onclick="loadMoreConversations(\'{escape_html(next_cursor)}\')">
+    Load more…
 </button>'''
 
     html += '</div>'
@@ -394,20 +394,23 @@ async def get_context_length(conversation_id: str):
     # Filter tools to ones the API accepts for counting (exclude code_execution type tool)
     countable_tools = [t for t in TOOLS if t.get("name")]
 
-    try:
-        result = await llm_client.messages.count_tokens(
-            model="claude-sonnet-4-6",
-            system=system,
-            tools=countable_tools,
-            messages=api_messages,
-        )
-        token_count = result.input_tokens
-        estimated = False
-    except Exception:
+    token_count = None
+    if governor.state == "closed":  # don't queue behind an open breaker; the estimate will do
+        try:
+            result = await governed_call(lambda: llm_client.messages.count_tokens(
+                model="claude-sonnet-4-6",
+                system=system,
+                tools=countable_tools,
+                messages=api_messages,
+            ), "claude-sonnet-4-6", lane="interactive", retries=0)
+            token_count = result.input_tokens
+        except Exception:
+            pass
+    estimated = token_count is None
+    if estimated:
         # Fallback: rough char estimate + fixed overhead for system prompt + tools
         total_chars = sum(len(str(m.get("content", ""))) for m in messages_raw)
         token_count = int(total_chars / 3.5) + 2500  # +2500 for system prompt + tool schemas
-        estimated = True
 
     percent = round(token_count / TOKEN_LIMIT * 100, 1)
     return JSONResponse({
@@ -493,14 +496,14 @@ async def _maybe_generate_title(conversation_id: str, first_message: str):
     if meta.get("title", "New Conversation") != "New Conversation":
         return  # already titled
     try:
-        resp = await llm_client.messages.create(
+        resp = await governed_call(lambda: llm_client.messages.create(
             model="claude-haiku-4-5-20251001",
             max_tokens=128,
             messages=[{"role": "user", "content": (
                 f"In one short sentence (max 8 words), give a title for a conversation that starts with this message. "
                 f"Reply with ONLY the title, no quotes, no punctuation at the end.\n\nMessage: {first_message[:400]}"
             )}],
-        )
+        ), "claude-haiku-4-5-20251001", lane="background")
         title = resp.content[0].text.strip().rstrip(".")
         if title:
             from storage.conversations import update_meta
@@ -775,7 +778,7 @@ async def get_stats():
 
     # Conversations
     try:
-        stats["conversations"] = len(list_conversations())
+        stats["conversations"] = count_conversations()
     except Exception:
         stats["conversations"] = 0
 
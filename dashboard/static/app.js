@@ -140,6 +140,19 @@ function fillToolResult(toolUseId, resultText) {
     scrollToBottom();
 }
 
+// Live output from a running tool (bash); replaced by the final result when it arrives
+function appendToolOutput(toolUseId, text) {
+    if (!currentAssistantContent) return;
+    const pre = currentAssistantContent.querySelector(`[data-result-for="${CSS.escape(toolUseId)}"]`);
+    if (!pre || !pre.classList.contains('tool-code-pending')) return;
+    if (!pre.dataset.live) {
+        pre.textContent = '';
+        pre.dataset.live = '1';
+    }
+    pre.textContent = (pre.textContent + text).slice(-20000);
+    pre.scrollTop = pre.scrollHeight;
+}
+
 // Add a complete message bubble
 function addMessage(role, content) {
     const messages = document.getElementById('chat-messages');
@@ -252,6 +265,10 @@ function handleWebSocketMessage(event) {
             fillToolResult(msg.tool_use_id || '', msg.result || '');
             break;
 
+        case 'tool_output':
+            appendToolOutput(msg.tool_use_id || '', msg.text || '');
+            break;
+
         case 'done':
             // Flush any remaining buffered tokens
             if (tokenAnimationFrame !== null) {
@@ -717,19 +734,23 @@ async function createNewConversation() {
 }
 
 // Load more conversations
-async function loadMoreConversations(offset) {
+async function loadMoreConversations(cursor) {
     try {
-        const response = await fetch(`/api/conversations?offset=${offset}`);
+        const response = await fetch(`/api/conversations?cursor=${encodeURIComponent(cursor)}`);
         const html = await response.text();
-        const listContainer = document.getElementById('conversation-list');
-        if (listContainer) {
-            listContainer.innerHTML = html;
-            listContainer.querySelectorAll('a').forEach(link => {
+        const items = document.getElementById('conversation-list-items');
+        if (items) {
+            items.querySelector('.load-more')?.remove();
+            const page = document.createElement('div');
+            page.innerHTML = html;
+            const newItems = page.querySelector('#conversation-list-items');
+            newItems.querySelectorAll('a').forEach(link => {
                 link.addEventListener('click', (e) => {
                     const convoId = link.href.match(/conversation=([^&"]+)/)?.[1];
                     if (convoId) selectConversation(convoId, e);
                 });
             });
+            items.append(...newItems.childNodes);
         }
         if (currentConversationId) markActiveSidebarItem(currentConversationId);
     } catch (err) {
@@ -2,7 +2,6 @@
 
 import asyncio
 import os
-import uuid
 from datetime import datetime
 
 import anthropic
@@ -14,17 +13,21 @@ from storage.conversations import (
     set_system_prompt,
     update_meta,
     get_conversation_thread_id,
+    get_conversation,
 )
 from utils.constants import BOT_URL
-from utils.http_utils import post_json
+from utils.http_utils import post_json_async
 
-client = anthropic.AsyncAnthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
+# no SDK-level retries: llm_loop retries through the shared governor (llm/governor.py)
+client = anthropic.AsyncAnthropic(api_key=os.environ["ANTHROPIC_API_KEY"], max_retries=0)
 
-COMPACTION_THRESHOLD = 20  # messages before compaction
+TOOL_CONCURRENCY = int(os.environ.get("ZIPPER_TOOL_CONCURRENCY", 4))  # parallel-safe tool calls run at once
 
-# Import submodules after client/COMPACTION_THRESHOLD are defined (circular-import safe)
-from llm.loop import llm_loop, maybe_compact, _owns  # noqa: E402
+# Import submodules after client/TOOL_CONCURRENCY are defined (circular-import safe)
+from llm.loop import llm_loop, schedule_compaction, _owns  # noqa: E402
 from llm.messages import _sanitize_messages  # noqa: E402
+from llm.ownership import claim, release  # noqa: E402
+from llm.scheduler import lane_for_source  # noqa: E402
 
 
 def load_system_prompt() -> str:
@@ -37,20 +40,23 @@ def load_system_prompt() -> str:
     return "You are Zipper, a self-building AI assistant."
 
 
-def _set_typing(thread_id: int, active: bool):
-    """Fire-and-forget typing indicator update (sync, called from executor)."""
-    try:
-        post_json(f"{BOT_URL}/typing", {"thread_id": thread_id, "active": active}, timeout=5)
-    except Exception:
-        pass
+def build_system_prompt(summary: str = "") -> str:
+    system = load_system_prompt()
+    if summary:
+        system = f"{system}\n\n## Conversation History\n{summary}"
+    return system
+
+
+async def _set_typing(thread_id: int, active: bool):
+    """Fire-and-forget typing indicator update (errors are ignored)."""
+    await post_json_async(f"{BOT_URL}/typing", {"thread_id": thread_id, "active": active}, timeout=5)
 
 
 async def run_conversation(description: str, conversation_id: str, stream_callback=None) -> str:
     """Claim ownership of the conversation, append the user message, run the LLM loop."""
     # Claim ownership immediately (no awaits before this) — any running task
-    # for this conversation will see the mismatch at its next yield point and exit.
-    owner_token = str(uuid.uuid4())
-    update_meta(conversation_id, last_owner_token=owner_token, status="active")
+    # for this conversation is cancelled and exits at its next yield point.
+    owner_token = claim(conversation_id)
 
     version = get_latest_version(conversation_id)
     messages = _sanitize_messages(version["messages"])
@@ -62,30 +68,35 @@ async def run_conversation(description: str, conversation_id: str, stream_callba
     # already appended one (producing consecutive user messages)
     if not messages or messages[-1].get("content") != description:
         append_message(conversation_id, "user", description)
-        messages = _sanitize_messages(get_latest_version(conversation_id)["messages"])
-        save_messages(conversation_id, messages)
+        stored = get_latest_version(conversation_id)["messages"]
+        messages = _sanitize_messages(stored)
+        if messages != stored:
+            save_messages(conversation_id, messages)
 
-    system = load_system_prompt()
-    summary = version.get("summary", "")
-    if summary:
-        system = f"{system}\n\n## Conversation History\n{summary}"
+    system = build_system_prompt(version.get("summary", ""))
 
     set_system_prompt(conversation_id, system)
 
     thread_id = get_conversation_thread_id(conversation_id)
     if thread_id:
-        asyncio.create_task(asyncio.to_thread(_set_typing, thread_id, True))
+        asyncio.create_task(_set_typing(thread_id, True))
 
     try:
-        result = await llm_loop(conversation_id, messages, system, owner_token, stream_callback=stream_callback)
-    finally:
-        if thread_id:
-            asyncio.create_task(asyncio.to_thread(_set_typing, thread_id, False))
-        if _owns(conversation_id, owner_token):
-            update_meta(conversation_id, status="inactive")
+        try:
+            lane = lane_for_source(get_conversation(conversation_id).get("source"))
+            result = await llm_loop(
+                conversation_id, messages, system, owner_token, stream_callback=stream_callback, lane=lane
+            )
+        finally:
+            if thread_id:
+                asyncio.create_task(_set_typing(thread_id, False))
+            if _owns(conversation_id, owner_token):
+                update_meta(conversation_id, status="inactive")
 
-    if _owns(conversation_id, owner_token):
-        await maybe_compact(conversation_id)
+        if _owns(conversation_id, owner_token):
+            schedule_compaction(conversation_id)  # off the response path
+    finally:
+        release(conversation_id, owner_token)
     return result
 
 
@@ -0,0 +1,147 @@
+"""Progressive Discord replies fed by llm_loop's stream_callback.
+
+A placeholder message is posted via /send as soon as the reply starts. Tokens are
+buffered and pushed to the bot as coalesced /edit calls at most once per
+EDIT_INTERVAL (Discord allows ~5 edits per 5s per channel); once the text passes
+Discord's 2000-char limit it is smart_split and continued in follow-up messages. Rating tags are never shown,
+even half-streamed ones.
+"""
+
+import asyncio
+import re
+import time
+
+from llm.loop import RATING_RE
+from utils.constants import BOT_URL
+from utils.http_utils import post_json_async
+from utils.notify import notify_discord_async
+from utils.text import smart_split
+
+EDIT_INTERVAL = 1.2  # seconds between pushes for one reply
+PLACEHOLDER = "…"
+
+_TAG_SHAPES = ("{{c:9, d:9, a:9}}", "{{c:9,d:9,a:9}}")
+
+
+def _visible(text: str) -> str:
+    """Text with complete rating tags removed and a trailing partial tag hidden."""
+    text = RATING_RE.sub("", text)
+    start = text.rfind("{")
+    if start > 0 and text[start - 1] == "{":
+        start -= 1
+    if start != -1:
+        tail = re.sub(r"\d", "9", text[start:])
+        if any(shape.startswith(tail) for shape in _TAG_SHAPES):
+            text = text[:start]
+    return text.strip()
+
+
+class DiscordStream:
+    """One streamed reply in a Discord thread. Call start(), pass .callback as
+    stream_callback, then await finish().
+
+    Each assistant turn gets its own message(s): text streamed before a tool call
+    stays as it was, and the next turn's text starts a new message, so the last
+    message holds just the final reply.
+    """
+
+    def __init__(self, thread_id: int):
+        self.thread_id = thread_id
+        self._turns: list[str] = []  # text of earlier turns, already final
+        self._text = ""
+        self._status = ""
+        self._ids: list[str] = []   # Discord message IDs, one per chunk
+        self._shown: list[str] = []  # content currently shown in each message
+        self._dirty = asyncio.Event()
+        self._finished = False
+        self._task = None
+
+    def start(self):
+        """Post the placeholder message right away, before the first token."""
+        self._wake()
+
+    async def callback(self, event_type: str, **kwargs):
+        if event_type == "token":
+            self._text += kwargs.get("text", "")
+            self._status = ""
+        elif event_type == "tool_call":
+            if _visible(self._text):
+                self._turns.append(self._text)
+            self._text = ""
+            self._status = f"-# 🔧 {kwargs.get('tool', 'tool')}…"
+        else:
+            return
+        self._wake()
+
+    def _wake(self):
+        self._dirty.set()
+        if self._task is None:
+            self._task = asyncio.create_task(self._pump())
+
+    async def finish(self, result: str = "") -> bool:
+        """Push the final text; if the last turn streamed nothing, result becomes its text.
+        Returns whether result was shown. Push errors are logged, never raised."""
+        self._finished = True
+        self._status = ""
+        used = bool(result) and not _visible(self._text)
+        if self._task is None:
+            if used:
+                await notify_discord_async(result, thread_id=self.thread_id)
+            return used
+        if used:
+            self._text = result
+        self._dirty.set()
+        try:
+            await self._task
+        except Exception as e:
+            print(f"[discord_stream] stream failed: {e}")
+            return False
+        return used
+
+    async def _pump(self):
+        last_push = 0.0
+        while True:
+            await self._dirty.wait()
+            wait = EDIT_INTERVAL - (time.monotonic() - last_push)
+            if wait > 0:
+                await asyncio.sleep(wait)  # let more tokens coalesce into this push
+            self._dirty.clear()
+            finished = self._finished
+            await self._push()
+            last_push = time.monotonic()
+            if finished:
+                return
+
+    def _render(self) -> list[str]:
+        chunks = [c for turn in self._turns for c in smart_split(_visible(turn))]
+        body = _visible(self._text)
+        if self._status:
+            if body:
+                body = f"{body}\n\n{self._status}"
+            elif chunks:
+                chunks[-1] = f"{chunks[-1]}\n\n{self._status}"
+            else:
+                body = self._status
+        if body:
+            chunks += smart_split(body)
+        return chunks or [PLACEHOLDER]
+
+    async def _push(self):
+        for i, chunk in enumerate(self._render()):
+            if i < len(self._ids):
+                if self._shown[i] == chunk:
+                    continue
+                body = {"message_id": self._ids[i], "content": chunk, "thread_id": self.thread_id}
+                result = await post_json_async(f"{BOT_URL}/edit", body)
+                if "error" in result:
+                    print(f"[discord_stream] edit failed: {result['error']}")
+                    return
+                self._shown[i] = chunk
+            else:
+                body = {"message": chunk, "thread_id": self.thread_id}
+                result = await post_json_async(f"{BOT_URL}/send", body)
+                if "message_id" not in result:
+                    print(f"[discord_stream] send failed: {result.get('error') or 'no message_id returned'}")
+                    return
+                self._ids.append(result["message_id"])
+                self._shown.append(chunk)
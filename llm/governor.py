@@ -0,0 +1,191 @@
+"""Shared retry governor and circuit breaker for Anthropic API calls.
+
+All conversations report 429/529/5xx outcomes here instead of backing off on
+their own. Backoff uses full jitter and honours retry-after. When overload
+signals pile up across conversations the breaker opens: callers queue in
+wait_ready() until the cooldown ends, then a single probe request goes
+through. Its success closes the breaker for everyone; its failure reopens it
+with a longer cooldown. While the breaker is not closed select_model() can
+step down to a lighter model (DEGRADE_WHILE_OPEN).
+
+llm_loop drives the governor itself around its streams; one-off calls (titles,
+token counts, summarize) go through call(), which adds the scheduler slot.
+"""
+
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+
+import anthropic
+
+from llm.scheduler import scheduler
+
+MAX_RETRIES = 5
+BASE_DELAY = 5.0
+MAX_DELAY = 120.0
+
+OPEN_AFTER = 3          # overload signals ...
+OPEN_WINDOW = 30.0      # ... within this many seconds open the breaker
+COOLDOWN = 15.0         # first open period; doubles on each failed probe
+MAX_COOLDOWN = 120.0
+
+DEGRADE_WHILE_OPEN = True
+
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504, 529}
+_OVERLOAD_STATUS = {429, 503, 529}
+
+
+def _retry_after(error) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def describe(error) -> str:
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        return "rate limited"
+    if status == 529 or "overloaded" in str(error).lower():
+        return "overloaded"
+    if status is None:
+        return "unreachable"
+    return f"failing ({status})"
+
+
+def backoff(error, attempt: int) -> float:
+    """Seconds to wait before retrying: retry-after if the API sent one, else full jitter."""
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        return retry_after
+    # full jitter: uniform in [0, base * 2^attempt], at least 1s
+    return max(1.0, random.uniform(0, min(BASE_DELAY * 2 ** attempt, MAX_DELAY)))
+
+
+class RetryGovernor:
+    def __init__(self):
+        self.state = "closed"  # closed | open | half_open
+        self._signals: list[float] = []
+        self._cooldown = COOLDOWN
+        self._probing = False
+        self._changed = asyncio.Event()
+        self.opened = 0
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def degraded(self) -> bool:
+        return DEGRADE_WHILE_OPEN and self.state != "closed"
+
+    def is_retryable(self, error) -> bool:
+        if isinstance(error, anthropic.APIConnectionError):
+            return True
+        status = getattr(error, "status_code", 0)
+        return status in _RETRYABLE_STATUS or "overloaded" in str(error).lower()
+
+    async def wait_ready(self) -> bool:
+        """Wait until requests may be sent. Returns True if this caller is the half-open probe."""
+        while True:
+            if self.state == "closed":
+                return False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            await self._changed.wait()
+
+    def done(self, probe: bool):
+        """Call after every attempt. Frees the probe slot if the probe ended without an outcome."""
+        if probe and self._probing and self.state == "half_open":
+            self._probing = False
+            self._notify()
+
+    def record_success(self):
+        if self.state != "closed":
+            print("[governor] breaker closed")
+        self.state = "closed"
+        self._probing = False
+        self._cooldown = COOLDOWN
+        self._signals.clear()
+        self._notify()
+
+    def record_failure(self, error, attempt: int) -> float:
+        """Register a retryable failure. Returns how long this caller should wait before retrying."""
+        retry_after = _retry_after(error)
+        status = getattr(error, "status_code", None)
+        overload = status in _OVERLOAD_STATUS or "overloaded" in str(error).lower()
+
+        if overload:
+            now = time.monotonic()
+            self._signals = [t for t in self._signals if now - t < OPEN_WINDOW] + [now]
+            if self.state == "half_open":
+                self._cooldown = min(self._cooldown * 2, MAX_COOLDOWN)
+                self._open(max(self._cooldown, retry_after or 0))
+            elif self.state == "closed" and len(self._signals) >= OPEN_AFTER:
+                self._open(max(self._cooldown, retry_after or 0))
+
+        return backoff(error, attempt)
+
+    def _open(self, seconds: float):
+        self.state = "open"
+        self._probing = False
+        self.opened += 1
+        print(f"[governor] breaker open for {seconds:.0f}s")
+        asyncio.get_running_loop().call_later(seconds, self._half_open)
+        self._notify()
+
+    def _half_open(self):
+        if self.state == "open":
+            self.state = "half_open"
+            self._notify()
+
+    def stats(self) -> dict:
+        return {"state": self.state, "opened": self.opened, "cooldown_s": self._cooldown}
+
+
+governor = RetryGovernor()
+
+# (event loop, lane) of the run a tool call belongs to; asyncio.to_thread carries it into the tool's thread
+tool_context: ContextVar = ContextVar("tool_context", default=None)
+
+
+async def call(request, model: str, lane: str = "background", cost: int = 0, retries: int = MAX_RETRIES):
+    """Await request() (a non-streaming API call) in one of model's scheduler slots,
+    retrying retryable errors with the governor's backoff. Raises the last error."""
+    attempt = 0
+    while True:
+        probe = await governor.wait_ready()
+        try:
+            async with scheduler.slot(model, lane, cost):
+                result = await request()
+            governor.record_success()
+            return result
+        except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+            scheduler.observe(model, getattr(getattr(e, "response", None), "headers", None))
+            if not governor.is_retryable(e) or attempt >= retries:
+                raise
+            delay = governor.record_failure(e, attempt)
+            attempt += 1
+            print(f"[governor] {model} {describe(e)}, retry {attempt}/{retries} in {delay:.0f}s ({lane})")
+        finally:
+            governor.done(probe)
+        await asyncio.sleep(delay)
+
+
+def call_from_thread(request, model: str, cost: int = 0, retries: int = MAX_RETRIES):
+    """Blocking call() for tools running in a worker thread: schedules it on the run's event
+    loop, in the run's lane. Raises RuntimeError outside a tool call (no loop to schedule on)."""
+    context = tool_context.get()
+    if context is None:
+        raise RuntimeError("call_from_thread outside a tool call")
+    loop, lane = context
+    return asyncio.run_coroutine_threadsafe(call(request, model, lane, cost, retries), loop).result()
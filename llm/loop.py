@@ -1,61 +1,147 @@
-"""Core LLM loop, ownership checks, model selection, and compaction."""
+"""Core LLM loop, ownership checks, model selection, and background compaction."""
 
 import asyncio
 import json
 import re
 from datetime import datetime
 
+import anthropic
+
 from storage.conversations import (
     get_latest_version,
     append_message,
     pop_last_message,
     create_version,
-    get_conversation,
     get_conversation_thread_id,
     update_meta,
+    get_conversation,
+    set_system_prompt,
+)
+from storage.trace import append_trace_entry, append_usage
+from tools import TOOLS, execute_tool, is_parallel_safe
+from tools.signals import BreakLoop
+from llm.messages import (
+    serialize_content,
+    _sanitize_messages,
+    estimate_tokens,
+    compaction_split,
+    compaction_tail,
+    CHARS_PER_TOKEN,
 )
-from storage.trace import append_trace_entry
-from tools import TOOLS, execute_tool
+from llm import ownership
+from llm.scheduler import scheduler
+from llm.governor import governor, describe, MAX_RETRIES, call as governed_call, tool_context
+from utils.notify import notify_discord_async
 
 _HAIKU_MODELS = {"claude-haiku-4-5-20251001"}
 
 
+_CACHE = {"type": "ephemeral"}
+
+
 def _tools_for_model(model: str) -> list:
-    """Strip allowed_callers for models that don't support code_execution."""
+    """Strip allowed_callers for models that don't support code_execution.
+    The last tool carries a cache breakpoint so the whole tool block is cached."""
     if model not in _HAIKU_MODELS:
-        return TOOLS
-    result = []
-    for tool in TOOLS:
-        if tool.get("type", "").startswith("code_execution"):
-            continue  # code_execution block not available on Haiku
-        t = {k: v for k, v in tool.items() if k != "allowed_callers"}
-        result.append(t)
+        result = list(TOOLS)
+    else:
+        result = []
+        for tool in TOOLS:
+            if tool.get("type", "").startswith("code_execution"):
+                continue  # code_execution block not available on Haiku
+            t = {k: v for k, v in tool.items() if k != "allowed_callers"}
+            result.append(t)
+    result[-1] = {**result[-1], "cache_control": _CACHE}
     return result
-from tools.signals import BreakLoop
-from llm.messages import serialize_content, _sanitize_messages
-from utils.notify import notify_discord_async
+
+
+def _cached_system(system: str) -> list:
+    return [{"type": "text", "text": system, "cache_control": _CACHE}]
+
+
+def _cached_messages(messages: list) -> list:
+    """Copy of messages with a cache breakpoint on the last block, so the next
+    tool-loop iteration reads the whole prior prefix from cache. Stored messages are untouched."""
+    if not messages:
+        return messages
+    last = messages[-1]
+    content = last.get("content")
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content:
+        return messages
+    content = [*content[:-1], {**content[-1], "cache_control": _CACHE}]
+    return [*messages[:-1], {**last, "content": content}]
+
 
 RATING_RE = re.compile(r'\{\{c:(\d),\s*d:(\d),\s*a:(\d)\}\}')
 
 
 def _owns(conversation_id: str, token: str) -> bool:
     """Check whether token is still the active owner of the conversation."""
+    return ownership.owns(conversation_id, token)
+
+
+class _Interrupted(Exception):
+    """Ownership was claimed by another run while awaiting."""
+
+
+async def _unless_interrupted(aw, cancelled: asyncio.Event):
+    """Await aw, but abandon (and cancel) it as soon as cancelled is set."""
+    task = asyncio.ensure_future(aw)
+    waiter = asyncio.ensure_future(cancelled.wait())
     try:
-        return get_conversation(conversation_id).get("last_owner_token") == token
-    except Exception:
-        return False
+        await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        waiter.cancel()
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    if task.cancelled():
+        raise _Interrupted()
+    return task.result()
+
+
+# Per-model compaction budgets, in input tokens (messages + system prompt + tools).
+# compact_at: compact after a turn once the context reaches this size.
+# keep: most recent context to keep verbatim; everything before it is summarized.
+MODEL_BUDGETS = {
+    "claude-haiku-4-5-20251001": {"compact_at": 60_000, "keep": 15_000},
+    "claude-sonnet-4-6": {"compact_at": 100_000, "keep": 25_000},
+    "claude-opus-4-6": {"compact_at": 100_000, "keep": 25_000},
+}
+_DEFAULT_BUDGET = {"compact_at": 60_000, "keep": 15_000}
+
+# estimates within this factor of compact_at are confirmed with the count_tokens API
+COUNT_TOKENS_CHECK = True
+COUNT_TOKENS_BAND = 0.8
+
+
+def compaction_budget(model: str) -> dict:
+    return MODEL_BUDGETS.get(model, _DEFAULT_BUDGET)
+
+
+# one step lighter, used while the circuit breaker is not closed
+_LIGHTER_MODEL = {
+    "claude-opus-4-6": "claude-sonnet-4-6",
+    "claude-sonnet-4-6": "claude-haiku-4-5-20251001",
+}
 
 
 def select_model(ratings: tuple | None) -> str:
-    """Select model based on c+d+a rating from previous turn. None = first turn, default to Haiku."""
+    """Select model based on c+d+a rating from previous turn. None = first turn, default to Haiku.
+    Steps down one model while the API circuit breaker is open (governor.DEGRADE_WHILE_OPEN)."""
     if ratings is None:
-        return "claude-haiku-4-5-20251001"
-    total = sum(ratings)
-    if total > 10:
-        return "claude-opus-4-6"
-    if total > 5:
-        return "claude-sonnet-4-6"
-    return "claude-haiku-4-5-20251001"
+        model = "claude-haiku-4-5-20251001"
+    elif sum(ratings) > 10:
+        model = "claude-opus-4-6"
+    elif sum(ratings) > 5:
+        model = "claude-sonnet-4-6"
+    else:
+        model = "claude-haiku-4-5-20251001"
+    if governor.degraded:
+        return _LIGHTER_MODEL.get(model, model)
+    return model
 
 
 def parse_ratings(text: str) -> tuple | None:
@@ -69,15 +155,121 @@ def strip_ratings(text: str) -> str:
     return RATING_RE.sub("", text).strip()
 
 
-async def llm_loop(conversation_id: str, messages: list, system: str, owner_token: str, stream_callback=None) -> str:
+def _tool_batches(calls: list) -> list:
+    """Group tool calls into consecutive runs of parallel-safe calls; every other call is a batch of one."""
+    batches = []
+    prev_safe = False
+    for call in calls:
+        safe = is_parallel_safe(call[1], call[2])
+        if safe and prev_safe:
+            batches[-1].append(call)
+        else:
+            batches.append([call])
+        prev_safe = safe
+    return batches
+
+
+def _live_output(stream_callback, tool_id: str):
+    """Thread-safe on_output for execute_tool that forwards chunks as tool_output stream events."""
+    if not stream_callback:
+        return None
+    loop = asyncio.get_running_loop()
+
+    async def emit(text: str):
+        try:
+            await stream_callback("tool_output", tool_use_id=tool_id, text=text)
+        except Exception:
+            pass
+
+    return lambda text: asyncio.run_coroutine_threadsafe(emit(text), loop)
+
+
+async def _run_tool(
+    tool_id: str,
+    tool_name: str,
+    tool_input: dict,
+    conversation_id: str,
+    semaphore: asyncio.Semaphore,
+    stream_callback=None,
+    lane: str = "interactive",
+) -> tuple:
+    """Execute one tool call in a worker thread. Returns (output, error, status, duration_ms, break_loop)."""
+    on_output = _live_output(stream_callback, tool_id)
+    tool_context.set((asyncio.get_running_loop(), lane))  # API calls made by the tool share our scheduler
+    async with semaphore:
+        start = datetime.now()
+        stop = False
+        try:
+            output = await asyncio.to_thread(execute_tool, tool_name, tool_input, conversation_id, on_output)
+            error = None
+            status = "ok"
+        except BreakLoop as e:
+            output = str(e)
+            error = None
+            status = "ok"
+            stop = True
+        except Exception as e:
+            output = str(e)
+            error = str(e)
+            status = "error"
+        duration_ms = int((datetime.now() - start).total_seconds() * 1000)
+    return output, error, status, duration_ms, stop
+
+
+def _refresh(conversation_id: str, system: str, version_num: int) -> tuple:
+    """Reload messages after an append. If a background compaction created a new
+    version, switch to it and rebuild the system prompt with its summary."""
+    from llm import build_system_prompt
+
+    version = get_latest_version(conversation_id)
+    if version["version"] != version_num:
+        system = build_system_prompt(version.get("summary", ""))
+        set_system_prompt(conversation_id, system)
+    return version["messages"], system, version["version"]
+
+
+async def llm_loop(
+    conversation_id: str,
+    messages: list,
+    system: str,
+    owner_token: str,
+    stream_callback=None,
+    lane: str = "interactive",
+) -> str:
     # Import client here to avoid circular import issues at module level
-    from llm import client
+    from llm import client, TOOL_CONCURRENCY
 
     ratings = None
+    last_model = None
+    version_num = get_latest_version(conversation_id)["version"]
 
     def owns() -> bool:
         return _owns(conversation_id, owner_token)
 
+    cancelled = ownership.cancel_event(conversation_id, owner_token)
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    async def consume_stream(model: str):
+        nonlocal stream_callback
+        async with scheduler.slot(model, lane, cost=estimate_tokens(messages)), client.messages.stream(
+            model=model,
+            max_tokens=8096,
+            system=_cached_system(system),
+            tools=_tools_for_model(model),
+            messages=_cached_messages(messages),
+        ) as stream:
+            response = getattr(stream, "response", None)
+            scheduler.observe(model, getattr(response, "headers", None))
+            async for event in stream:
+                if (stream_callback
+                        and event.type == "content_block_delta"
+                        and getattr(event.delta, "type", None) == "text_delta"):
+                    try:
+                        await stream_callback("token", text=event.delta.text)
+                    except Exception:
+                        stream_callback = None  # client disconnected, stop sending
+            return await stream.get_final_message()
+
     while True:
         # Yield to the event loop so any pending request for this conversation
         # can run run_conversation() and write a new ownership token before we check.
@@ -85,56 +277,55 @@ async def llm_loop(conversation_id: str, messages: list, system: str, owner_toke
         if not owns():
             return ""
 
-        model = select_model(ratings)
-        print(f"[llm] {model} (ratings={ratings})")
-
-        retry_delay = 5
         retries = 0
         while True:
             try:
-                response = None
-                async with client.messages.stream(
-                    model=model,
-                    max_tokens=8096,
-                    system=system,
-                    tools=_tools_for_model(model),
-                    messages=messages,
-                ) as stream:
-                    async for event in stream:
-                        if not owns():
-                            return ""
-                        if (stream_callback
-                                and event.type == "content_block_delta"
-                                and getattr(event.delta, "type", None) == "text_delta"):
-                            try:
-                                await stream_callback("token", text=event.delta.text)
-                            except Exception:
-                                stream_callback = None  # client disconnected, stop sending
-                    response = await stream.get_final_message()
+                # queue here while the shared circuit breaker is open
+                probe = await _unless_interrupted(governor.wait_ready(), cancelled)
+            except _Interrupted:
+                return ""
+            if not owns():
+                governor.done(probe)
+                return ""
+
+            model = select_model(ratings)
+            print(f"[llm] {model} (ratings={ratings})")
+            if model != last_model:
+                update_meta(conversation_id, model=model)  # maybe_compact budgets by the last model used
+                last_model = model
+
+            try:
+                # an interrupting run sets `cancelled`, which tears down the stream mid-flight
+                response = await _unless_interrupted(consume_stream(model), cancelled)
+                governor.record_success()
                 break  # success
-            except __import__('anthropic').APIStatusError as e:
-                status = getattr(e, 'status_code', 0)
-                is_overloaded = status == 529 or 'overloaded' in str(e).lower()
-                if status != 429 and not is_overloaded:
+            except _Interrupted:
+                return ""
+            except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+                scheduler.observe(model, getattr(getattr(e, "response", None), "headers", None))
+                if not governor.is_retryable(e):
                     if owns():
                         pop_last_message(conversation_id)
                     raise
+                retry_delay = governor.record_failure(e, retries)
                 if not owns():
                     return ""
                 retries += 1
-                label = "overloaded" if is_overloaded else "rate limited"
-                print(f"[llm] {label}, retry {retries}/5 in {retry_delay}s")
-                if retries >= 5:
+                label = describe(e)
+                print(f"[llm] {label}, retry {retries}/{MAX_RETRIES} in {retry_delay:.1f}s")
+                if retries >= MAX_RETRIES:
                     if owns():
                         pop_last_message(conversation_id)
                     thread_id = get_conversation_thread_id(conversation_id)
                     await notify_discord_async(
-                        f"⚠️ Claude API is {label} — gave up after 5 retries. Please try again later.",
+                        f"⚠️ Claude API is {label} — gave up after {MAX_RETRIES} retries. Please try again later.",
                         thread_id=thread_id,
                     )
                     return ""
-                await asyncio.sleep(retry_delay)
-                retry_delay = min(retry_delay * 2, 120)
+                try:
+                    await _unless_interrupted(asyncio.sleep(retry_delay), cancelled)
+                except _Interrupted:
+                    return ""
                 if not owns():
                     return ""
                 continue
@@ -142,6 +333,12 @@ async def llm_loop(conversation_id: str, messages: list, system: str, owner_toke
                 if owns():
                     pop_last_message(conversation_id)
                 raise
+            finally:
+                governor.done(probe)
+
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            append_usage(conversation_id, model, usage)
 
         if not owns():
             return ""
@@ -156,7 +353,7 @@ async def llm_loop(conversation_id: str, messages: list, system: str, owner_toke
                 block["text"] = strip_ratings(block["text"])
 
         append_message(conversation_id, "assistant", assistant_content)
-        messages = get_latest_version(conversation_id)["messages"]
+        messages, system, version_num = _refresh(conversation_id, system, version_num)
 
         if response.stop_reason == "end_turn":
             for block in assistant_content:
@@ -176,108 +373,192 @@ async def llm_loop(conversation_id: str, messages: list, system: str, owner_toke
                     elif caller is not None:
                         caller_map[raw.id] = getattr(caller, "type", "direct")
 
-            for block in assistant_content:
-                if block.get("type") != "tool_use":
-                    continue
-
-                tool_name = block["name"]
-                tool_input = block["input"]
-                tool_id = block["id"]
-                caller_type = caller_map.get(tool_id, "direct")
-
+            calls = [
+                (block["id"], block["name"], block["input"])
+                for block in assistant_content
+                if block.get("type") == "tool_use"
+            ]
+            for batch in _tool_batches(calls):
                 if stream_callback:
-                    try:
-                        await stream_callback("tool_call", tool=tool_name, args=tool_input, tool_id=tool_id)
-                    except Exception:
-                        stream_callback = None
-
-                start = datetime.now()
-                try:
-                    # Run synchronous tool in a thread pool so the event loop
-                    # remains free to process incoming requests (e.g. an interrupt
-                    # claiming ownership of this conversation) while tools execute.
-                    output = await asyncio.to_thread(execute_tool, tool_name, tool_input, conversation_id)
-                    error = None
-                    status = "ok"
-                except BreakLoop as e:
-                    msg = str(e)
-                    duration_ms = int((datetime.now() - start).total_seconds() * 1000)
+                    for tool_id, tool_name, tool_input in batch:
+                        try:
+                            await stream_callback("tool_call", tool=tool_name, args=tool_input, tool_id=tool_id)
+                        except Exception:
+                            stream_callback = None
+                            break
+
+                # Synchronous tools run in the thread pool so the event loop stays free
+                # to process incoming requests (e.g. an interrupt claiming ownership of
+                # this conversation) while they execute. Multi-call batches are all
+                # parallel-safe and run concurrently; results come back in tool_use order.
+                outcomes = await asyncio.gather(*(
+                    _run_tool(tool_id, tool_name, tool_input, conversation_id, semaphore, stream_callback, lane)
+                    for tool_id, tool_name, tool_input in batch
+                ))
+
+                for (tool_id, tool_name, tool_input), (output, error, status, duration_ms, stop) in zip(batch, outcomes):
                     append_trace_entry(conversation_id, {
                         "tool": tool_name,
                         "args": tool_input,
-                        "output": msg,
-                        "error": None,
+                        "output": output,
+                        "error": error,
                         "duration_ms": duration_ms,
-                        "status": "ok",
-                        "caller": caller_type,
+                        "status": status,
+                        "caller": caller_map.get(tool_id, "direct"),
                     })
+
                     if not owns():
                         return ""
-                    tool_results.append({"type": "tool_result", "tool_use_id": tool_id, "content": msg})
+
+                    tool_results.append({
+                        "type": "tool_result",
+                        "tool_use_id": tool_id,
+                        "content": output,
+                    })
                     if stream_callback:
                         try:
-                            await stream_callback("tool_result", tool_use_id=tool_id, result=msg)
+                            await stream_callback("tool_result", tool_use_id=tool_id, result=output)
                         except Exception:
                             stream_callback = None
-                    append_message(conversation_id, "user", tool_results)
-                    return ""
-                except Exception as e:
-                    output = str(e)
-                    error = str(e)
-                    status = "error"
-
-                duration_ms = int((datetime.now() - start).total_seconds() * 1000)
-
-                append_trace_entry(conversation_id, {
-                    "tool": tool_name,
-                    "args": tool_input,
-                    "output": output,
-                    "error": error,
-                    "duration_ms": duration_ms,
-                    "status": status,
-                    "caller": caller_type,
-                })
 
-                if not owns():
-                    return ""
-
-                tool_results.append({
-                    "type": "tool_result",
-                    "tool_use_id": tool_id,
-                    "content": output,
-                })
-                if stream_callback:
-                    try:
-                        await stream_callback("tool_result", tool_use_id=tool_id, result=output)
-                    except Exception:
-                        stream_callback = None
+                    if stop:
+                        append_message(conversation_id, "user", tool_results)
+                        return ""
 
             if not owns():
                 return ""
 
             append_message(conversation_id, "user", tool_results)
-            messages = get_latest_version(conversation_id)["messages"]
+            messages, system, version_num = _refresh(conversation_id, system, version_num)
 
 
-async def maybe_compact(conversation_id: str):
-    from llm import client, COMPACTION_THRESHOLD
+def _context_tokens(version: dict, model: str) -> int:
+    """Local estimate of a request's input tokens: messages + system prompt + tool schemas."""
+    system = version.get("system_prompt") or ""
+    tools = json.dumps(_tools_for_model(model), ensure_ascii=False)
+    return estimate_tokens(version["messages"]) + int((len(system) + len(tools)) / CHARS_PER_TOKEN)
 
-    version = get_latest_version(conversation_id)
-    if len(version["messages"]) < COMPACTION_THRESHOLD:
-        return
 
-    old_messages = version["messages"][:-6]
-    keep_messages = version["messages"][-6:]
+async def _count_tokens(client, version: dict, model: str) -> int | None:
+    """Exact input token count from the API, or None if the call fails."""
+    try:
+        result = await governed_call(lambda: client.messages.count_tokens(
+            model=model,
+            system=version.get("system_prompt") or "",
+            tools=[t for t in _tools_for_model(model) if t.get("name") and not t.get("type")],
+            messages=version["messages"],
+        ), model, lane="background", retries=0)
+        return result.input_tokens
+    except Exception as e:
+        print(f"[compact] count_tokens failed, using estimate: {e}")
+        return None
+
+
+_SUMMARY_SYSTEM = (
+    "You maintain a rolling summary of a conversation between a user and Zipper, an AI assistant. "
+    "Update the current summary with the new messages and return only the updated summary. "
+    "Preserve key decisions, actions taken, and outcomes, including failed attempts and why they failed. "
+    "Drop details that no longer matter."
+)
+_TRANSCRIPT_TOOL_CHARS = 2000
+
+# conversation_id -> lock held while a background compaction runs
+_compaction_locks: dict[str, asyncio.Lock] = {}
+_compaction_tasks: set = set()
+
+
+def _transcript(messages: list) -> str:
+    """Plain-text rendering of messages for the summarizer, with long tool I/O truncated."""
+    def clip(text: str) -> str:
+        if len(text) <= _TRANSCRIPT_TOOL_CHARS:
+            return text
+        return text[:_TRANSCRIPT_TOOL_CHARS] + f"… [{len(text) - _TRANSCRIPT_TOOL_CHARS} chars truncated]"
+
+    lines = []
+    for msg in messages:
+        role = msg.get("role", "")
+        content = msg.get("content", "")
+        if isinstance(content, str):
+            lines.append(f"{role}: {content}")
+            continue
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            t = block.get("type")
+            if t == "text":
+                lines.append(f"{role}: {block.get('text', '')}")
+            elif t == "tool_use":
+                lines.append(f"{role} → {block.get('name')}: {clip(json.dumps(block.get('input', {}), ensure_ascii=False))}")
+            elif t == "tool_result":
+                result = block.get("content", "")
+                if not isinstance(result, str):
+                    result = json.dumps(result, ensure_ascii=False)
+                lines.append(f"result: {clip(result)}")
+    return "\n".join(lines)
+
+
+async def maybe_compact(conversation_id: str, model: str = None):
+    from llm import client
 
-    summary_response = await client.messages.create(
-        model="claude-sonnet-4-6",
-        max_tokens=1024,
-        system="Summarize the following conversation concisely, preserving key decisions, actions taken, and outcomes.",
-        messages=[{"role": "user", "content": json.dumps(old_messages)}],
-    )
-    new_summary = summary_response.content[0].text
+    version = get_latest_version(conversation_id)
+    model = model or get_conversation(conversation_id).get("model") or select_model(None)
+    budget = compaction_budget(model)
 
+    tokens = _context_tokens(version, model)
+    if tokens < budget["compact_at"] * COUNT_TOKENS_BAND:
+        return
+    if COUNT_TOKENS_CHECK and tokens < budget["compact_at"] / COUNT_TOKENS_BAND:
+        # estimate is close to the threshold either way — confirm before paying for a summary
+        exact = await _count_tokens(client, version, model)
+        if exact is not None:
+            tokens = exact
+    if tokens < budget["compact_at"]:
+        return
+
+    split = compaction_split(version["messages"], budget["keep"])
+    if split is None:
+        print(f"[compact] {conversation_id}: {tokens} tokens but no safe split point")
+        return
+    # only the delta since the last compaction is sent; the prior summary carries the rest
+    delta = version["messages"][:split]
     prior_summary = version.get("summary", "")
-    combined_summary = f"{prior_summary}\n\n{new_summary}".strip()
 
-    create_version(conversation_id, summary=combined_summary, messages=keep_messages)
+    summary_response = await governed_call(lambda: client.messages.create(
+        model="claude-sonnet-4-6",
+        max_tokens=2048,
+        system=_SUMMARY_SYSTEM,
+        messages=[{
+            "role": "user",
+            "content": f"## Current summary\n{prior_summary or '(none)'}\n\n## New messages\n{_transcript(delta)}",
+        }],
+    ), "claude-sonnet-4-6", lane="background", cost=estimate_tokens(delta))
+    summary = summary_response.content[0].text.strip()
+
+    # a turn may have appended messages while we were summarizing — keep everything
+    # after the split, unless the summarized prefix itself changed underneath us
+    current = get_latest_version(conversation_id)
+    if current["version"] != version["version"] or current["messages"][:split] != delta:
+        print(f"[compact] {conversation_id}: version changed during summarization, skipping")
+        return
+    create_version(conversation_id, summary=summary, messages=compaction_tail(current["messages"], split))
+    print(f"[compact] {conversation_id}: {tokens} tokens, summarized {split} messages → version {version['version'] + 1}")
+
+
+async def _compact_in_background(conversation_id: str):
+    lock = _compaction_locks.setdefault(conversation_id, asyncio.Lock())
+    if lock.locked():
+        return  # one already running; the next turn will check again
+    async with lock:
+        try:
+            await maybe_compact(conversation_id)
+        except Exception as e:
+            print(f"[compact] {conversation_id} failed: {e}")
+    if not lock.locked():
+        _compaction_locks.pop(conversation_id, None)
+
+
+def schedule_compaction(conversation_id: str):
+    """Run maybe_compact as a background task, at most one per conversation at a time."""
+    task = asyncio.create_task(_compact_in_background(conversation_id))
+    _compaction_tasks.add(task)
+    task.add_done_callback(_compaction_tasks.discard)
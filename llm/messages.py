@@ -1,5 +1,7 @@
 """Message sanitization and serialization utilities for the LLM loop."""
 
+import json
+
 
 def _has_tool_use(content) -> bool:
     if isinstance(content, list):
@@ -65,6 +67,95 @@ def _sanitize_messages(messages: list) -> list:
     return msgs
 
 
+CHARS_PER_TOKEN = 3.5
+_IMAGE_TOKENS = 1600
+_MESSAGE_OVERHEAD = 4
+
+
+def _block_chars(block) -> int:
+    if isinstance(block, str):
+        return len(block)
+    if not isinstance(block, dict):
+        return len(str(block))
+    t = block.get("type")
+    if t == "text":
+        return len(block.get("text", ""))
+    if t == "image":
+        return int(_IMAGE_TOKENS * CHARS_PER_TOKEN)
+    if t == "tool_use":
+        return len(block.get("name", "")) + len(json.dumps(block.get("input", {}), ensure_ascii=False))
+    if t == "tool_result":
+        content = block.get("content", "")
+        if isinstance(content, list):
+            return sum(_block_chars(b) for b in content)
+        return len(str(content))
+    return len(json.dumps(block, ensure_ascii=False, default=str))
+
+
+def estimate_tokens(messages: list) -> int:
+    """Fast local token estimate (~3.5 chars/token) — no API call."""
+    total = 0
+    for msg in messages:
+        content = msg.get("content", "")
+        chars = _block_chars(content) if isinstance(content, str) else sum(_block_chars(b) for b in content)
+        total += int(chars / CHARS_PER_TOKEN) + _MESSAGE_OVERHEAD
+    return total
+
+
+def _is_turn_start(msg: dict) -> bool:
+    return msg.get("role") == "user" and not _is_tool_result_message(msg)
+
+
+def _is_step_start(messages: list, i: int) -> bool:
+    """An assistant message right after a tool_result: a boundary inside one long turn."""
+    return messages[i].get("role") == "assistant" and _is_tool_result_message(messages[i - 1])
+
+
+def _pick_split(messages: list, keep_tokens: int, is_point) -> tuple[int | None, int]:
+    """Earliest split point whose tail fits in keep_tokens, else the latest one; with its tail size."""
+    tail = 0
+    best, best_tail = None, 0
+    for i in range(len(messages) - 1, 0, -1):
+        tail += estimate_tokens([messages[i]])
+        if not is_point(i):
+            continue
+        if tail > keep_tokens and best is not None:
+            break
+        best, best_tail = i, tail
+    return best, best_tail
+
+
+def compaction_split(messages: list, keep_tokens: int) -> int | None:
+    """Index to split messages at for compaction: messages[:i] get summarized, messages[i:] kept.
+
+    Prefers splitting before a plain user message. When there is none (one long
+    single-prompt run) or the last turn alone exceeds keep_tokens, it may split inside
+    a turn, before an assistant message that follows a tool_result — never between a
+    tool_use and its tool_result. Build the kept messages with compaction_tail().
+    Picks the earliest point whose tail fits in keep_tokens, else the latest one.
+    None if there is none.
+    """
+    best, tail = _pick_split(messages, keep_tokens, lambda i: _is_turn_start(messages[i]))
+    if best is None or tail > keep_tokens:
+        inner, _ = _pick_split(
+            messages, keep_tokens, lambda i: _is_turn_start(messages[i]) or _is_step_start(messages, i)
+        )
+        if inner is not None and (best is None or inner > best):
+            best = inner
+    return best
+
+
+COMPACTION_RESUME = "[Earlier messages were summarized. Continue from where you left off.]"
+
+
+def compaction_tail(messages: list, split: int) -> list:
+    """messages[split:], led by a resume note when the split fell inside a turn."""
+    tail = messages[split:]
+    if tail and not _is_turn_start(tail[0]):
+        tail = [{"role": "user", "content": [{"type": "text", "text": COMPACTION_RESUME}]}] + tail
+    return tail
+
+
 def serialize_content(content) -> list:
     """Whitelist only API-accepted fields to avoid 400s from internal SDK fields."""
     result = []
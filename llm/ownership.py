@@ -0,0 +1,90 @@
+"""Ownership registry — which run currently owns each conversation.
+
+A new run_conversation() claims the conversation and sets the previous owner's
+cancel event, so an in-flight stream is torn down immediately instead of at
+the next poll. The claim is also written to meta.json as last_owner_token for
+runs in other processes (the dashboard calls run_conversation too): owns()
+compares against it (the conversation store re-reads meta.json only when its
+stamp changes), and a watcher checks every POLL_INTERVAL, so a foreign claim
+cancels an in-flight stream the same way.
+"""
+
+import asyncio
+import json
+import uuid
+
+from storage.conversations import get_conversation, update_meta
+
+POLL_INTERVAL = 0.5  # seconds between checks for a claim made by another process
+
+
+class _Owner:
+    __slots__ = ("token", "cancelled", "watcher")
+
+    def __init__(self, token: str):
+        self.token = token
+        self.cancelled = asyncio.Event()
+        self.watcher = None
+
+
+# conversation_id -> current owner
+_owners: dict[str, _Owner] = {}
+
+
+def claim(conversation_id: str) -> str:
+    """Take ownership of a conversation, cancelling the current owner. Returns the new token."""
+    token = str(uuid.uuid4())
+    previous = _owners.get(conversation_id)
+    if previous:
+        _drop(conversation_id, previous)
+    update_meta(conversation_id, last_owner_token=token, status="active")
+    owner = _owners[conversation_id] = _Owner(token)
+    owner.watcher = asyncio.get_running_loop().create_task(_watch(conversation_id, owner))
+    return token
+
+
+def _drop(conversation_id: str, owner: _Owner):
+    owner.cancelled.set()
+    if owner.watcher is not None and owner.watcher is not asyncio.current_task():
+        owner.watcher.cancel()
+    if _owners.get(conversation_id) is owner:
+        del _owners[conversation_id]
+
+
+async def _watch(conversation_id: str, owner: _Owner):
+    while not owner.cancelled.is_set():
+        await asyncio.sleep(POLL_INTERVAL)
+        owns(conversation_id, owner.token)
+
+
+def owns(conversation_id: str, token: str) -> bool:
+    owner = _owners.get(conversation_id)
+    if owner is None or owner.token != token:
+        return False
+    try:
+        on_disk = get_conversation(conversation_id).get("last_owner_token")
+    except json.JSONDecodeError:
+        return True  # meta.json caught mid-write; the next check sees it whole
+    except Exception:
+        on_disk = None
+    if on_disk != token:
+        _drop(conversation_id, owner)  # claimed by another process (or deleted)
+        return False
+    return True
+
+
+def cancel_event(conversation_id: str, token: str) -> asyncio.Event:
+    """Event that is set once token loses ownership. Already set if it has lost it."""
+    owner = _owners.get(conversation_id)
+    if owner is not None and owner.token == token:
+        return owner.cancelled
+    event = asyncio.Event()
+    event.set()
+    return event
+
+
+def release(conversation_id: str, token: str):
+    """Drop the registry entry once the owning run is finished."""
+    owner = _owners.get(conversation_id)
+    if owner is not None and owner.token == token:
+        _drop(conversation_id, owner)
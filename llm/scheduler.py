@@ -0,0 +1,202 @@
+"""Process-wide scheduler for Anthropic API calls.
+
+llm_loop's streams and every one-off call made through governor.call() (titles,
+token counts, compaction summaries, summarize) take a scheduler.slot(), which
+enforces a per-model concurrency cap, hands free slots to the highest-priority lane
+first (interactive > cron > background), and paces requests with token buckets
+refilled from the anthropic-ratelimit-* response headers. stats() reports queue
+depth and wait times for /status.
+
+The main app and the dashboard run in separate processes, so each has its own
+scheduler; the rate-limit buckets still converge because both read the same headers.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+LANES = ("interactive", "cron", "background")  # highest priority first
+
+MODEL_CONCURRENCY = {
+    "claude-opus-4-6": 2,
+    "claude-sonnet-4-6": 4,
+    "claude-haiku-4-5-20251001": 6,
+}
+DEFAULT_CONCURRENCY = 4
+
+
+def _reset_seconds(value: str) -> float | None:
+    """Seconds until an anthropic-ratelimit-*-reset header (RFC 3339 timestamp)."""
+    try:
+        return max(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+class _TokenBucket:
+    """Continuously refilling bucket. Unlimited until the first headers arrive."""
+
+    def __init__(self):
+        self.capacity = None
+        self.tokens = 0.0
+        self.rate = 0.0  # tokens per second
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.capacity is not None:
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def update(self, limit: str | None, remaining: str | None, reset: str | None):
+        try:
+            limit, remaining = float(limit), float(remaining)
+        except (TypeError, ValueError):
+            return
+        self._refill()
+        self.capacity = limit
+        self.tokens = remaining
+        # limits are per minute and replenish continuously; a reset header narrows that down
+        seconds = _reset_seconds(reset) if reset else None
+        self.rate = (limit - remaining) / seconds if seconds else limit / 60
+        self.rate = max(self.rate, limit / 60)
+
+    def delay(self, cost: float) -> float:
+        """Seconds until cost tokens are available."""
+        self._refill()
+        if self.capacity is None or self.rate <= 0:
+            return 0.0
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        if self.capacity is not None:
+            self.tokens -= min(cost, self.capacity)
+
+
+class _LaneStats:
+    def __init__(self):
+        self.queued = 0
+        self.started = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "queued": self.queued,
+            "started": self.started,
+            "avg_wait_ms": int(self.wait_total / self.started * 1000) if self.started else 0,
+            "max_wait_ms": int(self.wait_max * 1000),
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self._active: dict[str, int] = {}
+        self._waiting: dict[str, list] = {}  # model -> heap of (lane rank, seq, future)
+        self._seq = itertools.count()
+        self._requests: dict[str, _TokenBucket] = {}
+        self._input_tokens: dict[str, _TokenBucket] = {}
+        self._lanes = {lane: _LaneStats() for lane in LANES}
+
+    def _cap(self, model: str) -> int:
+        return MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY)
+
+    def _pump(self, model: str):
+        heap = self._waiting.get(model, [])
+        while heap and self._active.get(model, 0) < self._cap(model):
+            _, _, future = heapq.heappop(heap)
+            if future.done():
+                continue  # waiter was cancelled
+            self._active[model] = self._active.get(model, 0) + 1
+            future.set_result(None)
+
+    def _release(self, model: str):
+        self._active[model] -= 1
+        self._pump(model)
+
+    async def _acquire(self, model: str, lane: str):
+        if self._active.get(model, 0) < self._cap(model) and not self._waiting.get(model):
+            self._active[model] = self._active.get(model, 0) + 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting.setdefault(model, []), (LANES.index(lane), next(self._seq), future))
+        self._pump(model)  # the queue may have held only cancelled waiters
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(model)  # granted just as we were cancelled
+            else:
+                future.cancel()
+            raise
+
+    @asynccontextmanager
+    async def slot(self, model: str, lane: str = "interactive", cost: int = 0):
+        """Hold one of model's concurrency slots for the duration of an API call.
+        cost is the estimated input tokens, used for rate-limit pacing."""
+        stats = self._lanes[lane]
+        stats.queued += 1
+        start = time.monotonic()
+        try:
+            await self._acquire(model, lane)
+        finally:
+            stats.queued -= 1
+        try:
+            requests = self._requests.setdefault(model, _TokenBucket())
+            tokens = self._input_tokens.setdefault(model, _TokenBucket())
+            delay = max(requests.delay(1), tokens.delay(cost))
+            if delay > 0:
+                print(f"[scheduler] {model} rate limit pacing: waiting {delay:.1f}s ({lane})")
+                await asyncio.sleep(delay)
+            requests.take(1)
+            tokens.take(cost)
+
+            waited = time.monotonic() - start
+            stats.started += 1
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+            yield
+        finally:
+            self._release(model)
+
+    def observe(self, model: str, headers):
+        """Feed anthropic-ratelimit-* headers from any response (including 429s) into the buckets."""
+        if not headers:
+            return
+        prefix = "anthropic-ratelimit-"
+        self._requests.setdefault(model, _TokenBucket()).update(
+            headers.get(prefix + "requests-limit"),
+            headers.get(prefix + "requests-remaining"),
+            headers.get(prefix + "requests-reset"),
+        )
+        self._input_tokens.setdefault(model, _TokenBucket()).update(
+            headers.get(prefix + "input-tokens-limit"),
+            headers.get(prefix + "input-tokens-remaining"),
+            headers.get(prefix + "input-tokens-reset"),
+        )
+
+    def stats(self) -> dict:
+        models = set(self._active) | set(self._waiting)
+        return {
+            "lanes": {lane: s.as_dict() for lane, s in self._lanes.items()},
+            "models": {
+                model: {
+                    "active": self._active.get(model, 0),
+                    "limit": self._cap(model),
+                    "queued": sum(1 for *_, f in self._waiting.get(model, []) if not f.done()),
+                }
+                for model in sorted(models)
+            },
+        }
+
+
+scheduler = Scheduler()
+
+
+def lane_for_source(source: str | None) -> str:
+    """Priority lane for a conversation by its meta source."""
+    return "cron" if source == "cron" else "interactive"
@@ -10,11 +10,15 @@ from pydantic import BaseModel
 import uvicorn
 
 from llm import run_conversation
+from llm.scheduler import scheduler
+from llm.governor import governor
+from llm.discord_stream import DiscordStream
 from storage.conversations import create_conversation, conversation_exists, find_conversation_by_thread
 from storage.tasks import get_due_tasks, list_tasks
 from storage.schedule import load_schedule, save_schedule, load_wake_log, save_wake_log, log_wake_event
+from tools.web_cache import search_cache
 from utils.notify import notify_discord_async
-from utils.http_utils import post_json
+from utils.http_utils import post_json_async, close_sessions
 from utils.constants import BOT_URL
 
 ROOT = Path(__file__).parent
@@ -28,6 +32,11 @@ async def json_error_handler(request: Request, exc: Exception):
     return JSONResponse(status_code=500, content={"error": str(exc)})
 
 
+@app.on_event("shutdown")
+async def close_http_sessions():
+    await close_sessions()
+
+
 # --- Models ---
 
 class ChatRequest(BaseModel):
@@ -79,18 +88,26 @@ def _build_task_section(fallback: str = "\n\nNo tasks are currently due.", inclu
 
 @app.get("/status")
 def status():
-    return {"status": "ok", "time": datetime.now().isoformat()}
+    return {
+        "status": "ok",
+        "time": datetime.now().isoformat(),
+        "llm": {**scheduler.stats(), "breaker": governor.stats()},
+        "web": {"search_cache": search_cache.stats()},
+    }
 
 
 async def _discord_respond(prompt: str, conversation_id: str, discord_thread_id: int):
-    """Background task: run LLM and push result to discord via /send."""
+    """Background task: run LLM and stream the reply into the discord thread via /send + /edit."""
+    stream = DiscordStream(discord_thread_id)
+    stream.start()
     try:
-        result = await run_conversation(prompt, conversation_id)
-        if result:
-            await notify_discord_async(result, thread_id=discord_thread_id)
+        result = await run_conversation(prompt, conversation_id, stream_callback=stream.callback)
+        await stream.finish(result)
     except Exception as e:
         print(f"[main] _discord_respond error: {e}")
-        await notify_discord_async(f"⚠️ Error: {e}", thread_id=discord_thread_id)
+        message = f"⚠️ Error: {e}"
+        if not await stream.finish(message):
+            await notify_discord_async(message, thread_id=discord_thread_id)
 
 
 @app.post("/discord")
@@ -143,10 +160,9 @@ async def wake(req: WakeRequest):
             payload = {"message": entry["message"]}
             if entry.get("thread_id"):
                 payload["thread_id"] = entry["thread_id"]
-            try:
-                post_json(f"{BOT_URL}/send", payload, timeout=15)
-            except Exception as e:
-                print(f"[main] notification send error: {e}")
+            result = await post_json_async(f"{BOT_URL}/send", payload, timeout=15)
+            if "error" in result:
+                print(f"[main] notification send error: {result['error']}")
     if fired_notifs:
         schedule["notifications"] = [
             e for e in schedule.get("notifications", []) if e["id"] not in fired_notifs
@@ -1,13 +1,23 @@
+import bisect
+import fcntl
+import heapq
 import json
+import os
 import shutil
+import threading
 import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
+from storage import db
 from utils.text import title_to_slug
 
 ROOT = Path(__file__).parent.parent
 DATA_DIR = ROOT / "data" / "conversations"
+THREAD_INDEX_PATH = ROOT / "data" / "thread_index.jsonl"
+META_INDEX_PATH = ROOT / "data" / "conversation_index.jsonl"
 
 
 def _generate_conversation_id(title: str) -> str:
@@ -16,7 +26,7 @@ def _generate_conversation_id(title: str) -> str:
     candidate = slug
     counter = 1
 
-    while _conversation_path(candidate).exists():
+    while conversation_exists(candidate):
         candidate = f"{slug}-{counter}"
         counter += 1
 
@@ -36,19 +46,843 @@ def _versions_path(conversation_id: str) -> Path:
 
 
 def _full_path(conversation_id: str) -> Path:
-    return _conversation_path(conversation_id) / "full.json"
+    return _conversation_path(conversation_id) / "full.jsonl"
+
+
+def _system_prompt_path(version_path: Path) -> Path:
+    return version_path.with_suffix(".system.md")
+
+
+def _head_path(conversation_id: str) -> Path:
+    """versions/HEAD holds the latest version number, so lookups never glob the directory."""
+    return _versions_path(conversation_id) / "HEAD"
+
+
+def _write_head(conversation_id: str, num: int):
+    head = _head_path(conversation_id)
+    tmp = head.with_suffix(".tmp")
+    tmp.write_text(str(num))
+    tmp.replace(head)
+
+
+# --- JSONL segments ---
+#
+# Versions and full history are append-only JSONL: one message per line, so an
+# append costs O(message) instead of re-serializing the whole conversation.
+# A version file starts with a header line ({"version": N, "summary": ...});
+# the system prompt lives in a sidecar file since it is rewritten every turn.
+
+
+def _dump_line(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False) + "\n"
+
+
+def _append_line(path: Path, obj):
+    with open(path, "a+b") as f:
+        _terminate_torn_line(f)
+        f.write(_dump_line(obj).encode("utf-8"))
+
+
+def _terminate_torn_line(f):
+    """End a torn last line (crash mid-write) before appending, so the next record
+    starts on its own line instead of being glued onto the garbage and dropped with it."""
+    if f.seek(0, os.SEEK_END) == 0:
+        return
+    f.seek(-1, os.SEEK_END)
+    if f.read(1) != b"\n":
+        f.write(b"\n")
+
+
+def _read_lines(path: Path) -> list:
+    """Parse a JSONL file, skipping a torn trailing line left by a crash mid-write."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def _write_version_file(path: Path, version: dict):
+    header = {"version": version["version"], "summary": version.get("summary", "")}
+    lines = [_dump_line(header)] + [_dump_line(m) for m in version.get("messages", [])]
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("".join(lines), encoding="utf-8")
+    tmp.replace(path)
+
+
+def _read_version_file(path: Path) -> dict:
+    records = _read_lines(path)
+    header = records[0] if records else {"version": int(path.stem), "summary": ""}
+    system_path = _system_prompt_path(path)
+    return {
+        "version": header.get("version", int(path.stem)),
+        "summary": header.get("summary", ""),
+        "system_prompt": system_path.read_text(encoding="utf-8") if system_path.exists() else None,
+        "messages": records[1:],
+    }
+
+
+def _migrate_legacy(conversation_id: str):
+    """Convert indent=2 JSON versions/full history from older releases to JSONL segments."""
+    versions_path = _versions_path(conversation_id)
+    for legacy in versions_path.glob("*.json"):
+        version = json.loads(legacy.read_text())
+        path = legacy.with_suffix(".jsonl")
+        _write_version_file(path, version)
+        if version.get("system_prompt"):
+            _system_prompt_path(path).write_text(version["system_prompt"], encoding="utf-8")
+        legacy.unlink()
+
+    legacy_full = _conversation_path(conversation_id) / "full.json"
+    if legacy_full.exists():
+        messages = json.loads(legacy_full.read_text()).get("messages", [])
+        tmp = _full_path(conversation_id).with_suffix(".tmp")
+        tmp.write_text("".join(_dump_line(m) for m in messages), encoding="utf-8")
+        tmp.replace(_full_path(conversation_id))
+        legacy_full.unlink()
+
+
+def _ensure_migrated(conversation_id: str):
+    if any(_versions_path(conversation_id).glob("*.json")) or (_conversation_path(conversation_id) / "full.json").exists():
+        _migrate_legacy(conversation_id)
+
+
+def _version_files(conversation_id: str) -> list[Path]:
+    _ensure_migrated(conversation_id)
+    return sorted(_versions_path(conversation_id).glob("*.jsonl"), key=lambda f: int(f.stem))
+
+
+_flocks = threading.local()
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive cross-process lock (flock on a sibling .lock file) around writes to path.
+    Reentrant within a thread; the lock is released when the lock file is closed."""
+    held = getattr(_flocks, "held", None)
+    if held is None:
+        held = _flocks.held = set()
+    if path in held:
+        yield
+        return
+    lock_path = path.with_name(path.name + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+
+
+def _stamp(path: Path) -> tuple | None:
+    """Cheap change detector for files another process (e.g. the dashboard) may write."""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _LogIndex:
+    """In-memory index mirrored to an append-only JSONL log shared with other processes.
+
+    Appends and compaction hold a cross-process file lock and re-sync the log first,
+    so a compaction never drops another process's row. Other processes' appends are
+    picked up by reading the tail; a compaction (new inode) makes readers replay
+    from the start. A missing log is rebuilt from the meta files.
+    Subclasses hold the state: _path, _clear, _apply, _live_rows, _live_count, _rebuild_rows.
+    """
+
+    def __init__(self):
+        self._ino = None
+        self._offset = 0
+        self._lines = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _reset(self):
+        self._clear()
+        self._ino, self._offset, self._lines = None, 0, 0
+
+    def _sync(self):
+        """Replay whatever part of the log this process has not seen yet."""
+        try:
+            f = open(self._path(), "rb")
+        except FileNotFoundError:
+            self.rebuild()
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._ino or st.st_size < self._offset:
+                self._reset()  # replaced by a compaction (or truncated)
+                self._ino = st.st_ino
+            if self._loaded and st.st_size == self._offset:
+                return
+            f.seek(self._offset)
+            chunk = f.read()
+        end = chunk.rfind(b"\n") + 1  # leave a torn trailing line for the next sync
+        for line in chunk[:end].splitlines():
+            try:
+                self._apply(json.loads(line))
+            except (json.JSONDecodeError, KeyError):
+                continue
+            self._lines += 1
+        self._offset += end
+        self._loaded = True
+
+    def _compact(self):
+        """Rewrite the log as just the live rows. Call with the file lock held and the log synced."""
+        path = self._path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        rows = self._live_rows()
+        data = "".join(_dump_line(row) for row in rows)
+        tmp.write_text(data, encoding="utf-8")
+        tmp.replace(path)
+        self._ino = path.stat().st_ino
+        self._offset = len(data.encode("utf-8"))
+        self._lines = len(rows)
+
+    def _append(self, row: dict):
+        with _file_lock(self._path()):
+            self._sync()
+            _append_line(self._path(), row)
+            self._sync()  # picks up the row just written
+            if self._lines > 2 * self._live_count() + 256:
+                self._compact()
+
+    def rebuild(self):
+        with self._lock, _file_lock(self._path()):
+            self._reset()
+            for row in self._rebuild_rows():
+                self._apply(row)
+            self._compact()
+            self._loaded = True
+
+
+class _ThreadIndex(_LogIndex):
+    """Persistent discord_thread_id -> conversation_id map for the file backend.
+
+    Kept in memory and mirrored to THREAD_INDEX_PATH (one {"id", "thread"} row per
+    change, thread null when a conversation loses its thread), so Discord routing is
+    a dict lookup instead of a scan of every meta.json.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._threads: dict[str, str] = {}
+        self._by_conversation: dict[str, str] = {}
+
+    def _path(self) -> Path:
+        return THREAD_INDEX_PATH
+
+    def _clear(self):
+        self._threads, self._by_conversation = {}, {}
+
+    def _apply(self, row: dict):
+        conversation_id, tid = row["id"], row.get("thread")
+        old = self._by_conversation.pop(conversation_id, None)
+        if old is not None and self._threads.get(old) == conversation_id:
+            del self._threads[old]
+        if tid is not None:
+            self._threads.setdefault(tid, conversation_id)
+            self._by_conversation[conversation_id] = tid
+
+    def _live_rows(self) -> list:
+        # thread owners first, so a replay gives each thread to the same conversation
+        rows = [{"id": cid, "thread": tid} for tid, cid in self._threads.items()]
+        rows += [{"id": cid, "thread": tid} for cid, tid in self._by_conversation.items()
+                 if self._threads.get(tid) != cid]
+        return rows
+
+    def _live_count(self) -> int:
+        return len(self._by_conversation)  # every thread owner is also in _by_conversation
+
+    def _rebuild_rows(self) -> list:
+        THREAD_INDEX_PATH.with_suffix(".json").unlink(missing_ok=True)  # pre-JSONL format
+        rows = []
+        if DATA_DIR.exists():
+            # sorted descending so the first conversation (old scan order) wins
+            for path in sorted(DATA_DIR.iterdir(), reverse=True):
+                meta_file = path / "meta.json"
+                if not meta_file.exists():
+                    continue
+                try:
+                    meta = json.loads(meta_file.read_text())
+                except Exception:
+                    continue
+                if meta.get("discord_thread_id"):
+                    rows.append({"id": meta["id"], "thread": str(meta["discord_thread_id"])})
+        return rows
+
+    def lookup(self, discord_thread_id) -> str | None:
+        with self._lock:
+            self._sync()
+            return self._threads.get(str(discord_thread_id))
+
+    def set(self, conversation_id: str, discord_thread_id):
+        """Point discord_thread_id at conversation_id (None removes the conversation's entry)."""
+        with self._lock:
+            self._sync()
+            tid = str(discord_thread_id) if discord_thread_id else None
+            if self._by_conversation.get(conversation_id) == tid:
+                return
+            self._append({"id": conversation_id, "thread": tid})
+
+
+_thread_index = _ThreadIndex()
+
+
+_INDEX_FIELDS = ("id", "title", "source", "status", "summary", "created_at", "updated_at", "discord_thread_id")
+
+
+def _index_row(meta: dict) -> dict:
+    return {k: meta[k] for k in _INDEX_FIELDS if k in meta}
+
+
+def _cursor_key(cursor: str | None) -> tuple | None:
+    if not cursor:
+        return None
+    updated_at, _, conversation_id = cursor.partition("|")
+    return (updated_at, conversation_id)
+
+
+def _matches(row: dict, source: str = None, status: str = None, exclude_source: str = None) -> bool:
+    if source and row.get("source") != source:
+        return False
+    if status and row.get("status") != status:
+        return False
+    if exclude_source and row.get("source") == exclude_source:
+        return False
+    return True
+
+
+class _MetaIndex(_LogIndex):
+    """Conversation summaries ordered by updated_at, for the file backend.
+
+    Mirrored to META_INDEX_PATH (one row per meta write, tombstones for deletes).
+    Rows sit in memory next to a sorted key list, so an unfiltered page is a bisect
+    plus O(page) walk. A filtered page stops once it is full, but a selective filter
+    (e.g. a rare source) may walk every older row to find it — in memory, no I/O.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._rows: dict[str, dict] = {}
+        self._keys: list[tuple] = []  # (updated_at, id), ascending
+
+    def _path(self) -> Path:
+        return META_INDEX_PATH
+
+    def _clear(self):
+        self._rows, self._keys = {}, []
+
+    @staticmethod
+    def _key(row: dict) -> tuple:
+        return (row.get("updated_at") or row.get("created_at") or "", row["id"])
+
+    def _apply(self, row: dict):
+        old = self._rows.pop(row["id"], None)
+        if old is not None:
+            i = bisect.bisect_left(self._keys, self._key(old))
+            if i < len(self._keys) and self._keys[i] == self._key(old):
+                self._keys.pop(i)
+        if not row.get("deleted"):
+            self._rows[row["id"]] = row
+            bisect.insort(self._keys, self._key(row))
+
+    def _live_rows(self) -> list:
+        return [self._rows[cid] for _, cid in self._keys]
+
+    def _live_count(self) -> int:
+        return len(self._rows)
+
+    def _rebuild_rows(self) -> list:
+        rows = []
+        if DATA_DIR.exists():
+            for path in DATA_DIR.iterdir():
+                meta_file = path / "meta.json"
+                if not meta_file.exists():
+                    continue
+                try:
+                    meta = json.loads(meta_file.read_text())
+                except Exception:
+                    continue
+                meta.setdefault("id", path.name)
+                rows.append(_index_row(meta))
+        return rows
+
+    def put(self, meta: dict):
+        row = _index_row(meta)
+        with self._lock:
+            self._sync()
+            if self._rows.get(row.get("id")) == row:
+                return  # nothing the index keeps has changed
+            self._append(row)
+
+    def remove(self, conversation_id: str):
+        with self._lock:
+            self._append({"id": conversation_id, "deleted": True})
+
+    def page(self, limit: int, cursor: str = None, **filters) -> tuple[list, str | None]:
+        with self._lock:
+            self._sync()
+            start = bisect.bisect_left(self._keys, _cursor_key(cursor)) if cursor else len(self._keys)
+            results = []
+            i = start - 1
+            while i >= 0 and len(results) <= limit:
+                row = self._rows[self._keys[i][1]]
+                if _matches(row, **filters):
+                    results.append(dict(row))
+                i -= 1
+            if len(results) > limit:
+                results = results[:limit]
+                last = results[-1]
+                return results, f"{self._key(last)[0]}|{last['id']}"
+            return results, None
+
+    def newest(self, limit: int, **filters) -> list:
+        """The limit most recently created rows matching filters (an in-memory scan)."""
+        with self._lock:
+            self._sync()
+            rows = [row for row in self._rows.values() if _matches(row, **filters)]
+        return [dict(row) for row in heapq.nlargest(limit, rows, key=lambda r: (r.get("created_at") or "", r["id"]))]
+
+    def count(self, **filters) -> int:
+        with self._lock:
+            self._sync()
+            if not any(filters.values()):
+                return len(self._rows)
+            return sum(1 for row in self._rows.values() if _matches(row, **filters))
+
+
+_meta_index = _MetaIndex()
+
+
+# --- backends ---
+#
+# Persistence primitives used by ConversationStore. _FileBackend is the folder-per-
+# conversation layout under data/conversations/; _SQLiteBackend (ZIPPER_STORAGE=sqlite)
+# keeps the same data in indexed tables of data/zipper.db.
+
+
+class _FileBackend:
+    def exists(self, conversation_id: str) -> bool:
+        return _conversation_path(conversation_id).exists()
+
+    def create(self, conversation_id: str):
+        _versions_path(conversation_id).mkdir(parents=True, exist_ok=True)
+        _full_path(conversation_id).touch()
+
+    def delete(self, conversation_id: str) -> bool:
+        path = _conversation_path(conversation_id)
+        if not path.exists():
+            return False
+        shutil.rmtree(path)
+        _thread_index.set(conversation_id, None)
+        _meta_index.remove(conversation_id)
+        return True
+
+    def meta_stamp(self, conversation_id: str):
+        return _stamp(_meta_path(conversation_id))
+
+    def read_meta(self, conversation_id: str) -> dict:
+        return json.loads(_meta_path(conversation_id).read_text())
+
+    def write_meta(self, conversation_id: str, meta: dict):
+        _meta_path(conversation_id).write_text(json.dumps(meta, indent=2))
+        _thread_index.set(conversation_id, meta.get("discord_thread_id"))
+        _meta_index.put(meta)
+
+    def list_metas(self) -> list:
+        if not DATA_DIR.exists():
+            return []
+        results = []
+        for path in sorted(DATA_DIR.iterdir()):
+            meta_file = path / "meta.json"
+            if meta_file.exists():
+                results.append(json.loads(meta_file.read_text()))
+        return results
+
+    def query(self, limit: int, cursor: str = None, **filters) -> tuple[list, str | None]:
+        return _meta_index.page(limit, cursor, **filters)
+
+    def newest(self, limit: int, **filters) -> list:
+        return _meta_index.newest(limit, **filters)
+
+    def count(self, **filters) -> int:
+        return _meta_index.count(**filters)
+
+    def find_by_thread(self, discord_thread_id) -> str | None:
+        conversation_id = _thread_index.lookup(discord_thread_id)
+        if conversation_id and not _meta_path(conversation_id).exists():
+            # conversation folder removed behind our back — rebuild rather than trust the index
+            _thread_index.rebuild()
+            conversation_id = _thread_index.lookup(discord_thread_id)
+        return conversation_id
+
+    def latest_version_num(self, conversation_id: str) -> int | None:
+        head = _head_path(conversation_id)
+        try:
+            return int(head.read_text())
+        except (FileNotFoundError, ValueError):
+            pass
+        # no HEAD yet (conversation from an older release): find it once and record it
+        version_files = _version_files(conversation_id)
+        if not version_files:
+            return None
+        num = int(version_files[-1].stem)
+        _write_head(conversation_id, num)
+        return num
+
+    def version_stamp(self, conversation_id: str, num: int):
+        # the HEAD stamp changes when any process adds a version
+        path = _versions_path(conversation_id) / f"{num}.jsonl"
+        return (_stamp(_head_path(conversation_id)), _stamp(path), _stamp(_system_prompt_path(path)))
+
+    def read_version(self, conversation_id: str, num: int) -> dict:
+        return _read_version_file(_versions_path(conversation_id) / f"{num}.jsonl")
+
+    def write_version(self, conversation_id: str, num: int, version: dict):
+        _write_version_file(_versions_path(conversation_id) / f"{num}.jsonl", version)
+        current = self.latest_version_num(conversation_id)
+        if current is None or num > current:
+            _write_head(conversation_id, num)
+
+    def append_version_message(self, conversation_id: str, num: int, msg: dict):
+        _append_line(_versions_path(conversation_id) / f"{num}.jsonl", msg)
+
+    def write_system_prompt(self, conversation_id: str, num: int, system_prompt: str):
+        path = _versions_path(conversation_id) / f"{num}.jsonl"
+        _system_prompt_path(path).write_text(system_prompt, encoding="utf-8")
+
+    def append_history(self, conversation_id: str, msg: dict):
+        full_path = _full_path(conversation_id)
+        if full_path.exists():
+            _append_line(full_path, msg)
+
+    def read_history(self, conversation_id: str) -> list | None:
+        if (_conversation_path(conversation_id) / "full.json").exists():
+            _migrate_legacy(conversation_id)
+        full_path = _full_path(conversation_id)
+        return _read_lines(full_path) if full_path.exists() else None
+
+
+class _SQLiteBackend:
+    def exists(self, conversation_id: str) -> bool:
+        row = db.connect().execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row is not None
+
+    def create(self, conversation_id: str):
+        pass  # rows are created by write_meta / write_version
+
+    def delete(self, conversation_id: str) -> bool:
+        with db.transaction() as conn:
+            deleted = conn.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,)).rowcount
+            for table in ("versions", "messages", "history", "trace", "usage"):
+                conn.execute(f"DELETE FROM {table} WHERE conversation_id = ?", (conversation_id,))
+        return bool(deleted)
+
+    def meta_stamp(self, conversation_id: str):
+        row = db.connect().execute("SELECT rev FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return row["rev"] if row else None
+
+    def read_meta(self, conversation_id: str) -> dict:
+        row = db.connect().execute("SELECT meta FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        if row is None:
+            # same exception the file backend raises, which callers already handle
+            raise FileNotFoundError(f"conversation not found: {conversation_id}")
+        return db.loads(row["meta"])
+
+    def write_meta(self, conversation_id: str, meta: dict):
+        thread_id = meta.get("discord_thread_id")
+        db.connect().execute(
+            "INSERT INTO conversations (id, source, status, discord_thread_id, created_at, updated_at, meta)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(id) DO UPDATE SET source = excluded.source, status = excluded.status,"
+            " discord_thread_id = excluded.discord_thread_id, updated_at = excluded.updated_at,"
+            " meta = excluded.meta, rev = rev + 1",
+            (conversation_id, meta.get("source"), meta.get("status"), str(thread_id) if thread_id else None,
+             meta.get("created_at"), meta.get("updated_at"), db.dumps(meta)),
+        )
+
+    def list_metas(self) -> list:
+        rows = db.connect().execute("SELECT meta FROM conversations ORDER BY id").fetchall()
+        return [db.loads(r["meta"]) for r in rows]
+
+    @staticmethod
+    def _where(cursor: str = None, source: str = None, status: str = None, exclude_source: str = None):
+        clauses, params = [], []
+        if cursor:
+            clauses.append("(updated_at, id) < (?, ?)")
+            params.extend(_cursor_key(cursor))
+        if source:
+            clauses.append("source = ?")
+            params.append(source)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if exclude_source:
+            clauses.append("source IS NOT ?")
+            params.append(exclude_source)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def query(self, limit: int, cursor: str = None, **filters) -> tuple[list, str | None]:
+        where, params = self._where(cursor, **filters)
+        rows = db.connect().execute(
+            f"SELECT meta, updated_at FROM conversations {where} ORDER BY updated_at DESC, id DESC LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        results = [db.loads(r["meta"]) for r in rows[:limit]]
+        if len(rows) > limit:
+            return results, f"{rows[limit - 1]['updated_at']}|{results[-1]['id']}"
+        return results, None
+
+    def newest(self, limit: int, **filters) -> list:
+        where, params = self._where(**filters)
+        rows = db.connect().execute(
+            f"SELECT meta FROM conversations {where} ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit)
+        ).fetchall()
+        return [db.loads(r["meta"]) for r in rows]
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        return db.connect().execute(f"SELECT COUNT(*) FROM conversations {where}", params).fetchone()[0]
+
+    def find_by_thread(self, discord_thread_id) -> str | None:
+        row = db.connect().execute(
+            "SELECT id FROM conversations WHERE discord_thread_id = ? ORDER BY id LIMIT 1", (str(discord_thread_id),)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def latest_version_num(self, conversation_id: str) -> int | None:
+        row = db.connect().execute(
+            "SELECT MAX(version) AS v FROM versions WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return row["v"]
+
+    def version_stamp(self, conversation_id: str, num: int):
+        row = db.connect().execute(
+            "SELECT (SELECT MAX(version) FROM versions WHERE conversation_id = ?) AS latest, rev"
+            " FROM versions WHERE conversation_id = ? AND version = ?",
+            (conversation_id, conversation_id, num),
+        ).fetchone()
+        return (row["latest"], row["rev"]) if row else None
+
+    def read_version(self, conversation_id: str, num: int) -> dict:
+        conn = db.connect()
+        row = conn.execute(
+            "SELECT summary, system_prompt FROM versions WHERE conversation_id = ? AND version = ?",
+            (conversation_id, num),
+        ).fetchone()
+        rows = conn.execute(
+            "SELECT message FROM messages WHERE conversation_id = ? AND version = ? ORDER BY seq",
+            (conversation_id, num),
+        ).fetchall()
+        return {
+            "version": num,
+            "summary": row["summary"] if row else "",
+            "system_prompt": row["system_prompt"] if row else None,
+            "messages": [db.loads(r["message"]) for r in rows],
+        }
+
+    def write_version(self, conversation_id: str, num: int, version: dict):
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO versions (conversation_id, version, summary) VALUES (?, ?, ?)"
+                " ON CONFLICT(conversation_id, version) DO UPDATE SET summary = excluded.summary, rev = rev + 1",
+                (conversation_id, num, version.get("summary", "")),
+            )
+            conn.execute("DELETE FROM messages WHERE conversation_id = ? AND version = ?", (conversation_id, num))
+            conn.executemany(
+                "INSERT INTO messages (conversation_id, version, seq, message) VALUES (?, ?, ?, ?)",
+                [(conversation_id, num, i, db.dumps(m)) for i, m in enumerate(version.get("messages", []))],
+            )
+
+    def append_version_message(self, conversation_id: str, num: int, msg: dict):
+        with db.transaction() as conn:
+            conn.execute(
+                "INSERT INTO messages (conversation_id, version, seq, message) VALUES (?, ?,"
+                " (SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE conversation_id = ? AND version = ?), ?)",
+                (conversation_id, num, conversation_id, num, db.dumps(msg)),
+            )
+            conn.execute(
+                "UPDATE versions SET rev = rev + 1 WHERE conversation_id = ? AND version = ?", (conversation_id, num)
+            )
+
+    def write_system_prompt(self, conversation_id: str, num: int, system_prompt: str):
+        db.connect().execute(
+            "UPDATE versions SET system_prompt = ?, rev = rev + 1 WHERE conversation_id = ? AND version = ?",
+            (system_prompt, conversation_id, num),
+        )
+
+    def append_history(self, conversation_id: str, msg: dict):
+        db.connect().execute(
+            "INSERT INTO history (conversation_id, seq, message) VALUES (?,"
+            " (SELECT COALESCE(MAX(seq) + 1, 0) FROM history WHERE conversation_id = ?), ?)",
+            (conversation_id, conversation_id, db.dumps(msg)),
+        )
+
+    def read_history(self, conversation_id: str) -> list | None:
+        rows = db.connect().execute(
+            "SELECT message FROM history WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+        ).fetchall()
+        return [db.loads(r["message"]) for r in rows]
+
+
+def _backend():
+    return _SQLiteBackend() if db.enabled() else _FileBackend()
+
+
+class ConversationStore:
+    """In-process cache of conversation meta and latest version, with write-through to disk.
+
+    Entries are validated against a cheap backend stamp (file mtime + size, or a
+    row revision in SQLite) rather than re-parsed, so the LLM hot loop reads back
+    what it just wrote without touching JSON again. Least-recently-used
+    conversations are evicted past max_entries.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.RLock()
+
+    @property
+    def backend(self):
+        return _backend()
+
+    def _entry(self, conversation_id: str) -> dict:
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            entry = {"meta": None, "meta_stamp": None, "version": None, "version_stamp": None}
+            self._entries[conversation_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(conversation_id)
+        return entry
+
+    # --- meta ---
+
+    def _meta(self, conversation_id: str) -> dict:
+        entry = self._entry(conversation_id)
+        stamp = self.backend.meta_stamp(conversation_id)
+        if entry["meta"] is None or stamp != entry["meta_stamp"]:
+            entry["meta"] = self.backend.read_meta(conversation_id)
+            entry["meta_stamp"] = stamp
+        return entry["meta"]
+
+    def _write_meta(self, conversation_id: str, meta: dict):
+        self.backend.write_meta(conversation_id, meta)
+        entry = self._entry(conversation_id)
+        entry["meta"] = meta
+        entry["meta_stamp"] = self.backend.meta_stamp(conversation_id)
+
+    def get_meta(self, conversation_id: str) -> dict:
+        with self._lock:
+            return dict(self._meta(conversation_id))
+
+    def put_meta(self, conversation_id: str, meta: dict):
+        with self._lock:
+            self._write_meta(conversation_id, dict(meta))
+
+    def update_meta(self, conversation_id: str, **kwargs):
+        with self._lock:
+            meta = dict(self._meta(conversation_id))
+            meta.update(kwargs)
+            meta["updated_at"] = datetime.now().isoformat()
+            self._write_meta(conversation_id, meta)
+
+    # --- versions ---
+
+    def _version(self, conversation_id: str) -> dict:
+        entry = self._entry(conversation_id)
+        cached = entry["version"]
+        if cached is not None:
+            if self.backend.version_stamp(conversation_id, cached["version"]) == entry["version_stamp"]:
+                return cached
+        num = self.backend.latest_version_num(conversation_id)
+        if num is None:
+            self._write_version(conversation_id, 0, {"version": 0, "summary": "", "messages": []})
+            return entry["version"]
+        entry["version"] = self.backend.read_version(conversation_id, num)
+        entry["version_stamp"] = self.backend.version_stamp(conversation_id, num)
+        return entry["version"]
+
+    def _refresh_version_stamp(self, conversation_id: str):
+        entry = self._entry(conversation_id)
+        entry["version_stamp"] = self.backend.version_stamp(conversation_id, entry["version"]["version"])
+
+    def _write_version(self, conversation_id: str, num: int, version: dict):
+        version = {"version": num, "summary": version.get("summary", ""), "system_prompt": None,
+                   "messages": list(version.get("messages", []))}
+        self.backend.write_version(conversation_id, num, version)
+        self._entry(conversation_id)["version"] = version
+        self._refresh_version_stamp(conversation_id)
+
+    def latest_version(self, conversation_id: str) -> dict:
+        with self._lock:
+            version = self._version(conversation_id)
+            return {**version, "messages": list(version["messages"])}
+
+    def create_version(self, conversation_id: str, summary: str, messages: list):
+        with self._lock:
+            latest = self.backend.latest_version_num(conversation_id)
+            next_num = 0 if latest is None else latest + 1
+            self._write_version(conversation_id, next_num, {"summary": summary, "messages": messages})
+
+    def set_system_prompt(self, conversation_id: str, system_prompt: str):
+        with self._lock:
+            version = self._version(conversation_id)
+            self.backend.write_system_prompt(conversation_id, version["version"], system_prompt)
+            version["system_prompt"] = system_prompt
+            self._refresh_version_stamp(conversation_id)
+
+    def save_messages(self, conversation_id: str, messages: list):
+        with self._lock:
+            version = self._version(conversation_id)
+            version["messages"] = list(messages)
+            self.backend.write_version(conversation_id, version["version"], version)
+            self._refresh_version_stamp(conversation_id)
+
+    def pop_last_message(self, conversation_id: str):
+        with self._lock:
+            version = self._version(conversation_id)
+            if version["messages"]:
+                self.save_messages(conversation_id, version["messages"][:-1])
+
+    def append_message(self, conversation_id: str, msg: dict):
+        with self._lock:
+            version = self._version(conversation_id)
+            self.backend.append_version_message(conversation_id, version["version"], msg)
+            version["messages"].append(msg)
+            self._refresh_version_stamp(conversation_id)
+
+    def forget(self, conversation_id: str):
+        with self._lock:
+            self._entries.pop(conversation_id, None)
+
+
+store = ConversationStore()
 
 
 def conversation_exists(conversation_id: str) -> bool:
-    return _conversation_path(conversation_id).exists()
+    return _backend().exists(conversation_id)
 
 
 def create_conversation(title: str, source: str, discord_thread_id: str = None, conversation_id: str = None) -> str:
     if conversation_id is None:
         conversation_id = _generate_conversation_id(title)
-    path = _conversation_path(conversation_id)
-    path.mkdir(parents=True, exist_ok=True)
-    _versions_path(conversation_id).mkdir(exist_ok=True)
+    _backend().create(conversation_id)
 
     meta = {
         "id": conversation_id,
@@ -61,127 +895,72 @@ def create_conversation(title: str, source: str, discord_thread_id: str = None,
         "summary": "",
         "key_points": [],
     }
-    _meta_path(conversation_id).write_text(json.dumps(meta, indent=2))
+    store.put_meta(conversation_id, meta)
 
     # create first version
     create_version(conversation_id, summary="", messages=[])
 
-    # initialize full history log
-    _full_path(conversation_id).write_text(json.dumps({"messages": []}, indent=2))
-
     return conversation_id
 
 
 def get_conversation(conversation_id: str) -> dict:
-    return json.loads(_meta_path(conversation_id).read_text())
+    return store.get_meta(conversation_id)
 
 
 def update_meta(conversation_id: str, **kwargs):
-    meta = get_conversation(conversation_id)
-    meta.update(kwargs)
-    meta["updated_at"] = datetime.now().isoformat()
-    _meta_path(conversation_id).write_text(json.dumps(meta, indent=2))
+    store.update_meta(conversation_id, **kwargs)
 
 
 def get_full_history(conversation_id: str) -> list:
     """Return all messages ever in this conversation (across compaction boundaries).
-    Falls back to latest version if full.json doesn't exist (older conversations).
+    Falls back to latest version if full.jsonl doesn't exist (older conversations).
     """
-    full_path = _full_path(conversation_id)
-    if full_path.exists():
-        return json.loads(full_path.read_text()).get("messages", [])
+    history = _backend().read_history(conversation_id)
+    if history is not None:
+        return history
     return get_latest_version(conversation_id).get("messages", [])
 
 
 def get_latest_version(conversation_id: str) -> dict:
-    versions_path = _versions_path(conversation_id)
-    version_files = sorted(versions_path.glob("*.json"), key=lambda f: int(f.stem))
-    if not version_files:
-        create_version(conversation_id, summary="", messages=[])
-        return get_latest_version(conversation_id)
-    latest = version_files[-1]
-    return json.loads(latest.read_text())
+    return store.latest_version(conversation_id)
 
 
 # Keep old name as alias for callers not yet updated
 get_active_version = get_latest_version
 
 
-def _latest_version_path(conversation_id: str) -> Path:
-    versions_path = _versions_path(conversation_id)
-    version_files = sorted(versions_path.glob("*.json"), key=lambda f: int(f.stem))
-    return version_files[-1]
-
-
-# Keep old name as alias
-_active_version_path = _latest_version_path
-
-
 def create_version(conversation_id: str, summary: str, messages: list):
-    versions_path = _versions_path(conversation_id)
-    existing = sorted(versions_path.glob("*.json"), key=lambda f: int(f.stem))
-    next_num = len(existing)
-    version = {"version": next_num, "summary": summary, "system_prompt": None, "messages": messages}
-    (versions_path / f"{next_num}.json").write_text(json.dumps(version, indent=2))
+    store.create_version(conversation_id, summary, messages)
 
 
 def set_system_prompt(conversation_id: str, system_prompt: str):
-    version_path = _latest_version_path(conversation_id)
-    version = json.loads(version_path.read_text())
-    version["system_prompt"] = system_prompt
-    version_path.write_text(json.dumps(version, indent=2))
+    store.set_system_prompt(conversation_id, system_prompt)
 
 
 def pop_last_message(conversation_id: str):
     """Remove the last message from the active version. Used to roll back on API failure."""
-    version_path = _latest_version_path(conversation_id)
-    version = json.loads(version_path.read_text())
-    if version["messages"]:
-        version["messages"].pop()
-    version_path.write_text(json.dumps(version, indent=2))
+    store.pop_last_message(conversation_id)
 
 
 def save_messages(conversation_id: str, messages: list):
     """Overwrite messages in the active version. Used to persist sanitization."""
-    version_path = _latest_version_path(conversation_id)
-    version = json.loads(version_path.read_text())
-    version["messages"] = messages
-    version_path.write_text(json.dumps(version, indent=2))
+    store.save_messages(conversation_id, messages)
 
 
 def append_message(conversation_id: str, role: str, content):
     msg = {"role": role, "content": content}
 
-    version_path = _latest_version_path(conversation_id)
-    version = json.loads(version_path.read_text())
-    version["messages"].append(msg)
-    version_path.write_text(json.dumps(version, indent=2))
+    store.append_message(conversation_id, msg)
 
     # keep full history in sync
-    full_path = _full_path(conversation_id)
-    if full_path.exists():
-        full = json.loads(full_path.read_text())
-        full["messages"].append(msg)
-        full_path.write_text(json.dumps(full, indent=2))
+    _backend().append_history(conversation_id, msg)
 
     update_meta(conversation_id)
 
 
 def find_conversation_by_thread(discord_thread_id: int) -> str | None:
-    """Scan conversation meta files to find one matching the given discord thread ID."""
-    if not DATA_DIR.exists():
-        return None
-    for path in sorted(DATA_DIR.iterdir()):
-        meta_file = path / "meta.json"
-        if not meta_file.exists():
-            continue
-        try:
-            meta = json.loads(meta_file.read_text())
-            if meta.get("discord_thread_id") == discord_thread_id:
-                return meta["id"]
-        except Exception:
-            pass
-    return None
+    """Resolve a Discord thread ID to its conversation, or None."""
+    return _backend().find_by_thread(discord_thread_id)
 
 
 def get_conversation_thread_id(conversation_id: str) -> int | None:
@@ -194,20 +973,36 @@ def get_conversation_thread_id(conversation_id: str) -> int | None:
 
 
 def list_conversations() -> list:
-    if not DATA_DIR.exists():
-        return []
-    results = []
-    for path in sorted(DATA_DIR.iterdir()):
-        meta_file = path / "meta.json"
-        if meta_file.exists():
-            results.append(json.loads(meta_file.read_text()))
-    return results
+    return _backend().list_metas()
+
+
+def query_conversations(
+    limit: int = 20,
+    cursor: str = None,
+    source: str = None,
+    status: str = None,
+    exclude_source: str = None,
+) -> tuple[list, str | None]:
+    """One page of conversation metadata, most recently updated first.
+
+    Returns (rows, next_cursor); pass next_cursor back to get the following page.
+    File-backend rows carry the index fields only (id, title, source, status,
+    summary, created_at, updated_at, discord_thread_id).
+    """
+    return _backend().query(limit, cursor, source=source, status=status, exclude_source=exclude_source)
+
+
+def newest_conversations(limit: int = 5, source: str = None, status: str = None, exclude_source: str = None) -> list:
+    """The most recently created conversations, newest first (same row shape as query_conversations)."""
+    return _backend().newest(limit, source=source, status=status, exclude_source=exclude_source)
+
+
+def count_conversations(source: str = None, status: str = None, exclude_source: str = None) -> int:
+    return _backend().count(source=source, status=status, exclude_source=exclude_source)
 
 
 def delete_conversation(conversation_id: str) -> bool:
     """Permanently delete a conversation and all its data. Returns True if deleted."""
-    path = _conversation_path(conversation_id)
-    if not path.exists():
-        return False
-    shutil.rmtree(path)
-    return True
+    deleted = _backend().delete(conversation_id)
+    store.forget(conversation_id)
+    return deleted
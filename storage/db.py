@@ -0,0 +1,325 @@
+"""SQLite storage backend — one WAL-mode database behind every storage module.
+
+Selected with ZIPPER_STORAGE=sqlite; the JSON file layout under data/ remains the
+default. Module function signatures are identical for both backends. Run
+`python storage/db.py` once to import an existing data/ tree.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+DATA_ROOT = ROOT / "data"
+DB_PATH = DATA_ROOT / "zipper.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    source TEXT,
+    status TEXT,
+    discord_thread_id TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    rev INTEGER NOT NULL DEFAULT 0,
+    meta TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_thread ON conversations(discord_thread_id);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at, id);
+
+CREATE TABLE IF NOT EXISTS versions (
+    conversation_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    summary TEXT NOT NULL DEFAULT '',
+    system_prompt TEXT,
+    rev INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (conversation_id, version)
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    conversation_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, version, seq)
+);
+
+CREATE TABLE IF NOT EXISTS history (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS trace (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    tool TEXT,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_trace_tool ON trace(conversation_id, tool);
+
+CREATE TABLE IF NOT EXISTS usage (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+
+CREATE TABLE IF NOT EXISTS memory (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    due_at TEXT,
+    task TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_due ON tasks(status, due_at);
+
+CREATE TABLE IF NOT EXISTS task_archive (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    archived_at TEXT NOT NULL,
+    task TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS todos (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    category TEXT,
+    todo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_todos_status ON todos(status, category);
+
+CREATE TABLE IF NOT EXISTS schedule (
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    entry TEXT NOT NULL,
+    PRIMARY KEY (kind, position)
+);
+
+CREATE TABLE IF NOT EXISTS wake_log (
+    slot TEXT PRIMARY KEY,
+    date TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def enabled() -> bool:
+    return os.environ.get("ZIPPER_STORAGE", "json").strip().lower() == "sqlite"
+
+
+def connect() -> sqlite3.Connection:
+    """Per-thread connection (tools run in worker threads). Autocommit unless inside transaction()."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == DB_PATH:
+        return conn
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _local.conn = conn
+    _local.path = DB_PATH
+    return conn
+
+
+@contextmanager
+def transaction():
+    """BEGIN IMMEDIATE ... COMMIT, rolled back on error. Nested use joins the outer transaction."""
+    conn = connect()
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False)
+
+
+def loads(text: str):
+    return json.loads(text)
+
+
+# --- one-shot importer ---
+
+
+def _read_json(path: Path, default):
+    if not path.exists():
+        return default
+    try:
+        return json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        print(f"[db] skipping unreadable {path}: {e}")
+        return default
+
+
+def _read_jsonl(path: Path) -> list:
+    records = []
+    if not path.exists():
+        return records
+    for line in path.read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def _import_conversation(conn: sqlite3.Connection, path: Path):
+    meta = _read_json(path / "meta.json", None)
+    if not meta:
+        return
+    cid = meta.get("id", path.name)
+    thread_id = meta.get("discord_thread_id")
+    conn.execute(
+        "INSERT OR REPLACE INTO conversations (id, source, status, discord_thread_id, created_at, updated_at, meta)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (cid, meta.get("source"), meta.get("status"), str(thread_id) if thread_id else None,
+         meta.get("created_at"), meta.get("updated_at"), dumps(meta)),
+    )
+
+    versions_dir = path / "versions"
+    for vpath in sorted(versions_dir.glob("*.json*"), key=lambda f: int(f.name.split(".")[0])):
+        if vpath.suffix == ".json":
+            version = _read_json(vpath, {})
+            num = version.get("version", int(vpath.stem))
+            summary = version.get("summary", "")
+            system_prompt = version.get("system_prompt")
+            messages = version.get("messages", [])
+        elif vpath.suffix == ".jsonl":
+            records = _read_jsonl(vpath)
+            header = records[0] if records else {}
+            num = header.get("version", int(vpath.stem))
+            summary = header.get("summary", "")
+            sidecar = vpath.with_suffix(".system.md")
+            system_prompt = sidecar.read_text(encoding="utf-8") if sidecar.exists() else None
+            messages = records[1:]
+        else:
+            continue
+        conn.execute(
+            "INSERT OR REPLACE INTO versions (conversation_id, version, summary, system_prompt) VALUES (?, ?, ?, ?)",
+            (cid, num, summary, system_prompt),
+        )
+        conn.execute("DELETE FROM messages WHERE conversation_id = ? AND version = ?", (cid, num))
+        conn.executemany(
+            "INSERT INTO messages (conversation_id, version, seq, message) VALUES (?, ?, ?, ?)",
+            [(cid, num, i, dumps(m)) for i, m in enumerate(messages)],
+        )
+
+    if (path / "full.jsonl").exists():
+        history = _read_jsonl(path / "full.jsonl")
+    else:
+        history = _read_json(path / "full.json", {}).get("messages", [])
+    conn.execute("DELETE FROM history WHERE conversation_id = ?", (cid,))
+    conn.executemany(
+        "INSERT INTO history (conversation_id, seq, message) VALUES (?, ?, ?)",
+        [(cid, i, dumps(m)) for i, m in enumerate(history)],
+    )
+
+    if (path / "trace.jsonl").exists():
+        entries = _read_jsonl(path / "trace.jsonl")
+    else:
+        entries = _read_json(path / "trace.json", {}).get("entries", [])
+    conn.execute("DELETE FROM trace WHERE conversation_id = ?", (cid,))
+    conn.executemany(
+        "INSERT INTO trace (conversation_id, seq, tool, entry) VALUES (?, ?, ?, ?)",
+        [(cid, i, e.get("tool"), dumps(e)) for i, e in enumerate(entries)],
+    )
+
+    usage = _read_jsonl(path / "usage.jsonl")
+    conn.execute("DELETE FROM usage WHERE conversation_id = ?", (cid,))
+    conn.executemany(
+        "INSERT INTO usage (conversation_id, seq, entry) VALUES (?, ?, ?)",
+        [(cid, i, dumps(e)) for i, e in enumerate(usage)],
+    )
+
+
+def import_data(data_root: Path = None) -> dict:
+    """Import a JSON data/ tree into the database in one transaction. Safe to re-run."""
+    data_root = data_root or DATA_ROOT
+    counts = {}
+    with transaction() as conn:
+        conversations_dir = data_root / "conversations"
+        paths = sorted(p for p in conversations_dir.iterdir() if p.is_dir()) if conversations_dir.exists() else []
+        for path in paths:
+            _import_conversation(conn, path)
+        counts["conversations"] = len(paths)
+
+        memory = _read_json(data_root / "memory.json", {})
+        conn.execute("DELETE FROM memory")
+        conn.executemany(
+            "INSERT INTO memory (key, value, updated_at) VALUES (?, ?, ?)",
+            [(k, dumps(v.get("value")), v.get("updated_at", "")) for k, v in memory.items()],
+        )
+        counts["memory"] = len(memory)
+
+        tasks = _read_json(data_root / "tasks" / "queue.json", [])
+        conn.execute("DELETE FROM tasks")
+        conn.executemany(
+            "INSERT INTO tasks (id, position, status, due_at, task) VALUES (?, ?, ?, ?, ?)",
+            [(t["id"], i, t.get("status", "pending"), t.get("due_at"), dumps(t)) for i, t in enumerate(tasks)],
+        )
+        counts["tasks"] = len(tasks)
+
+        archive = _read_json(data_root / "tasks" / "archive.json", [])
+        conn.execute("DELETE FROM task_archive")
+        conn.executemany(
+            "INSERT INTO task_archive (id, archived_at, task) VALUES (?, ?, ?)",
+            [(t["id"], t.get("archived_at", ""), dumps(t)) for t in archive],
+        )
+        counts["task_archive"] = len(archive)
+
+        todos = _read_json(data_root / "todos.json", [])
+        conn.execute("DELETE FROM todos")
+        conn.executemany(
+            "INSERT INTO todos (id, position, status, category, todo) VALUES (?, ?, ?, ?, ?)",
+            [(t["id"], i, t.get("status", "pending"), t.get("category"), dumps(t)) for i, t in enumerate(todos)],
+        )
+        counts["todos"] = len(todos)
+
+        schedule = _read_json(data_root / "schedule.json", {})
+        conn.execute("DELETE FROM schedule")
+        for kind, entries in schedule.items():
+            conn.executemany(
+                "INSERT INTO schedule (kind, position, entry) VALUES (?, ?, ?)",
+                [(kind, i, dumps(e)) for i, e in enumerate(entries)],
+            )
+        counts["schedule"] = sum(len(v) for v in schedule.values())
+
+        wake_log = _read_json(data_root / "wake_log.json", {})
+        conn.execute("DELETE FROM wake_log")
+        conn.executemany("INSERT INTO wake_log (slot, date) VALUES (?, ?)", list(wake_log.items()))
+        counts["wake_log"] = len(wake_log)
+    return counts
+
+
+if __name__ == "__main__":
+    source = Path(sys.argv[1]) if len(sys.argv) > 1 else DATA_ROOT
+    result = import_data(source)
+    print(f"imported {source} into {DB_PATH}")
+    for table, n in result.items():
+        print(f"  {table}: {n}")
@@ -2,6 +2,8 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from storage import db
+
 ROOT = Path(__file__).parent.parent
 MEMORY_PATH = ROOT / "data" / "memory.json"
 
@@ -17,21 +19,41 @@ def _save(memory: dict):
     MEMORY_PATH.write_text(json.dumps(memory, indent=2))
 
 
+def _row_entry(row) -> dict:
+    return {"value": db.loads(row["value"]), "updated_at": row["updated_at"]}
+
+
 def get(key: str):
+    if db.enabled():
+        row = db.connect().execute("SELECT value, updated_at FROM memory WHERE key = ?", (key,)).fetchone()
+        return _row_entry(row) if row else None
     return _load().get(key)
 
 
 def set(key: str, value):
+    updated_at = datetime.now().isoformat()
+    if db.enabled():
+        db.connect().execute(
+            "INSERT OR REPLACE INTO memory (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, db.dumps(value), updated_at),
+        )
+        return
     memory = _load()
-    memory[key] = {"value": value, "updated_at": datetime.now().isoformat()}
+    memory[key] = {"value": value, "updated_at": updated_at}
     _save(memory)
 
 
 def delete(key: str):
+    if db.enabled():
+        db.connect().execute("DELETE FROM memory WHERE key = ?", (key,))
+        return
     memory = _load()
     memory.pop(key, None)
     _save(memory)
 
 
 def all() -> dict:
+    if db.enabled():
+        rows = db.connect().execute("SELECT key, value, updated_at FROM memory ORDER BY key").fetchall()
+        return {r["key"]: _row_entry(r) for r in rows}
     return _load()
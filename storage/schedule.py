@@ -5,6 +5,7 @@ import re
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from storage import db
 from utils.text import title_to_slug
 from utils.constants import ZIPPER_URL
 
@@ -18,23 +19,46 @@ WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday",
 
 
 def load_schedule() -> dict:
+    if db.enabled():
+        schedule = {"daily": [], "oneshot": []}
+        rows = db.connect().execute("SELECT kind, entry FROM schedule ORDER BY kind, position").fetchall()
+        for r in rows:
+            schedule.setdefault(r["kind"], []).append(db.loads(r["entry"]))
+        return schedule
     if not SCHEDULE_PATH.exists():
         return {"daily": [], "oneshot": []}
     return json.loads(SCHEDULE_PATH.read_text())
 
 
 def save_schedule(schedule: dict):
+    if db.enabled():
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM schedule")
+            for kind, entries in schedule.items():
+                conn.executemany(
+                    "INSERT INTO schedule (kind, position, entry) VALUES (?, ?, ?)",
+                    [(kind, i, db.dumps(e)) for i, e in enumerate(entries)],
+                )
+        return
     SCHEDULE_PATH.parent.mkdir(parents=True, exist_ok=True)
     SCHEDULE_PATH.write_text(json.dumps(schedule, indent=2))
 
 
 def load_wake_log() -> dict:
+    if db.enabled():
+        rows = db.connect().execute("SELECT slot, date FROM wake_log").fetchall()
+        return {r["slot"]: r["date"] for r in rows}
     if not WAKE_LOG_PATH.exists():
         return {}
     return json.loads(WAKE_LOG_PATH.read_text())
 
 
 def save_wake_log(log: dict):
+    if db.enabled():
+        with db.transaction() as conn:
+            conn.execute("DELETE FROM wake_log")
+            conn.executemany("INSERT INTO wake_log (slot, date) VALUES (?, ?)", list(log.items()))
+        return
     WAKE_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
     WAKE_LOG_PATH.write_text(json.dumps(log, indent=2))
 
@@ -3,6 +3,7 @@ import re
 from datetime import datetime, timedelta
 from pathlib import Path
 
+from storage import db
 from utils.text import title_to_slug
 from storage.schedule import add_oneshot, generate_cron_line
 
@@ -52,11 +53,17 @@ ARCHIVE_PATH = ROOT / "data" / "tasks" / "archive.json"
 
 
 def _archive(task: dict):
+    task["archived_at"] = datetime.now().isoformat()
+    if db.enabled():
+        db.connect().execute(
+            "INSERT INTO task_archive (id, archived_at, task) VALUES (?, ?, ?)",
+            (task["id"], task["archived_at"], db.dumps(task)),
+        )
+        return
     if ARCHIVE_PATH.exists():
         archive = json.loads(ARCHIVE_PATH.read_text())
     else:
         archive = []
-    task["archived_at"] = datetime.now().isoformat()
     archive.append(task)
     ARCHIVE_PATH.parent.mkdir(parents=True, exist_ok=True)
     ARCHIVE_PATH.write_text(json.dumps(archive, indent=2))
@@ -73,8 +80,26 @@ def _save(tasks: list):
     QUEUE_PATH.write_text(json.dumps(tasks, indent=2))
 
 
+def _db_select(where: str = "", params: tuple = ()) -> list:
+    rows = db.connect().execute(f"SELECT task FROM tasks {where} ORDER BY position", params).fetchall()
+    return [db.loads(r["task"]) for r in rows]
+
+
+def _db_put(conn, task: dict):
+    """Insert or update a task row, appending new tasks at the end of the queue."""
+    conn.execute(
+        "INSERT INTO tasks (id, position, status, due_at, task)"
+        " VALUES (?, (SELECT COALESCE(MAX(position) + 1, 0) FROM tasks), ?, ?, ?)"
+        " ON CONFLICT(id) DO UPDATE SET status = excluded.status, due_at = excluded.due_at, task = excluded.task",
+        (task["id"], task["status"], task.get("due_at"), db.dumps(task)),
+    )
+
+
 def create_task(title: str, description: str = None, due_at: str = None, schedule: str = None, conversation_id: str = None) -> str:
-    tasks = _load()
+    if db.enabled():
+        tasks = [{"id": r["id"]} for r in db.connect().execute("SELECT id FROM tasks").fetchall()]
+    else:
+        tasks = _load()
     task_id = _generate_task_id(title, tasks)
     due_dt = datetime.fromisoformat(due_at) if due_at else datetime.now()
     
@@ -99,18 +124,48 @@ def create_task(title: str, description: str = None, due_at: str = None, schedul
         task["cron_line"] = cron_line
         task["next_run"] = due_dt.isoformat()
     
+    if db.enabled():
+        _db_put(db.connect(), task)
+        return task_id
+
     tasks.append(task)
     _save(tasks)
     return task_id
 
 
 def get_due_tasks() -> list:
-    tasks = _load()
     now = datetime.now().isoformat()
+    if db.enabled():
+        return _db_select("WHERE status = 'pending' AND due_at <= ?", (now,))
+    tasks = _load()
     return [t for t in tasks if t["status"] == "pending" and t["due_at"] <= now]
 
 
+def _db_update_status(task_id: str, status: str, result: str = None, error: str = None) -> dict | None:
+    with db.transaction() as conn:
+        row = conn.execute("SELECT task FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is None:
+            return None
+        task = db.loads(row["task"])
+        task["status"] = status
+        if result is not None:
+            task["result"] = result
+        if error is not None:
+            task["error"] = error
+        if status in ("done", "failed"):
+            conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,))
+            _archive(task)
+        else:
+            _db_put(conn, task)
+    return task
+
+
 def update_task_status(task_id: str, status: str, result: str = None, error: str = None):
+    if db.enabled():
+        completed_task = _db_update_status(task_id, status, result, error)
+        _schedule_next(completed_task, status)
+        return
+
     tasks = _load()
     completed_task = None
     for task in tasks:
@@ -130,6 +185,11 @@ def update_task_status(task_id: str, status: str, result: str = None, error: str
     else:
         _save(tasks)
 
+    _schedule_next(completed_task, status)
+
+
+def _schedule_next(completed_task: dict | None, status: str):
+    """Create the next occurrence of a recurring task once it is done or failed."""
     if completed_task and status in ("done", "failed") and completed_task.get("schedule"):
         prev_due = datetime.fromisoformat(completed_task["due_at"])
         next_dt = _next_due(completed_task["schedule"], prev_due)
@@ -145,6 +205,14 @@ def update_task_status(task_id: str, status: str, result: str = None, error: str
 
 def patch_task(task_id: str, fields: dict):
     """Update arbitrary fields on a task without triggering status logic."""
+    if db.enabled():
+        with db.transaction() as conn:
+            row = conn.execute("SELECT task FROM tasks WHERE id = ?", (task_id,)).fetchone()
+            if row:
+                task = db.loads(row["task"])
+                task.update(fields)
+                _db_put(conn, task)
+        return
     tasks = _load()
     for task in tasks:
         if task["id"] == task_id:
@@ -154,7 +222,25 @@ def patch_task(task_id: str, fields: dict):
 
 
 def list_tasks(status: str = None) -> list:
+    if db.enabled():
+        return _db_select("WHERE status = ?", (status,)) if status else _db_select()
     tasks = _load()
     if status:
         return [t for t in tasks if t["status"] == status]
     return tasks
+
+
+def list_archive(limit: int = None) -> list:
+    """Archived (done/failed) tasks, most recent first."""
+    if db.enabled():
+        sql = "SELECT task FROM task_archive ORDER BY seq DESC"
+        params = ()
+        if limit:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [db.loads(r["task"]) for r in db.connect().execute(sql, params).fetchall()]
+    if not ARCHIVE_PATH.exists():
+        return []
+    archive = json.loads(ARCHIVE_PATH.read_text())
+    recent = archive[-limit:] if limit else archive
+    return recent[::-1]
@@ -4,6 +4,7 @@ import json
 from datetime import datetime
 from pathlib import Path
 
+from storage import db
 from utils.text import title_to_slug
 
 ROOT = Path(__file__).parent.parent
@@ -21,6 +22,21 @@ def _save(todos: list):
     TODOS_PATH.write_text(json.dumps(todos, indent=2))
 
 
+def _db_select(where: str = "", params: tuple = ()) -> list:
+    rows = db.connect().execute(f"SELECT todo FROM todos {where} ORDER BY position", params).fetchall()
+    return [db.loads(r["todo"]) for r in rows]
+
+
+def _db_put(conn, todo: dict):
+    """Insert or update a todo row, appending new items at the end of the list."""
+    conn.execute(
+        "INSERT INTO todos (id, position, status, category, todo)"
+        " VALUES (?, (SELECT COALESCE(MAX(position) + 1, 0) FROM todos), ?, ?, ?)"
+        " ON CONFLICT(id) DO UPDATE SET status = excluded.status, category = excluded.category, todo = excluded.todo",
+        (todo["id"], todo["status"], todo.get("category"), db.dumps(todo)),
+    )
+
+
 def _generate_id(title: str, existing: list) -> str:
     existing_ids = {t["id"] for t in existing}
     slug = title_to_slug(title, fallback="todo", max_length=50)
@@ -43,7 +59,10 @@ def add_todo(
     task_id: str = None,
 ) -> str:
     """Add a new todo item. Returns the new todo ID."""
-    todos = _load()
+    if db.enabled():
+        todos = [{"id": r["id"]} for r in db.connect().execute("SELECT id FROM todos").fetchall()]
+    else:
+        todos = _load()
     todo_id = _generate_id(title, todos)
     todo = {
         "id": todo_id,
@@ -59,12 +78,25 @@ def add_todo(
         "created_at": datetime.now().isoformat(),
         "completed_at": None,
     }
+    if db.enabled():
+        _db_put(db.connect(), todo)
+        return todo_id
     todos.append(todo)
     _save(todos)
     return todo_id
 
 
 def list_todos(status: str = None, category: str = None) -> list:
+    if db.enabled():
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if category:
+            clauses.append("category = ?")
+            params.append(category)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        return _db_select(where, tuple(params))
     todos = _load()
     if status:
         todos = [t for t in todos if t["status"] == status]
@@ -75,16 +107,30 @@ def list_todos(status: str = None, category: str = None) -> list:
 
 def update_todo(todo_id: str, fields: dict):
     """Update arbitrary fields on a todo item."""
+    if db.enabled():
+        with db.transaction() as conn:
+            todo = get_todo(todo_id)
+            if todo:
+                _apply_update(todo, fields)
+                _db_put(conn, todo)
+        return
     todos = _load()
     for todo in todos:
         if todo["id"] == todo_id:
-            if fields.get("status") in ("done", "cancelled") and not todo.get("completed_at"):
-                fields["completed_at"] = datetime.now().isoformat()
-            todo.update(fields)
+            _apply_update(todo, fields)
             break
     _save(todos)
 
 
+def _apply_update(todo: dict, fields: dict):
+    if fields.get("status") in ("done", "cancelled") and not todo.get("completed_at"):
+        fields["completed_at"] = datetime.now().isoformat()
+    todo.update(fields)
+
+
 def get_todo(todo_id: str) -> dict | None:
+    if db.enabled():
+        found = _db_select("WHERE id = ?", (todo_id,))
+        return found[0] if found else None
     todos = _load()
     return next((t for t in todos if t["id"] == todo_id), None)
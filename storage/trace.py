@@ -1,33 +1,167 @@
 import json
+import threading
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 
+from storage import db
+
 ROOT = Path(__file__).parent.parent
 
+TOOLS_USED_MAX = 512  # conversations whose tool-name sets stay in memory
+
 
 def _trace_path(conversation_id: str) -> Path:
+    return ROOT / "data" / "conversations" / conversation_id / "trace.jsonl"
+
+
+def _legacy_path(conversation_id: str) -> Path:
     return ROOT / "data" / "conversations" / conversation_id / "trace.json"
 
 
-def _load(conversation_id: str) -> dict:
+def _usage_path(conversation_id: str) -> Path:
+    return ROOT / "data" / "conversations" / conversation_id / "usage.jsonl"
+
+
+# --- JSONL log ---
+#
+# One entry per line, so recording a tool call costs O(entry) instead of
+# re-serializing every earlier call. trace.json from older releases is
+# converted on first access.
+
+
+def _migrate_legacy(conversation_id: str):
+    legacy = _legacy_path(conversation_id)
+    if not legacy.exists():
+        return
+    entries = json.loads(legacy.read_text()).get("entries", [])
     path = _trace_path(conversation_id)
-    if not path.exists():
-        return {"conversation_id": conversation_id, "entries": []}
-    return json.loads(path.read_text())
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries), encoding="utf-8")
+    tmp.replace(path)
+    legacy.unlink()
+
+
+def _read_jsonl(path: Path) -> list:
+    entries = []
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # torn trailing line from a crash mid-write
+    return entries
+
+
+def _load(conversation_id: str) -> dict:
+    with _lock:
+        _migrate_legacy(conversation_id)
+    return {"conversation_id": conversation_id, "entries": _read_jsonl(_trace_path(conversation_id))}
+
+
+# --- tools used ---
+#
+# Per-conversation set of tool names seen in the trace, loaded once and kept
+# current by append_trace_entry, so first-use checks don't read the trace.
+
+_tools_used: OrderedDict = OrderedDict()
+_lock = threading.RLock()
 
 
-def _save(conversation_id: str, trace: dict):
-    _trace_path(conversation_id).write_text(json.dumps(trace, indent=2))
+def _load_tools_used(conversation_id: str) -> set:
+    if db.enabled():
+        rows = db.connect().execute(
+            "SELECT DISTINCT tool FROM trace WHERE conversation_id = ? AND tool IS NOT NULL", (conversation_id,)
+        ).fetchall()
+        return {r["tool"] for r in rows}
+    return {e["tool"] for e in _load(conversation_id)["entries"] if e.get("tool")}
+
+
+def has_used_tool(conversation_id: str, tool: str) -> bool:
+    """Whether the conversation's trace already has a call to tool."""
+    with _lock:
+        used = _tools_used.get(conversation_id)
+        if used is None:
+            used = _load_tools_used(conversation_id)
+            _tools_used[conversation_id] = used
+            if len(_tools_used) > TOOLS_USED_MAX:
+                _tools_used.popitem(last=False)
+        else:
+            _tools_used.move_to_end(conversation_id)
+        return tool in used
 
 
 def append_trace_entry(conversation_id: str, entry: dict):
-    trace = _load(conversation_id)
     entry["id"] = uuid.uuid4().hex[:8]
     entry["timestamp"] = datetime.now().isoformat()
-    trace["entries"].append(entry)
-    _save(conversation_id, trace)
+    with _lock:
+        if db.enabled():
+            db.connect().execute(
+                "INSERT INTO trace (conversation_id, seq, tool, entry) VALUES (?,"
+                " (SELECT COALESCE(MAX(seq) + 1, 0) FROM trace WHERE conversation_id = ?), ?, ?)",
+                (conversation_id, conversation_id, entry.get("tool"), db.dumps(entry)),
+            )
+        else:
+            _migrate_legacy(conversation_id)
+            with open(_trace_path(conversation_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        used = _tools_used.get(conversation_id)
+        if used is not None and entry.get("tool"):
+            used.add(entry["tool"])
 
 
 def get_trace(conversation_id: str) -> dict:
+    if db.enabled():
+        rows = db.connect().execute(
+            "SELECT entry FROM trace WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+        ).fetchall()
+        return {"conversation_id": conversation_id, "entries": [db.loads(r["entry"]) for r in rows]}
     return _load(conversation_id)
+
+
+# --- token usage ---
+#
+# One row per API call, kept out of the tool trace (usage.jsonl / the usage
+# table), so trace consumers only ever see tool calls.
+
+USAGE_FIELDS = ("input_tokens", "output_tokens", "cache_creation_input_tokens", "cache_read_input_tokens")
+
+
+def append_usage(conversation_id: str, model: str, usage):
+    """Record token usage for one API call (cache hits = cache_read_input_tokens)."""
+    entry = {"model": model, "timestamp": datetime.now().isoformat()}
+    for field in USAGE_FIELDS:
+        entry[field] = getattr(usage, field, None) or 0
+    with _lock:
+        if db.enabled():
+            db.connect().execute(
+                "INSERT INTO usage (conversation_id, seq, entry) VALUES (?,"
+                " (SELECT COALESCE(MAX(seq) + 1, 0) FROM usage WHERE conversation_id = ?), ?)",
+                (conversation_id, conversation_id, db.dumps(entry)),
+            )
+        else:
+            with open(_usage_path(conversation_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def get_usage(conversation_id: str) -> dict:
+    """Token totals across every API call recorded for the conversation."""
+    if db.enabled():
+        rows = db.connect().execute(
+            "SELECT entry FROM usage WHERE conversation_id = ? ORDER BY seq", (conversation_id,)
+        ).fetchall()
+        entries = [db.loads(r["entry"]) for r in rows]
+    else:
+        entries = _read_jsonl(_usage_path(conversation_id))
+    totals = dict.fromkeys(USAGE_FIELDS, 0)
+    totals["calls"] = 0
+    for entry in entries:
+        totals["calls"] += 1
+        for field in USAGE_FIELDS:
+            totals[field] += entry.get(field, 0)
+    return totals
@@ -0,0 +1,1109 @@
+"""
+Component tests — focused checks for pieces a gold conversation can't reach
+on its own (caches, storage indexes, ownership, scheduling, streaming).
+
+Each test is a function registered with @component("name"). It receives a
+check(label, passed, detail="") callback, may be async, and gets a fresh
+temporary directory in `tmp` for anything it writes. tests/runner.py runs
+these after the gold tests; its name filter applies to both.
+"""
+
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+TESTS: list[tuple[str, object]] = []
+
+
+def component(name: str):
+    def register(fn):
+        TESTS.append((name, fn))
+        return fn
+    return register
+
+
+# ---------------------------------------------------------------------------
+# web cache (fetch responses, search results)
+# ---------------------------------------------------------------------------
+
+def _web_cache(tmp: Path):
+    from tools import web_cache
+    return patch.multiple(
+        web_cache, CACHE_DIR=tmp, INDEX_PATH=tmp / "index.json", SEARCH_PATH=tmp / "search.json"
+    )
+
+
+@component("web_cache_lru")
+def web_cache_lru(check, tmp: Path):
+    from tools import web_cache
+
+    headers = {"Cache-Control": "max-age=600"}
+    with _web_cache(tmp), patch.object(web_cache, "MAX_BYTES", 10):
+        cache = web_cache.WebCache()
+        cache.put("http://a", headers, "aaaa")
+        cache.put("http://b", headers, "bbbb")
+        before = (tmp / "index.json").read_bytes()
+        hit_at = time.time()
+        hit = cache.get("http://a")
+        check("hit returns the stored text", hit is not None and hit.text == "aaaa")
+        check("hit does not rewrite index.json", (tmp / "index.json").read_bytes() == before)
+
+        cache.put("http://c", headers, "cccc")
+        check("least recently used entry evicted", cache.get("http://b") is None)
+        check("recently hit entry kept", cache.get("http://a") is not None)
+        on_disk = web_cache.WebCache()._load()
+        check("hit time persisted by the next put", on_disk.get("http://a", {}).get("used", 0) >= hit_at)
+
+
+@component("web_search_cache")
+def web_search_cache(check, tmp: Path):
+    from tools import web_cache
+
+    with _web_cache(tmp):
+        cache = web_cache.SearchCache()
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return "results"
+
+        out = []
+        threads = [threading.Thread(target=lambda: out.append(cache.get_or_fetch("Foo  bar", 5, fetch)))
+                   for _ in range(3)]
+        for t in threads:
+            t.start()
+        deadline = time.time() + 5
+        while cache.stats()["coalesced"] < 2 and time.time() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        check("identical in-flight queries share one fetch", len(calls) == 1, f"{len(calls)} fetches")
+        check("every caller gets the result", out == ["results"] * 3, repr(out))
+        check("normalized query served from cache",
+              cache.get_or_fetch("foo bar", 5, lambda: "fresh") == "results")
+
+        def fail():
+            raise RuntimeError("boom")
+
+        try:
+            cache.get_or_fetch("other", 5, fail)
+            raised = False
+        except RuntimeError:
+            raised = True
+        check("fetch errors propagate", raised)
+        check("errors are not cached", cache.get_or_fetch("other", 5, lambda: "ok") == "ok")
+
+        # the cache file cannot be written: callers still get the result, waiters still wake
+        release.clear()
+        calls.clear()
+        out.clear()
+        with patch.object(cache, "_store", side_effect=OSError("read-only file system")):
+            threads = [threading.Thread(target=lambda: out.append(cache.get_or_fetch("broken disk", 5, fetch)))
+                       for _ in range(2)]
+            for t in threads:
+                t.start()
+            deadline = time.time() + 5
+            while cache.stats()["coalesced"] < 3 and time.time() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for t in threads:
+                t.join(5)
+        check("a failed cache write still wakes coalesced waiters",
+              out == ["results"] * 2 and not any(t.is_alive() for t in threads), repr(out))
+        check("and clears the in-flight entry", cache.stats()["in_flight"] == 0)
+
+
+@component("web_fetch_many")
+def web_fetch_many(check, tmp: Path):
+    import re
+    from tools import web
+
+    pages = {"https://short": "s" * 1000, "https://long-a": "a" * 50000, "https://long-b": "b" * 50000}
+
+    def fetch_text(url, timeout=15):
+        if url not in pages:
+            raise RuntimeError("HTTP 404")
+        return pages[url]
+
+    with patch.object(web, "_fetch_text", fetch_text):
+        out = web._fetch_many(["https://long-a", "https://short", "https://missing", "https://long-b", "https://short"])
+    body = {url: text.split("\n\n... [truncated")[0]
+            for url, text in re.findall(r"=== (\S+) ===\n(.*?)(?=\n\n=== |\Z)", out, re.S)}
+    check("input order, duplicates dropped", list(body) == ["https://long-a", "https://short", "https://missing",
+                                                            "https://long-b"], repr(list(body)))
+    check("errors stay in place", body["https://missing"] == "error: HTTP 404", body["https://missing"])
+    check("short pages are kept whole", body["https://short"] == pages["https://short"])
+    check("long pages split what is left",
+          len(body["https://long-a"]) == len(body["https://long-b"]) == (web.FETCH_MANY_BUDGET - 1000) // 2,
+          repr((len(body["https://long-a"]), len(body["https://long-b"]))))
+    check("page text stays within the shared budget",
+          sum(len(body[u]) for u in pages) <= web.FETCH_MANY_BUDGET)
+    check("too many urls is an error",
+          web._fetch_many([f"https://{i}" for i in range(web.FETCH_MANY_MAX_URLS + 1)]).startswith("error:"))
+
+
+class _Response:
+    """Just enough of an http.client response for tools.web._read_text."""
+
+    def __init__(self, body: bytes, content_type: str):
+        from email.message import Message
+        self.headers = Message()
+        self.headers["Content-Type"] = content_type
+        self._body = body
+        self.received = 0
+
+    def read(self, n: int) -> bytes:
+        chunk = self._body[self.received:self.received + n]
+        self.received += len(chunk)
+        return chunk
+
+
+@component("web_extract")
+def web_extract(check, tmp: Path):
+    from tools import web
+
+    page = "<html><head><meta charset='iso-8859-1'></head><body><p>café</p></body></html>".encode("latin-1")
+    check("charset from <meta>", web._read_text(_Response(page, "text/html")).strip() == "café")
+    check("Content-Type charset wins over <meta>",
+          web._charset(_Response(b"", "text/html; charset=windows-1252").headers, page) == "cp1252")
+    check("unknown charset falls back to utf-8",
+          web._charset(_Response(b"", "text/html; charset=no-such-codec").headers, b"") == "utf-8")
+
+    body = b"word " * (4 << 20)  # 20 MB of visible text
+    resp = _Response(body, "text/plain")
+    text = web._read_text(resp)
+    check("stops reading once EXTRACT_LIMIT chars are in hand",
+          resp.received < web.EXTRACT_LIMIT + 2 * web.READ_CHUNK and "[stopped reading" in text,
+          f"read {resp.received} bytes")
+
+    body = b"<html><body><script>" + b"x" * (8 << 20) + b"</script><p>late</p></body></html>"
+    resp = _Response(body, "text/html")
+    text = web._read_text(resp)
+    check("pages with little visible text stop at MAX_FETCH_BYTES",
+          web.MAX_FETCH_BYTES <= resp.received < web.MAX_FETCH_BYTES + web.READ_CHUNK and "late" not in text,
+          f"read {resp.received} bytes")
+    check("complete pages carry no marker",
+          "[stopped reading" not in web._read_text(_Response(b"short page", "text/plain")))
+
+
+# ---------------------------------------------------------------------------
+# conversation meta index (data/conversation_index.jsonl)
+# ---------------------------------------------------------------------------
+
+def _meta_rows(worker: int, updates: int):
+    from storage import conversations
+
+    index = conversations._MetaIndex()
+    for n in range(updates):
+        cid = f"w{worker}-{n % 5}"
+        index.put({"id": cid, "title": f"{cid} #{n}", "updated_at": f"2026-01-01T00:{n // 60:02d}:{n % 60:02d}"})
+
+
+@component("meta_index_shared")
+def meta_index_shared(check, tmp: Path):
+    import multiprocessing
+    from storage import conversations
+
+    with patch.multiple(conversations, DATA_DIR=tmp / "conversations",
+                        META_INDEX_PATH=tmp / "conversation_index.jsonl"):
+        a, b = conversations._MetaIndex(), conversations._MetaIndex()
+        a.put({"id": "one", "source": "cron", "updated_at": "2026-01-01T00:00:01"})
+        b.put({"id": "two", "source": "discord", "updated_at": "2026-01-01T00:00:02"})
+        rows, _ = a.page(10)
+        check("appends from another writer are visible", [r["id"] for r in rows] == ["two", "one"], repr(rows))
+
+        b.count()  # b has read the log up to here
+        for n in range(40):
+            a.put({"id": f"x{n}", "updated_at": f"2026-01-02T00:00:{n:02d}"})
+        with conversations._file_lock(conversations.META_INDEX_PATH):
+            a._sync()
+            a._compact()
+        check("reader notices a compacted log larger than its offset", b.count() == 42, f"count={b.count()}")
+        rows, cursor = b.page(1, source="cron")
+        check("filtered page finds an old row", [r["id"] for r in rows] == ["one"] and cursor is None, repr(rows))
+
+        size = conversations.META_INDEX_PATH.stat().st_size
+        a.put({"id": "x0", "updated_at": "2026-01-02T00:00:00"})
+        check("unchanged row is not logged again", conversations.META_INDEX_PATH.stat().st_size == size)
+        with patch.object(conversations._MetaIndex, "_live_rows", side_effect=AssertionError("materialized")):
+            try:
+                a.put({"id": "x1", "updated_at": "2026-01-03T00:00:00"})
+                cheap = True
+            except AssertionError:
+                cheap = False
+        check("an append does not materialize every live row", cheap)
+        a.put({"id": "old", "created_at": "2025-11-01T00:00:00", "updated_at": "2026-03-01T00:00:00"})
+        a.put({"id": "new", "created_at": "2025-12-01T00:00:00", "updated_at": "2026-02-01T00:00:00"})
+        newest = [r["id"] for r in a.newest(2)]
+        check("newest orders by creation, not activity", newest == ["new", "old"], repr(newest))
+
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target=_meta_rows, args=(w, 700)) for w in range(3)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join(60)
+        fresh = conversations._MetaIndex()
+        titles = {r["id"]: r.get("title") for r in fresh.page(100)[0]}
+        expected = {f"w{w}-{i}": f"w{w}-{i} #{695 + i}" for w in range(3) for i in range(5)}
+        check("concurrent writers with compaction lose no rows",
+              all(titles.get(k) == v for k, v in expected.items()),
+              repr({k: titles.get(k) for k, v in expected.items() if titles.get(k) != v}))
+        lines = conversations.META_INDEX_PATH.read_text().splitlines()
+        check("log was compacted meanwhile", len(lines) < 3 * 700, f"{len(lines)} lines")
+
+
+def _thread_rows(worker: int, updates: int):
+    from storage import conversations
+
+    index = conversations._ThreadIndex()
+    for n in range(updates):
+        index.set(f"w{worker}-{n % 5}", 1000 * worker + n)
+
+
+@component("thread_index_shared")
+def thread_index_shared(check, tmp: Path):
+    import multiprocessing
+    from storage import conversations
+
+    with patch.multiple(conversations, DATA_DIR=tmp / "conversations",
+                        THREAD_INDEX_PATH=tmp / "thread_index.jsonl"):
+        a, b = conversations._ThreadIndex(), conversations._ThreadIndex()
+        a.set("one", 111)
+        b.set("two", 222)
+        check("threads set by another writer resolve", a.lookup(222) == "two" and b.lookup(111) == "one")
+        b.set("one", None)
+        check("removal is seen by other writers", a.lookup(111) is None)
+
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target=_thread_rows, args=(w, 600)) for w in range(3)]
+        for p in workers:
+            p.start()
+        for p in workers:
+            p.join(60)
+        fresh = conversations._ThreadIndex()
+        missing = [(w, i) for w in range(3) for i in range(5)
+                   if fresh.lookup(1000 * w + 595 + i) != f"w{w}-{i}"]
+        check("concurrent writers with compaction lose no rows", not missing, repr(missing))
+        check("stale threads dropped", fresh.lookup(1000) is None and fresh.lookup(222) == "two")
+
+
+# ---------------------------------------------------------------------------
+# trace + token usage
+# ---------------------------------------------------------------------------
+
+@component("trace_usage")
+async def trace_usage(check, tmp: Path):
+    from llm import run_conversation
+    from storage.conversations import create_conversation
+    from storage.trace import get_trace, get_usage, has_used_tool
+    from tests.mock_client import MockClient
+
+    turns = [
+        {"stop_reason": "tool_use", "usage": {"input_tokens": 500, "cache_creation_input_tokens": 400},
+         "content": [{"type": "tool_use", "id": "t1", "name": "bash", "input": {"command": "echo hi"}}]},
+        {"stop_reason": "end_turn", "usage": {"input_tokens": 40, "cache_read_input_tokens": 400},
+         "content": [{"type": "text", "text": "done"}]},
+    ]
+    conversation_id = create_conversation(title="[test] trace usage", source="test")
+    with patch("llm.client", MockClient(turns)):
+        await run_conversation("run echo", conversation_id)
+
+    entries = get_trace(conversation_id)["entries"]
+    check("trace holds only tool calls", [e.get("tool") for e in entries] == ["bash"], repr(entries))
+    usage = get_usage(conversation_id)
+    check("one usage row per API call", usage["calls"] == 2, repr(usage))
+    check("cache reads and writes summed",
+          usage["cache_read_input_tokens"] == 400 and usage["cache_creation_input_tokens"] == 400
+          and usage["input_tokens"] == 540, repr(usage))
+    check("first-use tracking unaffected", has_used_tool(conversation_id, "bash")
+          and not has_used_tool(conversation_id, "web"))
+
+
+# ---------------------------------------------------------------------------
+# Discord streaming
+# ---------------------------------------------------------------------------
+
+class _FakeBot:
+    """Stands in for the bot's /send and /edit; `send` can be swapped to simulate failures."""
+
+    def __init__(self):
+        self.messages: dict[str, str] = {}
+        self.calls: list[str] = []
+        self.send = lambda body: {"message_id": f"m{len(self.messages)}"}
+
+    async def post(self, url: str, body: dict, timeout: int = 10) -> dict:
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls.append(endpoint)
+        if endpoint == "send":
+            result = self.send(body)
+            if "message_id" in result:
+                self.messages[result["message_id"]] = body["message"]
+            return result
+        self.messages[body["message_id"]] = body["content"]
+        return {"ok": True}
+
+
+@component("discord_stream")
+async def discord_stream(check, tmp: Path):
+    import asyncio
+    from llm import discord_stream as ds
+
+    bot = _FakeBot()
+    with patch.object(ds, "post_json_async", bot.post), patch.object(ds, "EDIT_INTERVAL", 0.01):
+        stream = ds.DiscordStream(1)
+        stream.start()
+        await asyncio.sleep(0.05)
+        check("placeholder posted before any token", list(bot.messages.values()) == [ds.PLACEHOLDER],
+              repr(bot.messages))
+
+        await stream.callback("token", text="Let me check.")
+        await stream.callback("tool_call", tool="bash")
+        await asyncio.sleep(0.05)
+        await stream.callback("token", text="The answer is 4. {{c:1, d:2")
+        await stream.callback("token", text=", a:3}}")
+        await stream.finish("The answer is 4.")
+        check("each turn in its own message", list(bot.messages.values()) == ["Let me check.", "The answer is 4."],
+              repr(bot.messages))
+
+        bot = _FakeBot()
+        bot.send = lambda body: {}  # neither message_id nor error
+        with patch.object(ds, "post_json_async", bot.post):
+            stream = ds.DiscordStream(1)
+            stream.start()
+            await stream.callback("token", text="hello")
+            try:
+                await stream.finish("hello")
+                error = None
+            except Exception as e:
+                error = repr(e)
+        check("a /send without message_id is a failed push", error is None and not bot.messages, error or "")
+
+        async def broken(url, body, timeout=10):
+            raise RuntimeError("pump crashed")
+
+        with patch.object(ds, "post_json_async", broken):
+            stream = ds.DiscordStream(1)
+            stream.start()
+            try:
+                shown = await stream.finish("⚠️ Error: boom")
+                ok = True
+            except Exception:
+                ok = shown = False
+        check("finish() swallows pump errors", ok and shown is False)
+
+
+# ---------------------------------------------------------------------------
+# conversation ownership
+# ---------------------------------------------------------------------------
+
+@component("ownership")
+async def ownership_claims(check, tmp: Path):
+    import asyncio
+    from llm import ownership
+    from storage import conversations
+
+    conversation_id = conversations.create_conversation(title="[test] ownership", source="test")
+    first = ownership.claim(conversation_id)
+    check("claimant owns the conversation", ownership.owns(conversation_id, first))
+    check("token recorded in meta", conversations.get_conversation(conversation_id)["last_owner_token"] == first)
+
+    second = ownership.claim(conversation_id)
+    check("in-process claim cancels the previous owner at once",
+          ownership.cancel_event(conversation_id, first).is_set() and not ownership.owns(conversation_id, first))
+
+    # another process (e.g. the dashboard) claims through its own store, bypassing our cache
+    conversations.ConversationStore().update_meta(conversation_id, last_owner_token="claimed-elsewhere")
+    cancelled = ownership.cancel_event(conversation_id, second)
+    try:
+        await asyncio.wait_for(cancelled.wait(), ownership.POLL_INTERVAL * 4)
+    except asyncio.TimeoutError:
+        pass
+    check("claim from another process cancels the owner", cancelled.is_set())
+    check("and ownership is lost", not ownership.owns(conversation_id, second))
+
+    third = ownership.claim(conversation_id)
+    ownership.release(conversation_id, third)
+    check("release forgets the owner", conversation_id not in ownership._owners)
+
+
+# ---------------------------------------------------------------------------
+# one-off API calls (governor.call)
+# ---------------------------------------------------------------------------
+
+def _api_error(status: int, retry_after_ms: str = "10"):
+    from types import SimpleNamespace
+    import anthropic
+    response = SimpleNamespace(status_code=status, headers={"retry-after-ms": retry_after_ms}, request=None)
+    return anthropic.APIStatusError(f"error {status}", response=response, body=None)
+
+
+@component("governed_call")
+async def governed_call(check, tmp: Path):
+    import asyncio
+    from llm import governor as gov
+    from llm.scheduler import Scheduler
+
+    model = "claude-haiku-4-5-20251001"
+    with patch.multiple(gov, scheduler=Scheduler(), governor=gov.RetryGovernor()):
+        attempts, active = [], []
+
+        async def flaky():
+            attempts.append(1)
+            active.append(gov.scheduler.stats()["models"][model]["active"])
+            if len(attempts) == 1:
+                raise _api_error(500)
+            return "ok"
+
+        result = await gov.call(flaky, model)
+        check("retryable error is retried", result == "ok" and len(attempts) == 2, f"attempts={len(attempts)}")
+        check("each attempt holds a scheduler slot", active == [1, 1], str(active))
+        check("slot released afterwards", gov.scheduler.stats()["models"][model]["active"] == 0)
+
+        async def rejected():
+            raise _api_error(400)
+
+        try:
+            await gov.call(rejected, model)
+            check("non-retryable error is raised", False)
+        except Exception as e:
+            check("non-retryable error is raised", getattr(e, "status_code", None) == 400)
+
+        attempts.clear()
+
+        async def failing():
+            attempts.append(1)
+            raise _api_error(500)
+
+        try:
+            await gov.call(failing, model, retries=0)
+        except Exception:
+            pass
+        check("retries=0 makes a single attempt", len(attempts) == 1, f"attempts={len(attempts)}")
+
+        peak, running = [0], [0]
+
+        async def slow():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.02)
+            running[0] -= 1
+
+        await asyncio.gather(*(gov.call(slow, model) for _ in range(20)))
+        cap = gov.scheduler._cap(model)
+        check("concurrency stays under the model cap", peak[0] <= cap, f"peak={peak[0]} cap={cap}")
+
+
+# ---------------------------------------------------------------------------
+# summarize tool (map/reduce calls share the Haiku cap)
+# ---------------------------------------------------------------------------
+
+class _Concurrency:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+
+    def __enter__(self):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            return self.calls
+
+    def __exit__(self, *exc):
+        with self.lock:
+            self.running -= 1
+
+
+def _summary(text: str = "summary"):
+    from types import SimpleNamespace
+    return SimpleNamespace(content=[SimpleNamespace(text=text)])
+
+
+@component("summarize_shared_cap")
+async def summarize_shared_cap(check, tmp: Path):
+    import asyncio
+    from types import SimpleNamespace
+    import llm
+    from llm import governor as gov
+    from llm.scheduler import Scheduler
+    from tools import summarize
+
+    text = "\n\n".join(f"paragraph {i} " + "word " * 150 for i in range(40))
+    args = {"text": text, "direction": ""}
+    cap = Scheduler()._cap(summarize.MODEL)
+    expected = 4 * (len(summarize.chunk(text, 2000)) + 1) + 1  # map + reduce per run, plus one retry
+
+    # inside a run: calls are scheduled on the run's loop
+    usage = _Concurrency()
+
+    async def create(**kwargs):
+        with usage as n:
+            await asyncio.sleep(0.01)
+            if n == 1:
+                raise _api_error(529)
+            return _summary()
+
+    fake = SimpleNamespace(messages=SimpleNamespace(create=create))
+    with patch.multiple(gov, scheduler=Scheduler(), governor=gov.RetryGovernor()), \
+            patch.object(llm, "client", fake), patch.object(summarize, "CHUNK_CHARS", 2000):
+        token = gov.tool_context.set((asyncio.get_running_loop(), "interactive"))
+        results = await asyncio.gather(*(asyncio.to_thread(summarize.run, args) for _ in range(4)))
+        gov.tool_context.reset(token)
+    check("parallel summarize tools complete", all(r == "summary" for r in results), str(results))
+    check("in a run: concurrency stays under the Haiku cap", usage.peak <= cap, f"peak={usage.peak} cap={cap}")
+    check("in a run: overloaded call is retried", usage.calls == expected, f"calls={usage.calls}")
+
+    # outside a run: process-wide semaphore, SDK retries off, governor backoff
+    usage = _Concurrency()
+
+    def create_sync(**kwargs):
+        with usage as n:
+            time.sleep(0.01)
+            if n == 1:
+                raise _api_error(529)
+            return _summary()
+
+    fake_sync = SimpleNamespace(messages=SimpleNamespace(create=create_sync))
+    with patch.multiple(summarize, _client=fake_sync, _slots=threading.BoundedSemaphore(cap), CHUNK_CHARS=2000):
+        results = await asyncio.gather(*(asyncio.to_thread(summarize.run, args) for _ in range(4)))
+    check("outside a run: parallel summarize tools complete", all(r == "summary" for r in results), str(results))
+    check("outside a run: concurrency stays under the Haiku cap", usage.peak <= cap, f"peak={usage.peak} cap={cap}")
+    check("outside a run: overloaded call is retried", usage.calls == expected, f"calls={usage.calls}")
+
+
+# ---------------------------------------------------------------------------
+# bash tool (bounded output, timeouts, persistent sessions)
+# ---------------------------------------------------------------------------
+
+@component("bash_output")
+def bash_output(check, tmp: Path):
+    from tools import bash
+
+    with patch.multiple(bash, ROOT=tmp, SPILL_DIR=tmp / "output"):
+        out = bash._Output()
+        for _ in range(200):
+            out.write(b"x" * 1000 + b"\n")
+        out.close()
+        check("without on_output no live copy is kept", out._live == [])
+        text = out.text()
+        check("large output is excerpted", len(text) < bash.INLINE_LIMIT and "chars omitted" in text)
+        check("and spilled in full", out.spill_path.stat().st_size == 200 * 1001)
+
+        chunks = []
+        out = bash._Output(chunks.append)
+        out.write(b"hello ")
+        out.write(b"world\n")
+        out.close()
+        check("live chunks reach on_output", "".join(chunks) == "hello world\n", repr(chunks))
+
+    start = time.monotonic()
+    result = bash.run({"command": "exec >/dev/null 2>&1; sleep 10", "timeout": 1})
+    elapsed = time.monotonic() - start
+    check("a command that closes its output still times out", "timed out" in result and elapsed < 5,
+          f"{elapsed:.1f}s: {result}")
+    check("exit code after EOF is reported", "exit code: 3" in bash.run({"command": "echo hi; exit 3"}))
+
+
+@component("bash_session_reset")
+def bash_session_reset(check, tmp: Path):
+    from tools import bash
+
+    with patch.object(bash, "SCRIPT_DIR", tmp):
+        conversation_id = "test-bash-reset"
+        bash.run({"command": "export MARK=1", "session": True}, conversation_id)
+        results = {}
+        worker = threading.Thread(target=lambda: results.update(
+            slow=bash.run({"command": "sleep 1; echo $MARK", "session": True}, conversation_id)))
+        worker.start()
+        time.sleep(0.3)
+        busy = bash.run({"command": "echo reset", "session": True, "reset": True}, conversation_id)
+        worker.join()
+        check("reset while another command runs is refused", "session busy" in busy, busy)
+        check("and the running command is unharmed", results.get("slow") == "1", repr(results.get("slow")))
+        fresh = bash.run({"command": "echo ${MARK:-unset}", "session": True, "reset": True}, conversation_id)
+        check("reset of an idle shell starts a fresh one", fresh == "unset", fresh)
+        bash._close_all()
+
+
+# ---------------------------------------------------------------------------
+# directory snapshot cache (tools/tree.py)
+# ---------------------------------------------------------------------------
+
+@component("tree_cache")
+def tree_cache(check, tmp: Path):
+    import os
+    from tools import tree
+
+    for use_inotify in (True, False):
+        mode = "inotify" if use_inotify else "mtime"
+        root = tmp / mode
+        (root / "sub").mkdir(parents=True)
+        (root / "a.txt").write_text("a")
+        with patch.object(tree, "USE_INOTIFY", use_inotify), patch.object(tree, "MTIME_SLACK_NS", 0):
+            cache = tree.TreeCache()
+            check(f"{mode}: listing", cache.entries(root) == (["sub"], ["a.txt"]), repr(cache.entries(root)))
+            (root / "b.txt").write_text("b")
+            check(f"{mode}: create is seen", cache.entries(root)[1] == ["a.txt", "b.txt"], repr(cache.entries(root)))
+            (root / "a.txt").rename(root / "c.txt")
+            check(f"{mode}: rename is seen", cache.entries(root)[1] == ["b.txt", "c.txt"], repr(cache.entries(root)))
+            (root / "b.txt").unlink()
+            (root / "sub").rmdir()
+            check(f"{mode}: delete is seen", cache.entries(root) == ([], ["c.txt"]), repr(cache.entries(root)))
+
+    # without inotify, a change in the same mtime tick as the listing must not be cached under the old stamp
+    root = tmp / "race"
+    root.mkdir()
+    real_scandir = os.scandir
+
+    class scandir_then_change:
+        def __init__(self, path):
+            with real_scandir(path) as it:
+                self.entries = list(it)
+            (root / "late.txt").write_text("x")
+            os.utime(root, ns=(stamp, stamp))  # same mtime tick as before the listing
+
+        def __enter__(self):
+            return iter(self.entries)
+
+        def __exit__(self, *exc):
+            pass
+
+    stamp = root.stat().st_mtime_ns
+    with patch.object(tree, "USE_INOTIFY", False):
+        cache = tree.TreeCache()
+        with patch.object(tree.os, "scandir", scandir_then_change):
+            cache.entries(root)
+        check("mtime: change during the listing is not served stale", cache.entries(root)[1] == ["late.txt"],
+              repr(cache.entries(root)))
+
+    root = tmp / "fresh"
+    root.mkdir()
+    with patch.object(tree, "USE_INOTIFY", False):
+        cache = tree.TreeCache()
+        cache.entries(root)
+        check("mtime: a directory modified within the slack is not cached", str(root) not in cache._dirs)
+
+
+@component("grep_engine")
+def grep_engine(check, tmp: Path):
+    import os
+    from tools import grep
+
+    (tmp / "b" / "inner").mkdir(parents=True)
+    (tmp / "a").mkdir()
+    for rel in ("z.txt", "m.txt", "b/y.txt", "b/inner/x.txt", "a/w.txt"):
+        (tmp / rel).write_text("hit one\nmiss\nhit two\n")
+    (tmp / "blob.bin").write_bytes(b"hit\0" + b"hit\n" * 10)
+    (tmp / "skip").mkdir()
+    (tmp / "skip" / "s.txt").write_text("hit\n")
+
+    def run(pattern, limit=200):
+        return [(str(p.relative_to(tmp)), n, line)
+                for p, n, line in grep.grep(tmp, pattern, "*", {"skip"}, set(), limit)]
+
+    with patch.object(grep, "index", grep.TrigramIndex()):
+        hits = run("hit")
+        order = [p for p, _, _ in hits[::2]]
+        check("tree order: subdirectories first, then files, by name",
+              order == ["a/w.txt", "b/inner/x.txt", "b/y.txt", "m.txt", "z.txt"], repr(order))
+        check("line numbers", hits[:2] == [("a/w.txt", 1, "hit one"), ("a/w.txt", 3, "hit two")], repr(hits[:2]))
+        check("binary files and ignored dirs are skipped", not any(p in ("blob.bin", "skip/s.txt") for p, _, _ in hits))
+        check("limit stops the walk early", run("hit", limit=3) == hits[:3], repr(run("hit", limit=3)))
+
+        target = tmp / "m.txt"
+        check("no match before the edit", run("needle") == [])
+        entry = grep.index.lookup(str(target), (target.stat().st_mtime_ns, target.stat().st_size))
+        check("indexed file without the literal is pruned",
+              entry is not None and not grep.TrigramIndex.may_contain(entry, grep._trigram_bits("needle")))
+        mtime = target.stat().st_mtime_ns
+        target.write_text("hit one\nneedle\nhit two\n")
+        os.utime(target, ns=(mtime, mtime))  # same mtime: only the size marks the edit
+        check("edited file is rescanned, not pruned by the stale bitmap",
+              run("needle") == [("m.txt", 2, "needle")], repr(run("needle")))
+
+
+# ---------------------------------------------------------------------------
+# shared HTTP layer (utils/http_utils.py)
+# ---------------------------------------------------------------------------
+
+@component("http_utils")
+async def http_utils(check, tmp: Path):
+    import asyncio
+    import os
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from utils import http_utils as http
+
+    seen = []
+
+    class Proxy(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append((self.path, self.headers.get("Proxy-Authorization")))
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Proxy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    proxy = f"http://user:pw@127.0.0.1:{server.server_port}"
+    try:
+        with patch.dict(os.environ, {"http_proxy": proxy, "no_proxy": "skipped.invalid"}):
+            status, _, body = await asyncio.to_thread(http.pool.request, "GET", "http://zipper.invalid/a?b=1")
+            check("sync pool goes through HTTP_PROXY", status == 200 and seen[:1] and
+                  seen[0][0] == "http://zipper.invalid/a?b=1", repr(seen))
+            check("with the proxy credentials", seen[0][1] == "Basic dXNlcjpwdw==", repr(seen))
+            check("NO_PROXY hosts connect directly", http._proxy_for("http", "skipped.invalid") is None)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    quoted = http._form_quote('evil"; name="x\r\nX-Injected: 1.txt')
+    check("multipart names cannot break out of their quotes",
+          '"' not in quoted and "\r" not in quoted and "\n" not in quoted, quoted)
+
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return
+    with patch.object(http, "_shared", None):
+        owned = http._session()
+        check("first loop owns the shared session", owned is not None and owned.trust_env)
+        other = await asyncio.to_thread(lambda: asyncio.run(_session_from_new_loop(http)))
+        check("other loops get no shared session", other is None)
+        await http.close_sessions()
+        check("close_sessions closes it", owned.closed and http._shared is None)
+
+
+async def _session_from_new_loop(http):
+    return http._session()
+
+
+# ---------------------------------------------------------------------------
+# conversation storage backends (JSON files, SQLite)
+# ---------------------------------------------------------------------------
+
+def _backend(name: str, tmp: Path):
+    """Patches that point the conversation store at a fresh backend under tmp."""
+    import contextlib
+    import os
+    from storage import conversations, db
+
+    stack = contextlib.ExitStack()
+    stack.enter_context(patch.object(conversations, "store", conversations.ConversationStore()))
+    if name == "sqlite":
+        stack.enter_context(patch.dict(os.environ, {"ZIPPER_STORAGE": "sqlite"}))
+        stack.enter_context(patch.object(db, "DB_PATH", tmp / "zipper.db"))
+    else:
+        stack.enter_context(patch.dict(os.environ, {"ZIPPER_STORAGE": "json"}))
+        stack.enter_context(patch.multiple(
+            conversations, DATA_DIR=tmp / "conversations",
+            META_INDEX_PATH=tmp / "conversation_index.jsonl", THREAD_INDEX_PATH=tmp / "thread_index.jsonl",
+            _meta_index=conversations._MetaIndex(), _thread_index=conversations._ThreadIndex(),
+        ))
+    return stack
+
+
+@component("storage_backends")
+def storage_backends(check, tmp: Path):
+    from storage import conversations as c
+
+    for name in ("json", "sqlite"):
+        with _backend(name, tmp / name):
+            ids = [c.create_conversation(title=f"conv {i}", source=src)
+                   for i, src in enumerate(["cron", "discord", "test"])]
+            c.append_message(ids[0], "user", "hello")
+            c.append_message(ids[0], "assistant", [{"type": "text", "text": "hi"}])
+            c.update_meta(ids[1], title="renamed", status="done")
+            check(f"{name}: messages round-trip",
+                  [m["role"] for m in c.get_latest_version(ids[0])["messages"]] == ["user", "assistant"]
+                  and c.get_full_history(ids[0])[1]["content"][0]["text"] == "hi")
+            meta = c.get_conversation(ids[1])
+            check(f"{name}: meta update", meta["title"] == "renamed" and meta["status"] == "done", repr(meta))
+
+            first, cursor = c.query_conversations(limit=2)
+            rest, end = c.query_conversations(limit=2, cursor=cursor)
+            order = [r["id"] for r in first + rest]
+            check(f"{name}: paging walks every row once, newest-updated first",
+                  order == [ids[1], ids[0], ids[2]] and end is None, repr(order))
+            check(f"{name}: filtered count", c.count_conversations(exclude_source="test") == 2)
+            newest = [r["id"] for r in c.newest_conversations(limit=2, exclude_source="test")]
+            check(f"{name}: newest by creation", newest == [ids[1], ids[0]], repr(newest))
+
+            c.delete_conversation(ids[2])
+            check(f"{name}: delete", c.count_conversations() == 2 and ids[2] not in
+                  [r["id"] for r in c.query_conversations(limit=10)[0]])
+
+
+@component("storage_import")
+def storage_import(check, tmp: Path):
+    from storage import conversations as c, db
+
+    source = tmp / "source"
+    with _backend("json", source):
+        cid = c.create_conversation(title="imported", source="discord", discord_thread_id="42")
+        for i in range(3):
+            c.append_message(cid, "user" if i % 2 == 0 else "assistant", f"message {i}")
+        expected_meta = c.get_conversation(cid)
+        expected_messages = c.get_latest_version(cid)["messages"]
+        expected_history = c.get_full_history(cid)
+    # a crash mid-append leaves a torn last line behind
+    for log in [source / "conversations" / cid / "full.jsonl",
+                *(source / "conversations" / cid / "versions").glob("*.jsonl")]:
+        with open(log, "a") as f:
+            f.write('{"role": "user", "content": "cut o')
+
+    with _backend("sqlite", tmp / "target"):
+        counts = db.import_data(source)
+        check("importer counts conversations", counts["conversations"] == 1, repr(counts))
+        check("meta round-trips", c.get_conversation(cid) == expected_meta)
+        check("messages round-trip without the torn line",
+              c.get_latest_version(cid)["messages"] == expected_messages)
+        check("history round-trips without the torn line", c.get_full_history(cid) == expected_history)
+        check("thread lookup works after import", c.find_conversation_by_thread(42) == cid)
+        db.import_data(source)
+        check("re-running the import is idempotent", c.get_full_history(cid) == expected_history
+              and c.count_conversations() == 1)
+
+
+@component("storage_jsonl_migration")
+def storage_jsonl_migration(check, tmp: Path):
+    import json
+    from storage import conversations as c
+
+    with _backend("json", tmp):
+        # a conversation written by a release before JSONL segments
+        folder = tmp / "conversations" / "legacy"
+        (folder / "versions").mkdir(parents=True)
+        (folder / "meta.json").write_text(json.dumps({
+            "id": "legacy", "title": "legacy", "source": "api", "status": "active",
+            "created_at": "2026-01-01T00:00:00", "updated_at": "2026-01-01T00:00:00",
+        }, indent=2))
+        old = [{"role": "user", "content": "first"}, {"role": "assistant", "content": "reply"}]
+        (folder / "versions" / "1.json").write_text(json.dumps(
+            {"version": 1, "summary": "", "system_prompt": "sys 1", "messages": old}, indent=2))
+        (folder / "versions" / "2.json").write_text(json.dumps(
+            {"version": 2, "summary": "so far", "system_prompt": "sys 2", "messages": old[1:]}, indent=2))
+        (folder / "full.json").write_text(json.dumps({"messages": old}, indent=2))
+
+        latest = c.get_latest_version("legacy")
+        check("legacy versions are migrated", latest["version"] == 2 and latest["summary"] == "so far"
+              and latest["system_prompt"] == "sys 2" and latest["messages"] == old[1:], repr(latest))
+        check("legacy full history is migrated", c.get_full_history("legacy") == old)
+        check("legacy files are replaced by JSONL",
+              list(folder.rglob("*.json")) == [folder / "meta.json"]
+              and sorted(p.name for p in (folder / "versions").glob("*.jsonl")) == ["1.jsonl", "2.jsonl"])
+
+        # a crash mid-append leaves a torn last line; the next append must not be swallowed by it
+        for log in (folder / "full.jsonl", folder / "versions" / "2.jsonl"):
+            with open(log, "a") as f:
+                f.write('{"role": "user", "content": "cut o')
+        c.append_message("legacy", "user", "after the crash")
+        messages = c.ConversationStore().latest_version("legacy")["messages"]
+        check("torn line is skipped and the next append survives",
+              [m["content"] for m in messages] == ["reply", "after the crash"], repr(messages))
+        history = [m["content"] for m in c.get_full_history("legacy")]
+        check("same for the full history", history == ["first", "reply", "after the crash"], repr(history))
+
+
+@component("storage_version_head")
+def storage_version_head(check, tmp: Path):
+    from storage import conversations as c
+
+    with _backend("json", tmp):
+        cid = c.create_conversation(title="head", source="test")
+        c.append_message(cid, "user", "one")
+        c.create_version(cid, summary="s1", messages=[{"role": "user", "content": "two"}])
+        c.create_version(cid, summary="s2", messages=[{"role": "user", "content": "three"}])
+        head = c._head_path(cid)
+        top = max(int(p.stem) for p in c._versions_path(cid).glob("*.jsonl"))
+        check("create_version moves HEAD", head.read_text().strip() == str(top), head.read_text())
+
+        with patch.object(c, "_version_files", side_effect=AssertionError("globbed")):
+            try:
+                latest = c.ConversationStore().latest_version(cid)["version"]
+            except AssertionError:
+                latest = None
+        check("lookups with a HEAD never list the versions directory", latest == top, repr(latest))
+
+        for damage in ("missing", "garbage"):
+            if damage == "missing":
+                head.unlink()
+            else:
+                head.write_text("not a number")
+            latest = c.ConversationStore().latest_version(cid)
+            check(f"{damage} HEAD falls back to the newest version file",
+                  latest["version"] == top and latest["summary"] == "s2", repr(latest))
+            check(f"and is rewritten ({damage})", head.read_text().strip() == str(top))
+
+
+# ---------------------------------------------------------------------------
+# tool execution within one assistant turn (llm/loop.py)
+# ---------------------------------------------------------------------------
+
+@component("parallel_tools")
+async def parallel_tools(check, tmp: Path):
+    import llm
+    from llm import run_conversation
+    from storage.conversations import create_conversation, get_latest_version
+    from storage.trace import get_trace
+    from tests.mock_client import MockClient
+
+    def use(tool_id, name, **args):
+        return {"type": "tool_use", "id": tool_id, "name": name, "input": args}
+
+    turns = [
+        {"stop_reason": "tool_use", "content": [
+            use("t1", "web", mode="fetch", url="https://a.invalid"),
+            use("t2", "web", mode="fetch", url="https://b.invalid"),
+            use("t3", "bash", command="echo serial"),
+            use("t4", "web", mode="fetch", url="https://c.invalid"),
+        ]},
+        {"stop_reason": "end_turn", "content": [{"type": "text", "text": "done"}]},
+    ]
+    spans = {}
+
+    def timed(label, seconds, result):
+        start = time.monotonic()
+        time.sleep(seconds)
+        spans[label] = (start, time.monotonic())
+        return result
+
+    def web(args):
+        # the first call is the slowest, so finishing order differs from tool_use order
+        delay = {"https://a.invalid": 0.4, "https://b.invalid": 0.1}.get(args["url"], 0.05)
+        return timed(args["url"], delay, f"page {args['url'][8]}")
+
+    def bash(args, conversation_id="", on_output=None):
+        return timed("bash", 0.05, "serial")
+
+    conversation_id = create_conversation(title="[test] parallel tools", source="test")
+    with patch.object(llm, "client", MockClient(turns)), patch("tools.web_run", web), patch("tools.bash_run", bash):
+        await run_conversation("go", conversation_id)
+
+    a, b, c = spans["https://a.invalid"], spans["https://b.invalid"], spans["https://c.invalid"]
+    check("consecutive parallel-safe calls overlap", b[0] < a[1], repr(spans))
+    check("an unsafe call waits for the batch before it", spans["bash"][0] >= max(a[1], b[1]))
+    check("and the calls after it wait for it", c[0] >= spans["bash"][1])
+
+    results = next(m["content"] for m in get_latest_version(conversation_id)["messages"]
+                   if m["role"] == "user" and isinstance(m["content"], list))
+    check("tool_results keep tool_use order", [r["tool_use_id"] for r in results] == ["t1", "t2", "t3", "t4"])
+    check("each result belongs to its call", [r["content"].rsplit("\n", 1)[-1] for r in results]
+          == ["page a", "page b", "serial", "page c"], repr([r["content"][-20:] for r in results]))
+    entries = get_trace(conversation_id)["entries"]
+    check("one trace entry per call, in tool_use order",
+          [(e["tool"], e["args"].get("url")) for e in entries]
+          == [("web", "https://a.invalid"), ("web", "https://b.invalid"), ("bash", None), ("web", "https://c.invalid")],
+          repr([(e["tool"], e["args"]) for e in entries]))
+
+
+# ---------------------------------------------------------------------------
+# compaction (llm/messages.py split points, llm/loop.py background job)
+# ---------------------------------------------------------------------------
+
+def _turn(prompt: str, steps: int, size: int) -> list:
+    """A user prompt, steps tool_use/tool_result rounds of roughly size chars each, and a reply."""
+    messages = [{"role": "user", "content": prompt}]
+    for n in range(steps):
+        messages.append({"role": "assistant", "content": [
+            {"type": "tool_use", "id": f"{prompt}-{n}", "name": "bash", "input": {"command": "x" * size}}]})
+        messages.append({"role": "user", "content": [
+            {"type": "tool_result", "tool_use_id": f"{prompt}-{n}", "content": "y" * size}]})
+    messages.append({"role": "assistant", "content": [{"type": "text", "text": "done " + prompt}]})
+    return messages
+
+
+def _pairs_intact(messages: list) -> bool:
+    """Every tool_result answers a tool_use in the message right before it."""
+    for i, msg in enumerate(messages):
+        if msg["role"] == "user" and isinstance(msg["content"], list):
+            for block in msg["content"]:
+                if block.get("type") == "tool_result":
+                    prev = messages[i - 1]["content"] if i else []
+                    if not any(isinstance(b, dict) and b.get("id") == block["tool_use_id"] for b in prev):
+                        return False
+    return True
+
+
+@component("compaction_split")
+def compaction_split(check, tmp: Path):
+    from llm.messages import compaction_split, compaction_tail, estimate_tokens, COMPACTION_RESUME
+
+    messages = _turn("q1", 2, 2000) + _turn("q2", 2, 2000) + _turn("q3", 1, 200)
+    split = compaction_split(messages, keep_tokens=2000)
+    check("splits before a plain user message when one fits",
+          split is not None and messages[split]["content"] == "q3", repr(split))
+    check("kept tail fits the budget", estimate_tokens(messages[split:]) <= 2000)
+    check("tiny conversations have nothing to split", compaction_split(messages[:1], 2000) is None)
+
+    single = _turn("only", 8, 4000)
+    split = compaction_split(single, keep_tokens=5000)
+    tail = compaction_tail(single, split)
+    check("a single long turn is split inside, after a tool_result",
+          split is not None and single[split]["role"] == "assistant" and split > 1, repr(split))
+    check("its tail leads with the resume note", tail[0]["content"][0]["text"] == COMPACTION_RESUME)
+    for label, msgs in (("multi-turn", messages), ("single turn", single)):
+        splits = {compaction_split(msgs, keep) for keep in range(250, 40000, 250)} - {None}
+        check(f"{label}: no budget separates a tool_use from its tool_result",
+              splits and all(_pairs_intact(compaction_tail(msgs, s)) for s in splits), repr(sorted(splits)))
+
+
+@component("compaction_background")
+async def compaction_background(check, tmp: Path):
+    import asyncio
+    from types import SimpleNamespace
+    import llm
+    from llm import loop
+    from storage.conversations import create_conversation, append_message, get_latest_version
+
+    conversation_id = create_conversation(title="[test] background compaction", source="test")
+    for message in _turn("q1", 2, 2000) + _turn("q2", 2, 2000) + [{"role": "user", "content": "q3"}]:
+        append_message(conversation_id, message["role"], message["content"])
+    overhead = loop._context_tokens({"messages": [], "system_prompt": ""}, "claude-sonnet-4-6")
+    budget = {"compact_at": overhead + 1000, "keep": 300}
+
+    requests, release = [], asyncio.Event()
+
+    async def create(**kwargs):
+        requests.append(kwargs["messages"][0]["content"])
+        await release.wait()
+        return _summary(f"summary {len(requests)}")
+
+    fake = SimpleNamespace(messages=SimpleNamespace(create=create))
+    with patch.object(llm, "client", fake), patch.object(loop, "compaction_budget", lambda model: budget), \
+            patch.object(loop, "COUNT_TOKENS_CHECK", False):
+        loop.schedule_compaction(conversation_id)
+        loop.schedule_compaction(conversation_id)
+        check("scheduling returns before the summary is made", get_latest_version(conversation_id)["version"] == 0
+              and not requests)
+        while not requests:
+            await asyncio.sleep(0.01)
+        # the turn goes on while the summary is being written
+        append_message(conversation_id, "assistant", [{"type": "text", "text": "while compacting"}])
+        release.set()
+        while loop._compaction_tasks:
+            await asyncio.sleep(0.01)
+        version = get_latest_version(conversation_id)
+        check("one compaction per conversation at a time", len(requests) == 1, f"{len(requests)} summaries")
+        check("new version carries the rolling summary", version["version"] == 1 and version["summary"] == "summary 1",
+              repr({k: version[k] for k in ("version", "summary")}))
+        check("messages appended meanwhile are kept", version["messages"][-1]["content"][0]["text"] == "while compacting")
+
+        for message in _turn("q4", 2, 2000):
+            append_message(conversation_id, message["role"], message["content"])
+        append_message(conversation_id, "user", "q5")
+        loop.schedule_compaction(conversation_id)
+        while loop._compaction_tasks:
+            await asyncio.sleep(0.01)
+        check("the next summary extends the previous one", "## Current summary\nsummary 1" in requests[-1])
+        check("and only sends the delta", "q1" not in requests[-1] and "q4" in requests[-1])
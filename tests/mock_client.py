@@ -1,10 +1,20 @@
 """Mock anthropic client that replays pre-recorded gold conversation turns."""
 
+from types import SimpleNamespace
+
+DEFAULT_USAGE = {
+    "input_tokens": 100,
+    "output_tokens": 20,
+    "cache_creation_input_tokens": 0,
+    "cache_read_input_tokens": 0,
+}
+
 
 class _MockFinalMessage:
     def __init__(self, turn: dict):
         self.content = turn["content"]
         self.stop_reason = turn["stop_reason"]
+        self.usage = SimpleNamespace(**{**DEFAULT_USAGE, **turn.get("usage", {})})
 
 
 class _MockStream:
@@ -11,6 +11,8 @@ Each gold file in tests/gold/*.json defines:
   - mocks.discord: per-mode overrides for discord tool return values
   - sandbox.create: files to create before running (cleaned up after)
 
+Component tests in tests/components.py run after the gold tests.
+
 Usage:
   python tests/runner.py            # run all tests
   python tests/runner.py file       # run tests matching "file"
@@ -18,6 +20,7 @@ Usage:
 """
 
 import asyncio
+import inspect
 import json
 import os
 import sys
@@ -33,6 +36,7 @@ sys.path.insert(0, str(ROOT))
 from dotenv import load_dotenv
 load_dotenv(ROOT / ".env")
 
+from tests.components import TESTS as COMPONENT_TESTS
 from tests.mock_client import MockClient
 from llm import run_conversation
 from storage.conversations import create_conversation
@@ -242,7 +246,6 @@ async def run_gold_test(gold_path: Path) -> dict:
             patch("tools.restart_run", _restart_mock()),
             patch("storage.tasks.QUEUE_PATH", Path(tmp_queue)),
             patch("storage.tasks.ARCHIVE_PATH", Path(tmp_archive)),
-            patch("tools.task.ARCHIVE_PATH", Path(tmp_archive)),
             patch("storage.memory.MEMORY_PATH", Path(tmp_memory)),
         ):
             final_response = await run_conversation(gold.get("prompt", "test"), conversation_id)
@@ -269,6 +272,23 @@ async def run_gold_test(gold_path: Path) -> dict:
             os.unlink(tmp_memory)
 
 
+def run_component_test(name: str, fn) -> dict:
+    results = []
+
+    def check(label: str, passed: bool, detail: str = ""):
+        results.append(({"type": label}, bool(passed), detail or ("ok" if passed else "failed")))
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            out = fn(check, Path(tmp))
+            if inspect.iscoroutine(out):
+                asyncio.run(out)
+    except Exception:
+        return {"name": name, "passed": False, "checks": results, "error": tb.format_exc()}
+    passed = bool(results) and all(p for _, p, _ in results)
+    return {"name": name, "passed": passed, "checks": results, "error": None}
+
+
 def _check_label(check: dict) -> str:
     parts = [check["type"]]
     if "index" in check:
@@ -286,16 +306,21 @@ def _check_label(check: dict) -> str:
 
 def run_all(filter_name: str = None, verbose: bool = False) -> int:
     gold_files = sorted(GOLD_DIR.glob("*.json"))
+    components = COMPONENT_TESTS
     if filter_name:
         gold_files = [f for f in gold_files if filter_name.lower() in f.stem.lower()]
+        components = [(n, fn) for n, fn in components if filter_name.lower() in n.lower()]
 
-    if not gold_files:
+    if not gold_files and not components:
         print(f"No gold files found in {GOLD_DIR}")
         return 1
 
+    runs = [lambda gf=gf: asyncio.run(run_gold_test(gf)) for gf in gold_files]
+    runs += [lambda n=n, fn=fn: run_component_test(n, fn) for n, fn in components]
+
     results = []
-    for gf in gold_files:
-        result = asyncio.run(run_gold_test(gf))
+    for run in runs:
+        result = run()
         results.append(result)
 
         status = "PASS" if result["passed"] else "FAIL"
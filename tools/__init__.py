@@ -1,4 +1,5 @@
 import copy
+import threading
 from pathlib import Path
 from tools.file import run as file_run, _list_tree, ROOT, DEFAULT_HIDDEN_DIRS
 from tools.bash import run as bash_run
@@ -10,7 +11,7 @@ from tools.memory import run as memory_run
 from tools.search_tools import run as search_tools_run
 from tools.summarize import run as summarize_run
 from tools.todo import run as todo_run
-from storage.trace import get_trace
+from storage.trace import has_used_tool
 
 import tools.file as _file_tool
 import tools.bash as _bash_tool
@@ -28,7 +29,7 @@ _BASH_MD = ROOT / "prompts" / "bash.md"
 _DISCORD_MD = ROOT / "prompts" / "discord.md"
 _FILE_TOOL_USAGE = """
 ## File Tool Modes
-- list — recursive tree (project root default). Hidden entries shown as stubs. Pass include_data=true to expand data/.
+- list — recursive tree (project root default). Hidden entries shown as stubs. Pass include_data=true to expand data/, depth=N to stop N levels down.
 - read — single file or filenames=[] for multi-read. line_start/line_end for ranges.
 - grep — regex across files. glob= to filter by extension (e.g. "*.py").
 - edit — exact search/replace. Errors on 0 or 2+ matches. all=true for bulk. Shows 3-line context on success.
@@ -47,7 +48,8 @@ def _file_onboarding(args: dict) -> str:
         parts.append(codebase)
         parts.append("")
 
-    # skip tree if this call is already listing files — output would be identical
+    # skip tree if this call is already listing files — output would be identical;
+    # the listing is served from tools/tree.py's snapshot cache after the first conversation
     if args.get("mode") != "list":
         tree = _list_tree(ROOT, ROOT, DEFAULT_HIDDEN_DIRS)
         parts.append("## Current File Tree")
@@ -68,11 +70,12 @@ ONBOARDING = {
 
     "web": """
 [first use — web tool guide]
-Two modes:
+Three modes:
 - search — queries Brave Search, returns title/URL/description per result. Use for finding docs, articles, or anything requiring current information. Pass limit=N for more results (default 5).
 - fetch — HTTP GET a URL, returns page text with HTML stripped. Use to read the actual content of a page found via search, or any public URL. Truncates at 20k chars.
+- fetch_many — fetch several URLs (urls=[...], up to 20) concurrently in one call. Returns one "=== url ===" section per page; pages share a 40k char budget, so short pages leave more room for long ones.
 
-Workflow: search to find relevant URLs, then fetch to read the content.
+Workflow: search to find relevant URLs, then fetch (or fetch_many for several) to read the content.
 """.strip(),
 
     "restart": """
@@ -136,6 +139,8 @@ Parameters:
 - text (required) — the text to summarize.
 - direction (optional) — a focus, e.g. "how errors are handled". Preserves detail relevant to that focus, lossy elsewhere.
 
+Large inputs (whole files, fetch_many dumps) are fine: they are split on file/paragraph/code-block boundaries, summarized in parallel, and merged.
+
 Example: summarize(text=file_contents, direction="what API endpoints are defined")
 """.strip(),
 
@@ -192,23 +197,50 @@ TOOLS = [
 ]
 
 
+# (conversation_id, tool) pairs already given onboarding in this process — parallel
+# calls to the same tool would otherwise all see an empty trace and all get the guide
+_onboarded: set = set()
+_onboarded_lock = threading.Lock()
+
+
 def _is_first_use(name: str, conversation_id: str) -> bool:
     if not conversation_id:
         return False
-    trace = get_trace(conversation_id)
-    return not any(e.get("tool") == name for e in trace.get("entries", []))
+    with _onboarded_lock:
+        if (conversation_id, name) in _onboarded:
+            return False
+        _onboarded.add((conversation_id, name))
+    return not has_used_tool(conversation_id, name)
 
 
 # empty primary field triggers help, same as calling with no args in a CLI
 _EMPTY_TRIGGERS = {
     "bash": lambda a: not a.get("command", "").strip(),
-    "web": lambda a: not a.get("query", "").strip() and not a.get("url", "").strip(),
+    "web": lambda a: not a.get("query", "").strip() and not a.get("url", "").strip() and not a.get("urls"),
     "discord": lambda a: False,  # mode is always required; use help=true
     "search_tools": lambda a: not a.get("query", "").strip(),
     "summarize": lambda a: not a.get("text", "").strip(),
 }
 
 
+# tool calls with no side effects, safe to run concurrently within one assistant turn;
+# anything not listed here (bash, restart, writes) runs serialized in tool_use order
+_PARALLEL_SAFE = {
+    "web": lambda a: True,
+    "summarize": lambda a: True,
+    "search_tools": lambda a: True,
+    "file": lambda a: a.get("mode") in ("list", "read", "grep"),
+    "memory": lambda a: a.get("mode", "list") in ("get", "list", "recent_conversations", "recent_logs"),
+    "discord": lambda a: a.get("mode") == "history",
+    "task": lambda a: a.get("mode") in ("list", "due", "archive"),
+    "todo": lambda a: a.get("mode") == "list",
+}
+
+
+def is_parallel_safe(name: str, args: dict) -> bool:
+    return _PARALLEL_SAFE.get(name, lambda a: False)(args)
+
+
 def _wants_help(name: str, args: dict) -> bool:
     if args.get("help"):
         return True
@@ -222,7 +254,8 @@ def _get_onboarding(name: str, args: dict) -> str:
     return entry(args) if callable(entry) else entry
 
 
-def execute_tool(name: str, args: dict, conversation_id: str = "") -> str:
+def execute_tool(name: str, args: dict, conversation_id: str = "", on_output=None) -> str:
+    """Run a tool. on_output(text), if given, receives live output from tools that stream (bash)."""
     if _wants_help(name, args):
         return _get_onboarding(name, args)
 
@@ -231,7 +264,7 @@ def execute_tool(name: str, args: dict, conversation_id: str = "") -> str:
     if name == "file":
         result = file_run(args)
     elif name == "bash":
-        result = bash_run(args)
+        result = bash_run(args, conversation_id, on_output)
     elif name == "web":
         result = web_run(args)
     elif name == "restart":
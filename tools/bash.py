@@ -1,31 +1,317 @@
+import atexit
+import codecs
+import os
+import re
+import select
+import signal
 import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from pathlib import Path
 
+ROOT = Path(__file__).parent.parent
+SCRIPT_DIR = ROOT / "data" / "bash"
 
-def run(args: dict) -> str:
+SPILL_DIR = ROOT / "data" / "bash" / "output"
+
+MAX_SESSIONS = 4       # live persistent shells across all conversations
+IDLE_TIMEOUT = 600     # seconds before an unused shell is closed
+SESSION_WAIT = 30      # seconds to wait for a free shell when all are busy
+
+INLINE_LIMIT = 10000   # outputs up to this many chars are returned whole
+HEAD_CHARS = 3000      # otherwise: this much of the start ...
+TAIL_CHARS = 6000      # ... and this much of the end (where errors usually are)
+KEEP_SPILLS = 50       # spill files kept under data/bash/output
+LIVE_INTERVAL = 0.25   # seconds between live output callbacks
+
+
+class _Output:
+    """Bounded sink for command output. Holds everything in memory up to INLINE_LIMIT;
+    past that, streams to a spill file and keeps only the head and a ring-buffered tail.
+    Optionally forwards coalesced chunks to on_output as they arrive."""
+
+    def __init__(self, on_output=None):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._head = ""
+        self._tail: deque[str] = deque()
+        self._tail_len = 0
+        self._total = 0
+        self._lines = 0
+        self._spill = None
+        self.spill_path = None
+        self._on_output = on_output
+        self._live: list[str] = []  # chunks not yet forwarded; only kept when on_output is set
+        self._live_at = time.monotonic()
+
+    def write(self, data: bytes, final: bool = False):
+        text = self._decoder.decode(data, final)
+        if text:
+            self._total += len(text)
+            self._lines += text.count("\n")
+            if len(self._head) < HEAD_CHARS:
+                self._head += text[:HEAD_CHARS - len(self._head)]
+            if self._spill is None and self._total > INLINE_LIMIT:
+                self._start_spill()
+            if self._spill is not None:
+                self._spill.write(text)
+            self._tail.append(text)
+            self._tail_len += len(text)
+            if self._spill is not None:  # before spilling, the "tail" is the whole output
+                while self._tail_len - len(self._tail[0]) >= TAIL_CHARS:
+                    self._tail_len -= len(self._tail.popleft())
+            if self._on_output:
+                self._live.append(text)
+        if self._live and (final or time.monotonic() - self._live_at >= LIVE_INTERVAL):
+            self._on_output("".join(self._live))
+            self._live.clear()
+            self._live_at = time.monotonic()
+
+    def _start_spill(self):
+        SPILL_DIR.mkdir(parents=True, exist_ok=True)
+        spills = sorted(SPILL_DIR.glob("*.log"), key=lambda p: p.stat().st_mtime)
+        for old in spills[:max(0, len(spills) - KEEP_SPILLS + 1)]:
+            old.unlink(missing_ok=True)
+        self.spill_path = SPILL_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.log"
+        self._spill = open(self.spill_path, "w", encoding="utf-8")
+        self._spill.write("".join(self._tail))  # everything so far is still in memory
+
+    def close(self):
+        self.write(b"", final=True)
+        if self._spill is not None:
+            self._spill.close()
+
+    def text(self) -> str:
+        """Whole output if small, else head + tail excerpt pointing at the spill file."""
+        tail = "".join(self._tail)
+        if self.spill_path is None:
+            return tail
+        tail = tail[-TAIL_CHARS:]
+        omitted = self._total - len(self._head) - len(tail)
+        handle = self.spill_path.relative_to(ROOT)
+        return (
+            f"{self._head}\n"
+            f"... [{omitted} chars omitted; {self._total} chars / {self._lines} lines in total. "
+            f"Full output: file read filename=\"{handle}\" with line_start/line_end] ...\n"
+            f"{tail}"
+        )
+
+
+def _format(output: str, returncode: int) -> str:
+    if returncode != 0:
+        output += f"\nexit code: {returncode}"
+    return output.strip() or "ok"
+
+
+class _Session:
+    """A long-lived bash process for one conversation. Commands are sourced from a
+    script file so cd, exports and activated venvs persist, and syntax errors stay
+    contained; a per-command sentinel line marks the end of output and carries $?."""
+
+    def __init__(self, conversation_id: str):
+        self.conversation_id = conversation_id
+        self.lock = threading.Lock()
+        self.busy = 0  # checked-out calls, guarded by _sessions_lock
+        self.last_used = time.monotonic()
+        self.script = SCRIPT_DIR / f"{conversation_id}.sh"
+        SCRIPT_DIR.mkdir(parents=True, exist_ok=True)
+        self.proc = subprocess.Popen(
+            ["/bin/bash", "--noprofile", "--norc"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,  # own process group, so close() also kills children
+        )
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def close(self):
+        if self.alive():
+            try:
+                os.killpg(self.proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.proc.wait()
+        self.proc.stdin.close()
+        self.proc.stdout.close()
+        self.script.unlink(missing_ok=True)
+
+    def run(self, command: str, timeout: float, out: _Output) -> tuple[int | None, bool]:
+        """Returns (exit code or None on timeout, whether the shell is still usable)."""
+        nonce = uuid.uuid4().hex
+        sentinel = re.compile(rf"\n?__ZIPPER_DONE_{nonce}_(\d+)\n".encode())
+        self.script.write_text(command + "\n", encoding="utf-8")
+        line = f". '{self.script}' < /dev/null; printf '\\n__ZIPPER_DONE_{nonce}_%s\\n' \"$?\"\n"
+        self.proc.stdin.write(line.encode())
+        self.proc.stdin.flush()
+
+        match, eof = _read_until(self.proc.stdout.fileno(), out, time.monotonic() + timeout, sentinel)
+        if match:
+            self.last_used = time.monotonic()
+            return int(match.group(1)), True
+        if eof:  # shell exited (e.g. the command ran `exit`)
+            return self.proc.wait(), False
+        return None, False
+
+
+def _read_until(fd: int, out: _Output, deadline: float, sentinel: re.Pattern = None):
+    """Copy fd into out until EOF, the sentinel, or the deadline. Returns (sentinel match, hit EOF).
+    Bytes that could still be the start of the sentinel are held back from out."""
+    pending = b""
+    hold = 96 if sentinel else 0  # longer than any sentinel line
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            out.write(pending)
+            return None, False
+        ready, _, _ = select.select([fd], [], [], min(remaining, LIVE_INTERVAL))
+        if not ready:
+            out.write(b"")  # lets coalesced live output through while the command is quiet
+            continue
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            out.write(pending)
+            return None, True
+        pending += chunk
+        if sentinel:
+            m = sentinel.search(pending)
+            if m:
+                out.write(pending[:m.start()])
+                return m, False
+        if len(pending) > hold:
+            cut = len(pending) - hold
+            out.write(pending[:cut])
+            pending = pending[cut:]
+
+
+_sessions: "OrderedDict[str, _Session]" = OrderedDict()
+_sessions_lock = threading.Lock()
+_sessions_freed = threading.Condition(_sessions_lock)
+
+
+def _checkout(conversation_id: str, reset: bool) -> _Session:
+    """Get (or start) the conversation's shell, closing idle and least-recently-used ones over the cap.
+    When MAX_SESSIONS shells are all busy, waits up to SESSION_WAIT for one to free up. A reset is refused
+    while another call is using the shell. Pair with _checkin."""
+    deadline = time.monotonic() + SESSION_WAIT
+    with _sessions_lock:
+        while True:
+            now = time.monotonic()
+            for cid, s in list(_sessions.items()):
+                if cid != conversation_id and now - s.last_used > IDLE_TIMEOUT and not s.busy:
+                    _sessions.pop(cid).close()
+
+            session = _sessions.get(conversation_id)
+            if session and reset and session.busy:
+                raise RuntimeError(
+                    "session busy: another command is running in this conversation's shell; "
+                    "retry the reset once it finishes"
+                )
+            if session and (reset or not session.alive()):
+                _sessions.pop(conversation_id).close()
+                session, reset = None, False
+            if session is None:
+                for cid, s in list(_sessions.items()):
+                    if len(_sessions) < MAX_SESSIONS:
+                        break
+                    if not s.busy:
+                        _sessions.pop(cid).close()
+                if len(_sessions) >= MAX_SESSIONS:
+                    if now >= deadline:
+                        raise RuntimeError(
+                            f"all {MAX_SESSIONS} shell sessions are busy; retry later or run without session=true"
+                        )
+                    _sessions_freed.wait(deadline - now)
+                    continue
+                session = _Session(conversation_id)
+                _sessions[conversation_id] = session
+            _sessions.move_to_end(conversation_id)
+            session.busy += 1
+            return session
+
+
+def _checkin(session: _Session):
+    with _sessions_lock:
+        session.busy -= 1
+        _sessions_freed.notify_all()
+
+
+def _drop(session: _Session):
+    with _sessions_lock:
+        if _sessions.get(session.conversation_id) is session:
+            del _sessions[session.conversation_id]
+            _sessions_freed.notify_all()
+    session.close()
+
+
+@atexit.register
+def _close_all():
+    with _sessions_lock:
+        for s in _sessions.values():
+            s.close()
+        _sessions.clear()
+
+
+def _run_in_session(command: str, timeout: float, conversation_id: str, reset: bool, out: _Output) -> str:
+    session = _checkout(conversation_id, reset)
+    try:
+        with session.lock:
+            returncode, usable = session.run(command, timeout, out)
+    finally:
+        _checkin(session)
+    out.close()
+    if usable:
+        return _format(out.text(), returncode)
+    _drop(session)
+    if returncode is None:
+        message = f"error: command timed out after {timeout}s (session restarted)"
+        return f"{out.text().strip()}\n{message}" if out.text().strip() else message
+    return _format(out.text(), returncode) + "\nsession ended — the next session=true call starts a fresh shell"
+
+
+def _run_once(command: str, timeout: float, out: _Output) -> str:
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + timeout
+    with proc:
+        _, eof = _read_until(proc.stdout.fileno(), out, deadline)
+        out.close()
+        returncode = None
+        if eof:
+            # stdout closed, but the shell may still be running (it redirected or closed its output)
+            try:
+                returncode = proc.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                pass
+        if returncode is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            proc.wait()
+            message = f"error: command timed out after {timeout}s"
+            return f"{out.text().strip()}\n{message}" if out.text().strip() else message
+        return _format(out.text(), returncode)
+
+
+def run(args: dict, conversation_id: str = "", on_output=None) -> str:
+    """on_output(text), if given, receives output chunks live (from this worker thread)."""
     command = args["command"]
     timeout = args.get("timeout", 30)
+    out = _Output(on_output)
 
     try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
-        output = ""
-        if result.stdout:
-            output += result.stdout
-        if result.stderr:
-            output += result.stderr
-        if result.returncode != 0:
-            output += f"\nexit code: {result.returncode}"
-        output = output.strip() or "ok"
-        if len(output) > 10000:
-            output = output[:10000] + f"\n... [truncated, {len(output)} chars total]"
-        return output
-    except subprocess.TimeoutExpired:
-        return f"error: command timed out after {timeout}s"
+        if args.get("session") and conversation_id:
+            return _run_in_session(command, timeout, conversation_id, bool(args.get("reset")), out)
+        return _run_once(command, timeout, out)
     except Exception as e:
         return f"error: {e}"
 
@@ -44,6 +330,14 @@ SCHEMA = {
                 "type": "integer",
                 "description": "Timeout in seconds. Default 30.",
             },
+            "session": {
+                "type": "boolean",
+                "description": "Run in this conversation's persistent shell: cwd, exported variables and an activated venv carry over between session calls. Default false (fresh shell per call).",
+            },
+            "reset": {
+                "type": "boolean",
+                "description": "With session=true: restart the persistent shell before running the command.",
+            },
             "help": {
                 "type": "boolean",
                 "description": "Return usage guide for this tool without performing any action.",
@@ -1,20 +1,7 @@
 from pathlib import Path
-import requests
 
 from utils.constants import BOT_URL
-from utils.http_utils import post_json
-
-
-def _post_multipart(endpoint: str, files: dict, data: dict = None) -> dict:
-    """Send multipart/form-data request (for file uploads) using requests library."""
-    try:
-        resp = requests.post(f"{BOT_URL}/{endpoint}", files=files, data=data, timeout=60)
-        if resp.status_code == 200:
-            return resp.json()
-        else:
-            return {"error": f"HTTP {resp.status_code}: {resp.text}"}
-    except Exception as e:
-        return {"error": str(e)}
+from utils.http_utils import post_json, post_multipart
 
 
 def run(args: dict) -> str:
@@ -33,7 +20,7 @@ def run(args: dict) -> str:
             data = {"message": message}
             if args.get("thread_id"):
                 data["thread_id"] = args["thread_id"]
-            resp = _post_multipart("send", files, data)
+            resp = post_multipart(f"{BOT_URL}/send", files, data)
         else:
             payload = {"message": message}
             if args.get("thread_id"):
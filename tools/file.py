@@ -1,7 +1,9 @@
-import fnmatch
 import re
 from pathlib import Path
 
+from tools.grep import grep
+from tools.tree import cache as tree_cache
+
 ROOT = Path(__file__).parent.parent
 PROJECT_ROOT = ROOT  # backward-compatible alias
 
@@ -9,67 +11,49 @@ IGNORED_DIRS = {".venv", "__pycache__", ".git"}
 IGNORED_FILES = {".env"}
 DEFAULT_HIDDEN_DIRS = {"data"}
 
-
-def _iter_tree(root: Path, hidden_dirs: set) -> list[Path]:
-    """Recursively yield file paths, fully skipping ignored and hidden dirs (used by grep)."""
-    results = []
-    try:
-        entries = sorted(root.iterdir(), key=lambda e: (e.is_file(), e.name))
-    except PermissionError:
-        return results
-    for entry in entries:
-        if entry.is_dir():
-            if entry.name in IGNORED_DIRS or entry.name in hidden_dirs:
-                continue
-            results.extend(_iter_tree(entry, hidden_dirs))
-        else:
-            if entry.name in IGNORED_FILES:
-                continue
-            results.append(entry)
-    return results
-
-
 DIR_FILE_LIMIT = 30
 
 
-def _list_tree(root: Path, base: Path, hidden_dirs: set) -> list[str]:
+def _list_tree(root: Path, base: Path, hidden_dirs: set, depth: int | None = None) -> list[str]:
     """Recursively build a listing, showing ignored/hidden entries as '(hidden)' stubs.
-    Directories with more than DIR_FILE_LIMIT direct files are truncated."""
+    Directories with more than DIR_FILE_LIMIT direct files are truncated. With depth,
+    directories deeper than that many levels below base are shown as 'dir/ ...' stubs.
+    Directory contents come from the tree cache, so repeated listings skip the scandirs."""
     results = []
     try:
-        entries = sorted(root.iterdir(), key=lambda e: (e.is_file(), e.name))
-    except PermissionError:
+        dir_names, file_names = tree_cache.entries(root)
+    except (PermissionError, NotADirectoryError):
         return results
 
-    dirs = [e for e in entries if e.is_dir()]
-    files = [e for e in entries if e.is_file()]
-
-    for entry in dirs:
+    for name in dir_names:
+        entry = root / name
         try:
             rel = entry.relative_to(base)
         except ValueError:
-            rel = Path(entry.name)
-        if entry.name in IGNORED_DIRS or entry.name in hidden_dirs:
+            rel = Path(name)
+        if name in IGNORED_DIRS or name in hidden_dirs:
             results.append(f"{rel}/ (hidden)")
+        elif depth is not None and depth <= 1:
+            results.append(f"{rel}/ ...")
         else:
-            results.extend(_list_tree(entry, base, hidden_dirs))
+            results.extend(_list_tree(entry, base, hidden_dirs, None if depth is None else depth - 1))
 
-    visible_files = [f for f in files if f.name not in IGNORED_FILES]
-    hidden_files = [f for f in files if f.name in IGNORED_FILES]
+    visible_files = [f for f in file_names if f not in IGNORED_FILES]
+    hidden_files = [f for f in file_names if f in IGNORED_FILES]
 
-    for entry in hidden_files:
+    for name in hidden_files:
         try:
-            rel = entry.relative_to(base)
+            rel = (root / name).relative_to(base)
         except ValueError:
-            rel = Path(entry.name)
+            rel = Path(name)
         results.append(f"{rel} (hidden)")
 
     truncated = len(visible_files) > DIR_FILE_LIMIT
-    for entry in visible_files[:DIR_FILE_LIMIT]:
+    for name in visible_files[:DIR_FILE_LIMIT]:
         try:
-            rel = entry.relative_to(base)
+            rel = (root / name).relative_to(base)
         except ValueError:
-            rel = Path(entry.name)
+            rel = Path(name)
         results.append(str(rel))
 
     if truncated:
@@ -126,7 +110,8 @@ def run(args: dict) -> str:
     if mode == "list":
         if not directory.exists():
             return f"error: directory does not exist: {directory}"
-        lines = _list_tree(directory, directory, hidden_dirs)
+        depth = args.get("depth")
+        lines = _list_tree(directory, directory, hidden_dirs, depth)
         return "\n".join(lines) if lines else "(empty)"
 
     if mode == "grep":
@@ -134,29 +119,19 @@ def run(args: dict) -> str:
         if not pattern:
             return "error: pattern required for grep"
         try:
-            compiled = re.compile(pattern)
+            re.compile(pattern)
         except re.error as e:
             return f"error: invalid regex: {e}"
         file_glob = args.get("glob", "*")
-        paths = _iter_tree(directory, hidden_dirs)
         results = []
-        for p in paths:
-            if not fnmatch.fnmatch(p.name, file_glob):
-                continue
+        for p, i, line in grep(directory, pattern, file_glob, IGNORED_DIRS | hidden_dirs, IGNORED_FILES, limit=200):
             try:
-                text = p.read_text(encoding="utf-8", errors="replace")
-            except Exception:
-                continue
-            for i, line in enumerate(text.splitlines(), 1):
-                if compiled.search(line):
-                    try:
-                        rel = p.relative_to(directory)
-                    except ValueError:
-                        rel = p
-                    results.append(f"{rel}:{i}: {line.rstrip()}")
-                    if len(results) >= 200:
-                        results.append("... [truncated at 200 matches]")
-                        return "\n".join(results)
+                rel = p.relative_to(directory)
+            except ValueError:
+                rel = p
+            results.append(f"{rel}:{i}: {line}")
+        if len(results) >= 200:
+            results.append("... [truncated at 200 matches]")
         return "\n".join(results) if results else f"no matches for '{pattern}'"
 
     if mode == "read":
@@ -206,6 +181,7 @@ def run(args: dict) -> str:
             return "error: content required for write"
         filepath.parent.mkdir(parents=True, exist_ok=True)
         filepath.write_text(content, encoding="utf-8")
+        tree_cache.invalidate(filepath.parent)
         return f"ok: wrote {filepath}"
 
     if mode == "delete":
@@ -214,6 +190,7 @@ def run(args: dict) -> str:
         if filepath.is_dir():
             return f"error: {filepath} is a directory, not a file"
         filepath.unlink()
+        tree_cache.invalidate(filepath.parent)
         return f"ok: deleted {filepath}"
 
     if mode == "edit":
@@ -260,7 +237,7 @@ SCHEMA = {
                 "type": "string",
                 "enum": ["list", "read", "write", "edit", "delete", "grep"],
                 "description": (
-                    "list — recursive file tree (defaults to project root, hides data/ by default). "
+                    "list — recursive file tree (defaults to project root, hides data/ by default; depth=N to limit). "
                     "read — read one or multiple files, optionally a line range. "
                     "write — write full file content. "
                     "edit — exact search/replace (errors on 0 or 2+ matches). "
@@ -309,6 +286,10 @@ SCHEMA = {
                 "type": "integer",
                 "description": "Last line to return (inclusive). For read mode.",
             },
+            "depth": {
+                "type": "integer",
+                "description": "For list: how many directory levels to expand (1 = only the directory itself). Deeper directories show as 'dir/ ...'. Default unlimited.",
+            },
             "include_data": {
                 "type": "boolean",
                 "description": "Include the data/ directory in list/grep. Default false.",
@@ -0,0 +1,237 @@
+"""Grep engine for the file tool.
+
+Streams the tree with os.scandir, skips binary files by sniffing their first
+block, reads large files in line-aligned chunks, and scans files on a thread
+pool while keeping results in tree order.
+
+An in-process trigram index narrows the candidate files: for every scanned
+file it keeps a hashed trigram bitmap keyed by (mtime, size), refreshed
+incrementally as files change. Patterns with literal runs of 3+ chars only
+read the files whose bitmap contains all of their trigrams.
+"""
+
+import fnmatch
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import re._parser as _sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_parse as _sre_parse
+
+SNIFF_BYTES = 8192
+CHUNK_BYTES = 1 << 20        # files larger than this are read in chunks
+INDEX_MAX_BYTES = 4 << 20    # larger files are never indexed, always scanned
+BITMAP_BITS = 1 << 16
+WORKERS = min(8, (os.cpu_count() or 2) * 2)
+USE_INDEX = True
+
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="grep")
+
+
+# --- tree walk ---
+
+
+def walk(root: Path, ignored_dirs: set, ignored_files: set):
+    """Yield files under root in listing order (subdirectories first, then files, by name)."""
+    try:
+        with os.scandir(root) as it:
+            entries = sorted(it, key=lambda e: (not e.is_dir(), e.name))
+    except (PermissionError, FileNotFoundError, NotADirectoryError):
+        return
+    for entry in entries:
+        if entry.is_dir():
+            if entry.name not in ignored_dirs:
+                yield from walk(Path(entry.path), ignored_dirs, ignored_files)
+        elif entry.name not in ignored_files:
+            yield entry
+
+
+# --- trigram index ---
+
+
+def _trigram_bits(text: str) -> set:
+    text = text.lower()
+    return {hash(text[i:i + 3]) & (BITMAP_BITS - 1) for i in range(len(text) - 2)}
+
+
+def _required_literals(pattern: str) -> list[str]:
+    """Literal runs every match must contain (top-level concatenation only)."""
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except Exception:
+        return []
+    runs, current = [], []
+    for op, av in parsed:
+        if op is _sre_parse.LITERAL:
+            current.append(chr(av))
+            continue
+        if op is _sre_parse.BRANCH:
+            return []  # alternation: no single literal is required
+        if current:
+            runs.append("".join(current))
+        current = []
+    if current:
+        runs.append("".join(current))
+    return [r for r in runs if len(r) >= 3]
+
+
+class _Entry:
+    __slots__ = ("stamp", "binary", "bits")
+
+    def __init__(self, stamp, binary, bits):
+        self.stamp = stamp
+        self.binary = binary
+        self.bits = bits
+
+
+class TrigramIndex:
+    def __init__(self):
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, path: str, stamp: tuple) -> _Entry | None:
+        entry = self._entries.get(path)
+        return entry if entry is not None and entry.stamp == stamp else None
+
+    def store(self, path: str, stamp: tuple, binary: bool, bits: set | None):
+        bitmap = None
+        if bits is not None:
+            bitmap = bytearray(BITMAP_BITS // 8)
+            for h in bits:
+                bitmap[h >> 3] |= 1 << (h & 7)
+        with self._lock:
+            self._entries[path] = _Entry(stamp, binary, bitmap)
+
+    def prune(self, root: Path, seen: set):
+        """Forget files under root that a complete walk did not see (deleted or now ignored)."""
+        prefix = str(root).rstrip(os.sep) + os.sep
+        with self._lock:
+            for path in [p for p in self._entries if p.startswith(prefix) and p not in seen]:
+                del self._entries[path]
+
+    @staticmethod
+    def may_contain(entry: _Entry, query_bits: set) -> bool:
+        if entry.bits is None:
+            return True
+        return all(entry.bits[h >> 3] & (1 << (h & 7)) for h in query_bits)
+
+
+index = TrigramIndex()
+
+
+# --- scanning ---
+
+
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
+def _match_lines(text: str, compiled, first_line: int, limit: int, out: list) -> int:
+    """Collect matching lines of text into out (up to limit); returns the number of lines in text."""
+    lines = text.splitlines()
+    for i, line in enumerate(lines, first_line):
+        if compiled.search(line):
+            out.append((i, line.rstrip()))
+            if len(out) >= limit:
+                break
+    return len(lines)
+
+
+def _scan(path: str, size: int, stamp: tuple, compiled, query_bits: set, limit: int) -> list:
+    """Matching (line number, line) pairs in one file, at most limit of them."""
+    cached = index.lookup(path, stamp) if USE_INDEX else None
+    if cached is not None and (cached.binary or (query_bits and not TrigramIndex.may_contain(cached, query_bits))):
+        return []
+    matches: list = []
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES)
+            if b"\0" in head:
+                if USE_INDEX:
+                    index.store(path, stamp, True, None)
+                return []
+            if size <= CHUNK_BYTES:
+                text = _decode(head + f.read())
+                if USE_INDEX and cached is None:
+                    index.store(path, stamp, False, _trigram_bits(text))
+                _match_lines(text, compiled, 1, limit, matches)
+                return matches
+            # large file: line-aligned chunks, bounded memory
+            if USE_INDEX and cached is None and size > INDEX_MAX_BYTES:
+                index.store(path, stamp, False, None)
+            bits = set() if USE_INDEX and cached is None and size <= INDEX_MAX_BYTES else None
+            line_no, carry, data = 1, b"", head
+            while True:
+                block = carry + data
+                more = f.read(CHUNK_BYTES)
+                cut = block.rfind(b"\n") + 1 if more else len(block)
+                if cut == 0 and more:
+                    carry, data = block, more
+                    continue
+                text = _decode(block[:cut])
+                if bits is not None:
+                    bits |= _trigram_bits(text)
+                if len(matches) < limit:
+                    line_no += _match_lines(text, compiled, line_no, limit, matches)
+                    if len(matches) >= limit and bits is None:
+                        break
+                carry, data = block[cut:], more
+                if not more:
+                    break
+            if bits is not None:
+                index.store(path, stamp, False, bits)
+    except OSError:
+        return []
+    return matches
+
+
+def grep(root: Path, pattern: str, file_glob: str, ignored_dirs: set, ignored_files: set, limit: int = 200):
+    """Yield (path, line number, line) for matches under root in tree order, at most limit."""
+    compiled = re.compile(pattern)
+    query_bits = set()
+    for literal in _required_literals(pattern):
+        query_bits |= _trigram_bits(literal)
+
+    seen = set()
+    pending: deque = deque()
+    found = 0
+    window = WORKERS * 4
+
+    def drain_one():
+        nonlocal found
+        path, future = pending.popleft()
+        for line_no, line in future.result():
+            if found >= limit:
+                return
+            found += 1
+            yield path, line_no, line
+
+    for entry in walk(root, ignored_dirs, ignored_files):
+        seen.add(entry.path)
+        if not fnmatch.fnmatch(entry.name, file_glob):
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        stamp = (st.st_mtime_ns, st.st_size)
+        pending.append((Path(entry.path), _pool.submit(
+            _scan, entry.path, st.st_size, stamp, compiled, query_bits, limit
+        )))
+        while len(pending) >= window:
+            yield from drain_one()
+            if found >= limit:
+                break
+        if found >= limit:
+            break
+    while pending and found < limit:
+        yield from drain_one()
+    for _, future in pending:
+        future.cancel()
+    if USE_INDEX and found < limit:
+        index.prune(root, seen)
@@ -2,7 +2,7 @@
 
 import subprocess
 from storage import memory as _mem
-from storage.conversations import list_conversations, get_latest_version
+from storage.conversations import newest_conversations, get_latest_version
 
 
 def _summarize_conversation(meta: dict) -> str:
@@ -80,11 +80,8 @@ def run(args: dict) -> str:
     # --- context modes ---
 
     if mode == "recent_conversations":
-        convs = list_conversations()
-        # Sort by created_at descending, skip test conversations
-        convs = [c for c in convs if c.get("source") != "test"]
-        convs.sort(key=lambda c: c.get("created_at", ""), reverse=True)
-        recent = convs[:5]
+        # Most recently created first, skip test conversations
+        recent = newest_conversations(limit=5, exclude_source="test")
         if not recent:
             return "no conversations found"
         return "\n".join(_summarize_conversation(c) for c in recent)
@@ -1,38 +1,224 @@
-"""Summarize tool — condense long text with an optional focus direction."""
+"""Summarize tool — condense long text with an optional focus direction.
 
+Text that fits in one chunk is summarized in a single Haiku call. Longer text
+is map-reduced: split on its structure (file sections, fenced code blocks,
+paragraphs), chunks summarized concurrently under a concurrency cap, then the
+partial summaries merged (in rounds, if they are still too long). The
+direction is carried into every call.
+
+Calls made during a run go through the run's scheduler and retry governor
+(llm/governor.py call_from_thread), so parallel summarize tools share the Haiku
+cap with everything else. Outside a run they share a process-wide semaphore of
+the same size and retry with the governor's backoff.
+"""
+
+import contextvars
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import anthropic
 
+MODEL = "claude-haiku-4-5-20251001"
+CHUNK_CHARS = 60000        # ~15k tokens per map call
+MAX_CHUNK_CHARS = 400000   # chunks grow up to this before input is cut
+MAX_CHUNKS = 40
+CONCURRENCY = 4
 
-def run(args: dict) -> str:
-    text = args.get("text", "").strip()
-    direction = args.get("direction", "").strip()
+_SECTION = re.compile(r"^(===|---|\+\+\+|diff --git|#{1,3} )")
+_FENCE = re.compile(r"^\s*(```|~~~)")
 
-    if not text:
-        return "error: text is required"
+_client = None
+_client_lock = threading.Lock()
+_slots = None
+
+
+def _get_client():
+    global _client, _slots
+    with _client_lock:
+        if _client is None:
+            from llm.scheduler import MODEL_CONCURRENCY, DEFAULT_CONCURRENCY
+            # retries go through the governor's policy, not the SDK's
+            _client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"], max_retries=0)
+            _slots = threading.BoundedSemaphore(MODEL_CONCURRENCY.get(MODEL, DEFAULT_CONCURRENCY))
+        return _client
 
+
+def _focus(direction: str) -> str:
     if direction:
-        system = (
-            f"Summarize the following text with this specific focus: {direction}\n"
+        return (
+            f"with this specific focus: {direction}\n"
             "Preserve detail relevant to that focus. Be concise and omit unrelated content."
         )
+    return "concisely. Preserve key facts, decisions, and outcomes."
+
+
+def _complete(system: str, text: str, max_tokens: int = 1024) -> str:
+    # Import here to avoid circular import issues at module level (llm imports tools)
+    from llm import client
+    from llm.governor import call_from_thread, tool_context
+    from llm.messages import estimate_tokens
+
+    messages = [{"role": "user", "content": text}]
+    request = dict(model=MODEL, max_tokens=max_tokens, system=system, messages=messages)
+    if tool_context.get() is not None:
+        cost = estimate_tokens(messages + [{"role": "user", "content": system}])
+        response = call_from_thread(lambda: client.messages.create(**request), MODEL, cost)
     else:
-        system = "Summarize the following text concisely. Preserve key facts, decisions, and outcomes."
-
-    client = anthropic.Anthropic(api_key=os.environ["ANTHROPIC_API_KEY"])
-    response = client.messages.create(
-        model="claude-haiku-4-5-20251001",
-        max_tokens=1024,
-        system=system,
-        messages=[{"role": "user", "content": text}],
-    )
+        response = _complete_direct(request)
     return response.content[0].text
 
 
+def _complete_direct(request: dict):
+    """Outside a run: the process-wide slot cap and the governor's retry policy, without its breaker."""
+    from llm.governor import governor, backoff, MAX_RETRIES
+
+    client = _get_client()
+    attempt = 0
+    while True:
+        try:
+            with _slots:
+                return client.messages.create(**request)
+        except (anthropic.APIStatusError, anthropic.APIConnectionError) as e:
+            if not governor.is_retryable(e) or attempt >= MAX_RETRIES:
+                raise
+            time.sleep(backoff(e, attempt))
+            attempt += 1
+
+
+# --- chunking ---
+
+
+def _blocks(text: str) -> list[str]:
+    """Structural units: fenced code blocks stay whole, sections and paragraphs split apart."""
+    blocks, current, fence = [], [], None
+    for line in text.splitlines(keepends=True):
+        m = _FENCE.match(line)
+        if fence is not None:
+            current.append(line)
+            if m and m.group(1) == fence:
+                blocks.append("".join(current))
+                current, fence = [], None
+            continue
+        if m:
+            if current:
+                blocks.append("".join(current))
+            current, fence = [line], m.group(1)
+        elif not line.strip():
+            if current:
+                current.append(line)
+                blocks.append("".join(current))
+                current = []
+        elif _SECTION.match(line) and current:
+            blocks.append("".join(current))
+            current = [line]
+        else:
+            current.append(line)
+    if current:
+        blocks.append("".join(current))
+    return blocks
+
+
+def _split_long(block: str, size: int) -> list[str]:
+    """Split a block bigger than size at line boundaries (or hard, for giant lines)."""
+    pieces, current = [], ""
+    for line in block.splitlines(keepends=True):
+        while len(line) > size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:size])
+            line = line[size:]
+        if len(current) + len(line) > size:
+            pieces.append(current)
+            current = ""
+        current += line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk(text: str, size: int = CHUNK_CHARS) -> list[str]:
+    """Pack structural blocks into chunks of at most size chars, preferring to start at sections."""
+    chunks, current = [], ""
+    for block in _blocks(text):
+        for piece in _split_long(block, size) if len(block) > size else [block]:
+            at_section = bool(_SECTION.match(piece)) and len(current) > size // 2
+            if current and (len(current) + len(piece) > size or at_section):
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+
+# --- map / reduce ---
+
+
+def _map(chunks: list[str], direction: str, pool: ThreadPoolExecutor) -> list[str]:
+    n = len(chunks)
+
+    def summarize_part(i: int) -> tuple[str, bool]:
+        system = (
+            f"You are summarizing part {i + 1} of {n} of a longer text; other parts are summarized "
+            f"separately and merged later. Summarize this part {_focus(direction)}"
+        )
+        try:
+            return _complete(system, chunks[i]), True
+        except Exception as e:
+            return f"[part {i + 1} could not be summarized: {e}]", False
+
+    # pool threads don't inherit context variables; carry the run's (see _complete) into each call
+    context = contextvars.copy_context()
+    results = list(pool.map(lambda i: context.copy().run(summarize_part, i), range(n)))
+    if not any(ok for _, ok in results):
+        raise RuntimeError(results[0][0])
+    return [summary for summary, _ in results]
+
+
+def _reduce(summaries: list[str], direction: str, pool: ThreadPoolExecutor) -> str:
+    while True:
+        joined = "\n\n".join(f"## Part {i + 1}\n{s}" for i, s in enumerate(summaries))
+        if len(joined) <= CHUNK_CHARS or len(summaries) == 1:
+            system = (
+                "These are summaries of consecutive parts of one long text, in order. "
+                f"Merge them into a single coherent summary {_focus(direction)}"
+            )
+            return _complete(system, joined, max_tokens=2048)
+        # still too long for one merge: merge neighbouring groups, then try again
+        groups = chunk(joined)
+        summaries = _map(groups, direction, pool)
+
+
+def run(args: dict) -> str:
+    text = args.get("text", "").strip()
+    direction = args.get("direction", "").strip()
+
+    if not text:
+        return "error: text is required"
+
+    if len(text) <= CHUNK_CHARS:
+        return _complete(f"Summarize the following text {_focus(direction)}", text)
+
+    size = min(MAX_CHUNK_CHARS, max(CHUNK_CHARS, -(-len(text) // MAX_CHUNKS)))
+    chunks = chunk(text, size)
+    note = ""
+    if len(chunks) > MAX_CHUNKS:
+        dropped = sum(len(c) for c in chunks[MAX_CHUNKS:])
+        chunks = chunks[:MAX_CHUNKS]
+        note = f"\n\n[note: the last {dropped} chars of input were not summarized]"
+
+    with ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="summarize") as pool:
+        summaries = _map(chunks, direction, pool)
+        return _reduce(summaries, direction, pool) + note
+
+
 SCHEMA = {
     "name": "summarize",
-    "description": "Summarize a long text, optionally focused on a specific aspect.",
+    "description": "Summarize a long text, optionally focused on a specific aspect. Large inputs are chunked and summarized in parallel.",
     "input_schema": {
         "type": "object",
         "properties": {
@@ -1,7 +1,7 @@
 import json
 import subprocess
 from pathlib import Path
-from storage.tasks import create_task, get_due_tasks, update_task_status, patch_task, list_tasks, ARCHIVE_PATH
+from storage.tasks import create_task, get_due_tasks, update_task_status, patch_task, list_tasks, list_archive
 
 ROOT = Path(__file__).parent.parent
 
@@ -71,13 +71,10 @@ def run(args: dict) -> str:
         return f"ok: task {task_id} updated"
 
     if mode == "archive":
-        if not ARCHIVE_PATH.exists():
-            return "archive is empty"
-        archive = json.loads(ARCHIVE_PATH.read_text())
-        if not archive:
-            return "archive is empty"
         limit = args.get("limit", 20)
-        recent = archive[-limit:][::-1]
+        recent = list_archive(limit)
+        if not recent:
+            return "archive is empty"
         lines = []
         for t in recent:
             ts = t.get("archived_at", "")[:16].replace("T", " ")
@@ -0,0 +1,227 @@
+"""Directory snapshot cache for the file tool's list mode and onboarding tree.
+
+Each directory's listing (subdirectory and file names) is cached with the
+directory's mtime, which changes whenever an entry is added, removed or
+renamed, so a repeated listing costs one stat per directory instead of a
+scandir plus an is_dir/is_file per entry.
+
+On Linux, directories are also watched with inotify (through libc, no extra
+dependency). A watched directory with no pending events is served without
+any syscall; events drop just the directories they name. A watch lives only
+as long as its directory's snapshot: it is removed when the snapshot is
+dropped or evicted, and forgotten when the kernel drops it (IN_IGNORED after
+the directory is deleted). Anywhere inotify is unavailable, or a watch
+cannot be added (e.g. the watch limit is reached), the mtime check is used
+instead; a directory whose mtime is within MTIME_SLACK_NS of now is not cached
+then, since a change in the same mtime tick would not move the stamp.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import threading
+import time
+
+USE_INOTIFY = True
+MAX_DIRS = 20000
+MTIME_SLACK_NS = 2_000_000_000  # coarsest directory mtime granularity we expect (FAT: 2s)
+
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_MODIFY_DIR = (
+    0x00000040    # IN_MOVED_FROM
+    | 0x00000080  # IN_MOVED_TO
+    | 0x00000100  # IN_CREATE
+    | 0x00000200  # IN_DELETE
+    | 0x00000400  # IN_DELETE_SELF
+    | 0x00000800  # IN_MOVE_SELF
+)
+_IN_MOVE_SELF = 0x00000800
+_IN_SELF = 0x00000400 | _IN_MOVE_SELF
+_IN_ONLYDIR = 0x01000000
+_IN_IGNORED = 0x00008000
+_IN_Q_OVERFLOW = 0x00004000
+_EVENT = struct.Struct("iIII")
+
+
+class _Inotify:
+    """Minimal non-blocking inotify wrapper: watch directories, drain changed ones."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: dict[int, str] = {}
+        self.wds: dict[str, int] = {}
+
+    def watch(self, path: str) -> bool:
+        wd = self._add_watch(self.fd, os.fsencode(path), _IN_MODIFY_DIR | _IN_ONLYDIR)
+        if wd < 0:
+            return False
+        old = self.wds.get(path)
+        if old is not None and old != wd:
+            self.paths.pop(old, None)  # path now names a new directory; the old watch dies with it
+        self.paths[wd] = path
+        self.wds[path] = wd
+        return True
+
+    def unwatch(self, path: str):
+        wd = self.wds.pop(path, None)
+        if wd is not None:
+            self.paths.pop(wd, None)
+            self._rm_watch(self.fd, wd)  # its IN_IGNORED is skipped by drain (wd no longer mapped)
+
+    def _forget(self, wd: int):
+        path = self.paths.pop(wd, None)
+        if path is not None and self.wds.get(path) == wd:
+            del self.wds[path]
+
+    def drain(self) -> tuple[set, set, bool]:
+        """Paths with pending events, paths deleted or moved away, and whether the queue overflowed."""
+        changed, gone, overflow = set(), set(), False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed, gone, overflow
+            offset = 0
+            while offset < len(buf):
+                wd, mask, _, length = _EVENT.unpack_from(buf, offset)
+                offset += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                path = self.paths.get(wd)
+                if path is None:
+                    continue
+                changed.add(path)
+                if mask & _IN_SELF:
+                    gone.add(path)
+                if mask & (_IN_IGNORED | _IN_SELF):
+                    self._forget(wd)
+                    if mask & _IN_MOVE_SELF:
+                        self._rm_watch(self.fd, wd)  # a moved directory keeps its watch otherwise
+
+
+class _Dir:
+    __slots__ = ("stamp", "watched", "dirs", "files")
+
+    def __init__(self, stamp, watched, dirs, files):
+        self.stamp = stamp
+        self.watched = watched
+        self.dirs = dirs
+        self.files = files
+
+
+class TreeCache:
+    def __init__(self):
+        self._dirs: dict[str, _Dir] = {}
+        self._lock = threading.Lock()
+        self._drains = 0  # bumped whenever events invalidate something or a watch is removed
+        self._inotify = None
+        if USE_INOTIFY:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None
+
+    def _drop(self, path: str):
+        self._dirs.pop(path, None)
+        if self._inotify is not None and path in self._inotify.wds:
+            self._inotify.unwatch(path)
+            self._drains += 1
+
+    def _clear(self):
+        self._dirs.clear()
+        if self._inotify is not None:
+            for path in list(self._inotify.wds):
+                self._inotify.unwatch(path)
+            self._drains += 1
+
+    def _refresh_events(self):
+        if self._inotify is None:
+            return
+        changed, gone, overflow = self._inotify.drain()
+        if changed or overflow:
+            self._drains += 1
+        if overflow:
+            self._clear()
+            return
+        for path in changed:
+            self._drop(path)
+        for path in gone:
+            # snapshots below a moved/deleted directory are keyed by paths that no longer exist
+            prefix = path.rstrip(os.sep) + os.sep
+            for p in [p for p in self._dirs if p.startswith(prefix)]:
+                self._drop(p)
+
+    def entries(self, path) -> tuple[list[str], list[str]]:
+        """(subdirectory names, file names) of path, both sorted. Raises PermissionError like scandir."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._refresh_events()
+            cached = self._dirs.get(path)
+            if cached is not None and cached.watched:
+                return cached.dirs, cached.files
+        try:
+            stamp = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return [], []
+        if cached is not None and cached.stamp == stamp:
+            return cached.dirs, cached.files
+
+        # watch before listing, so a change made during the scandir still invalidates it
+        watched = False
+        with self._lock:
+            drains = self._drains
+            if self._inotify is not None:
+                watched = self._inotify.watch(path)
+
+        dirs, files = [], []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                    elif entry.is_file():
+                        files.append(entry.name)
+        except BaseException:
+            if watched:
+                with self._lock:
+                    self._drop(path)
+            raise
+        dirs.sort()
+        files.sort()
+        # without a watch the stamp must also cover changes made during the listing; a change within
+        # the same mtime tick leaves it unchanged, so a directory modified just now is not cached
+        try:
+            settled = os.stat(path).st_mtime_ns == stamp and time.time_ns() - stamp >= MTIME_SLACK_NS
+        except FileNotFoundError:
+            settled = False
+
+        with self._lock:
+            # events were drained or watches removed meanwhile, possibly this directory's: trust mtime only
+            watched = watched and self._drains == drains
+            if not watched and not settled:
+                self._drop(path)  # and its watch, if one was added
+                return dirs, files
+            if len(self._dirs) >= MAX_DIRS:
+                self._clear()
+            self._dirs[path] = _Dir(stamp, watched, dirs, files)
+        return dirs, files
+
+    def invalidate(self, path=None):
+        """Drop one directory's snapshot, or all of them."""
+        with self._lock:
+            if path is None:
+                self._clear()
+            else:
+                self._drop(os.path.abspath(path))
+
+
+cache = TreeCache()
@@ -1,89 +1,251 @@
+import codecs
 import json
 import os
-import urllib.request
+import re
+import time
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from html.parser import HTMLParser
 
+from tools.web_cache import cache as web_cache, search_cache
+from utils.http_utils import pool
+
 
 class _TextExtractor(HTMLParser):
-    """Strip HTML tags and extract readable text."""
+    """Strip HTML tags and extract readable text. Fed incrementally; size counts visible chars so far.
+
+    Navigation, sidebars, footers, forms and inline SVG are dropped. If the page marks its
+    main content (<main>, <article> or role="main") and that holds a real amount of text,
+    only that is returned."""
 
-    SKIP_TAGS = {"script", "style", "noscript", "head"}
+    SKIP_TAGS = {"script", "style", "noscript", "head", "template", "svg", "iframe"}
+    BOILERPLATE_TAGS = {"nav", "aside", "footer", "form", "button", "select"}
+    MAIN_TAGS = {"main", "article"}
+    BREAK_TAGS = {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "tr"}
+    MIN_MAIN_CHARS = 500
 
     def __init__(self):
         super().__init__()
         self._skip = 0
+        self._boilerplate = 0
+        self._main = 0
+        self._main_stack = []  # (tag, nesting depth) of open elements that entered main content
+        self._depth = {}
         self._parts = []
+        self._main_parts = []
+        self.size = 0
 
     def handle_starttag(self, tag, attrs):
+        self._depth[tag] = self._depth.get(tag, 0) + 1
         if tag in self.SKIP_TAGS:
             self._skip += 1
+        elif tag in self.BOILERPLATE_TAGS or (tag == "header" and not self._main):
+            self._boilerplate += 1
+        elif tag in self.MAIN_TAGS or ("role", "main") in attrs:
+            self._main += 1
+            self._main_stack.append((tag, self._depth[tag]))
 
     def handle_endtag(self, tag):
-        if tag in self.SKIP_TAGS and self._skip > 0:
-            self._skip -= 1
-        if tag in {"p", "div", "br", "li", "h1", "h2", "h3", "h4", "tr"}:
+        if tag in self.SKIP_TAGS:
+            if self._skip > 0:
+                self._skip -= 1
+        elif tag in self.BOILERPLATE_TAGS or (tag == "header" and not self._main):
+            if self._boilerplate > 0:
+                self._boilerplate -= 1
+        elif self._main_stack and self._main_stack[-1] == (tag, self._depth.get(tag)):
+            self._main_stack.pop()
+            self._main -= 1
+        if self._depth.get(tag):
+            self._depth[tag] -= 1
+        if tag in self.BREAK_TAGS:
             self._parts.append("\n")
+            if self._main:
+                self._main_parts.append("\n")
 
     def handle_data(self, data):
-        if not self._skip:
-            self._parts.append(data)
+        if self._skip or self._boilerplate:
+            return
+        self._parts.append(data)
+        self.size += len(data)
+        if self._main:
+            self._main_parts.append(data)
 
-    def text(self) -> str:
-        raw = "".join(self._parts)
-        lines = (l.strip() for l in raw.splitlines())
+    @staticmethod
+    def _clean(parts: list) -> str:
+        lines = (l.strip() for l in "".join(parts).splitlines())
         return "\n".join(l for l in lines if l)
 
+    def text(self) -> str:
+        main = self._clean(self._main_parts)
+        if len(main) >= self.MIN_MAIN_CHARS:
+            return main
+        return self._clean(self._parts)
+
+
+FETCH_LIMIT = 20000         # chars returned by fetch
+FETCH_MANY_BUDGET = 40000   # chars shared by all pages of one fetch_many call
+FETCH_MANY_MAX_URLS = 20
+FETCH_WORKERS = 8
+READ_CHUNK = 64 * 1024
+EXTRACT_LIMIT = 2 * FETCH_MANY_BUDGET   # visible chars extracted before we stop reading
+MAX_FETCH_BYTES = 5 << 20               # raw bytes read per page, at most
+
+_META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+_fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="web-fetch")
+
+
+def _charset(headers, head: bytes) -> str:
+    """Charset from Content-Type, else a <meta charset> in the first bytes, else utf-8."""
+    charset = headers.get_content_charset()
+    if not charset:
+        m = _META_CHARSET.search(head)
+        charset = m.group(1).decode("ascii") if m else "utf-8"
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return "utf-8"
+
+
+def _read_text(resp) -> str:
+    """Decode and extract the body chunk by chunk, stopping at MAX_FETCH_BYTES raw bytes or
+    once EXTRACT_LIMIT chars of text are in hand, so huge pages are never fully downloaded."""
+    is_html = "html" in resp.headers.get("Content-Type", "")
+    parser = _TextExtractor() if is_html else None
+    parts, size, received, decoder = [], 0, 0, None
+    complete = False
+    while True:
+        chunk = resp.read(READ_CHUNK)
+        if not chunk:
+            complete = True
+            if decoder is not None and parser is not None:
+                parser.feed(decoder.decode(b"", final=True))
+            elif decoder is not None:
+                parts.append(decoder.decode(b"", final=True))
+            break
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder(_charset(resp.headers, chunk))(errors="replace")
+        received += len(chunk)
+        data = decoder.decode(chunk)
+        if parser is not None:
+            parser.feed(data)
+            size = parser.size
+        else:
+            parts.append(data)
+            size += len(data)
+        if size >= EXTRACT_LIMIT or received >= MAX_FETCH_BYTES:
+            break
+
+    if parser is not None:
+        parser.close()
+        text = parser.text()
+    else:
+        text = "".join(parts)
+    if not complete:
+        text += f"\n\n... [stopped reading after {received // 1024} KB]"
+    return text
+
+
+def _fetch_text(url: str, timeout: float = 15) -> str:
+    """Full extracted text of url, from the cache when possible. Raises on failure."""
+    cached = web_cache.get(url)
+    if cached is not None and cached.fresh:
+        return cached.text
+
+    headers = cached.validators() if cached is not None else {}
+    with pool.open("GET", url, headers, timeout=timeout) as resp:
+        if resp.status == 304 and cached is not None:
+            web_cache.revalidated(url, resp.headers)
+            return cached.text
+        if resp.status >= 400:
+            raise RuntimeError(f"HTTP {resp.status}")
+        text = _read_text(resp)
+
+    if resp.status == 200:
+        web_cache.put(url, resp.headers, text)
+    return text
+
 
 def _fetch(url: str) -> str:
-    req = urllib.request.Request(url, headers={"User-Agent": "Zipper/1.0"})
     try:
-        with urllib.request.urlopen(req, timeout=15) as resp:
-            content_type = resp.headers.get("Content-Type", "")
-            raw = resp.read().decode("utf-8", errors="replace")
+        return _truncate(_fetch_text(url), FETCH_LIMIT)
     except Exception as e:
         return f"error: {e}"
 
-    if "html" in content_type:
-        parser = _TextExtractor()
-        parser.feed(raw)
-        text = parser.text()
-    else:
-        text = raw
 
-    limit = 20000
+def _truncate(text: str, limit: int) -> str:
     if len(text) > limit:
         return text[:limit] + f"\n\n... [truncated — {len(text)} chars total]"
     return text
 
 
+def _fetch_many(urls: list[str], timeout: float = 15) -> str:
+    """Fetch urls concurrently; pages share FETCH_MANY_BUDGET chars, short pages leave more for long ones."""
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))
+    if not urls:
+        return "error: urls is required"
+    if len(urls) > FETCH_MANY_MAX_URLS:
+        return f"error: at most {FETCH_MANY_MAX_URLS} urls per call"
+
+    futures = {url: _fetch_pool.submit(_fetch_text, url, timeout) for url in urls}
+    deadline = time.monotonic() + timeout * 2  # connect + read, plus extraction
+    texts, errors = {}, {}
+    for url, future in futures.items():
+        try:
+            texts[url] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeout:
+            errors[url] = "timed out"
+        except Exception as e:
+            errors[url] = str(e)
+
+    # fair share: smallest pages first, each takes at most an equal split of what is left
+    limits, remaining = {}, FETCH_MANY_BUDGET
+    by_size = sorted(texts, key=lambda u: len(texts[u]))
+    for i, url in enumerate(by_size):
+        limits[url] = min(len(texts[url]), remaining // (len(by_size) - i))
+        remaining -= limits[url]
+
+    parts = []
+    for url in urls:
+        if url in errors:
+            parts.append(f"=== {url} ===\nerror: {errors[url]}")
+        else:
+            parts.append(f"=== {url} ===\n{_truncate(texts[url], limits[url])}")
+    return "\n\n".join(parts)
+
+
+def _brave_search(query: str, limit: int, api_key: str) -> str:
+    """One Brave API call, formatted. Raises on HTTP or network errors."""
+    url = "https://api.search.brave.com/res/v1/web/search?" + urllib.parse.urlencode({
+        "q": query,
+        "count": limit,
+    })
+    status, _, raw = pool.request("GET", url, {
+        "Accept": "application/json",
+        "X-Subscription-Token": api_key,
+    }, timeout=10)
+    if status >= 400:
+        raise RuntimeError(f"HTTP {status}: {raw.decode('utf-8', errors='replace').strip()[:500]}")
+    body = json.loads(raw.decode())
+
+    results = body.get("web", {}).get("results", [])
+    if not results:
+        return f"no results found for '{query}'"
+
+    formatted = []
+    for r in results[:limit]:
+        formatted.append(f"{r['title']}\n{r['url']}\n{r.get('description', '').strip()}")
+
+    return "\n\n".join(formatted)
+
+
 def _search(query: str, limit: int) -> str:
     api_key = os.environ.get("BRAVE_API_KEY")
     if not api_key:
         return "error: BRAVE_API_KEY is not set"
 
     try:
-        url = "https://api.search.brave.com/res/v1/web/search?" + urllib.parse.urlencode({
-            "q": query,
-            "count": limit,
-        })
-        req = urllib.request.Request(url, headers={
-            "Accept": "application/json",
-            "X-Subscription-Token": api_key,
-        })
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            body = json.loads(resp.read().decode())
-
-        results = body.get("web", {}).get("results", [])
-        if not results:
-            return f"no results found for '{query}'"
-
-        formatted = []
-        for r in results[:limit]:
-            formatted.append(f"{r['title']}\n{r['url']}\n{r.get('description', '').strip()}")
-
-        return "\n\n".join(formatted)
-
+        return search_cache.get_or_fetch(query, limit, lambda: _brave_search(query, limit, api_key))
     except Exception as e:
         return f"error: {e}"
 
@@ -103,19 +265,28 @@ def run(args: dict) -> str:
             return "error: url is required"
         return _fetch(url)
 
+    if mode == "fetch_many":
+        urls = args.get("urls") or []
+        if isinstance(urls, str):
+            urls = [urls]
+        return _fetch_many(urls)
+
     return f"error: unknown mode: {mode}"
 
 
 SCHEMA = {
     "name": "web",
-    "description": "Search the web or fetch a URL. search mode queries Brave Search; fetch mode HTTP GETs a URL and returns the page text.",
+    "description": "Search the web or fetch URLs. search mode queries Brave Search; fetch mode HTTP GETs a URL and returns the page text; fetch_many fetches several URLs concurrently.",
     "input_schema": {
         "type": "object",
         "properties": {
             "mode": {
                 "type": "string",
-                "enum": ["search", "fetch"],
-                "description": "search — Brave web search. fetch — HTTP GET a URL, returns page text with HTML stripped.",
+                "enum": ["search", "fetch", "fetch_many"],
+                "description": (
+                    "search — Brave web search. fetch — HTTP GET a URL, returns page text with HTML stripped. "
+                    "fetch_many — fetch up to 20 URLs concurrently in one call; pages share a 40k char budget."
+                ),
             },
             "query": {
                 "type": "string",
@@ -125,6 +296,11 @@ SCHEMA = {
                 "type": "string",
                 "description": "URL to fetch. Required for fetch mode.",
             },
+            "urls": {
+                "type": "array",
+                "items": {"type": "string"},
+                "description": "URLs to fetch. Required for fetch_many mode.",
+            },
             "limit": {
                 "type": "integer",
                 "description": "Number of search results to return. Default 5. Search mode only.",
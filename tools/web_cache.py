@@ -0,0 +1,277 @@
+"""On-disk caches for the web tool: HTTP responses (fetch) and Brave results (search).
+
+Fetch responses are keyed by URL. Each entry keeps the page's extracted text (so a hit skips both
+the network and HTML parsing) plus its validators (ETag, Last-Modified) and a
+freshness deadline derived from Cache-Control / Expires. Fresh entries are
+served directly; stale ones are revalidated with If-None-Match /
+If-Modified-Since, and a 304 just extends their lifetime. Total size is capped
+and the least recently used entries are evicted first. A hit only bumps the
+entry's last-use time in memory; it reaches disk with the next index write.
+
+Layout: data/web_cache/index.json (url -> metadata) and one <sha1>.txt body
+file per URL.
+
+Search results are cached separately in data/web_cache/search.json for
+SEARCH_TTL, keyed on the normalized query and result limit. Identical
+queries issued while one is in flight wait for it instead of spending
+another API call.
+"""
+
+import email.utils
+import hashlib
+import json
+import re
+import threading
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+CACHE_DIR = ROOT / "data" / "web_cache"
+INDEX_PATH = CACHE_DIR / "index.json"
+SEARCH_PATH = CACHE_DIR / "search.json"
+
+MAX_BYTES = 50 << 20     # total size of cached bodies
+MAX_ENTRY_BYTES = 2 << 20
+DEFAULT_TTL = 300        # freshness when a response gives no explicit lifetime
+MAX_HEURISTIC_TTL = 86400
+SEARCH_TTL = 6 * 3600
+MAX_SEARCH_ENTRIES = 500
+
+_MAX_AGE = re.compile(r"max-age\s*=\s*\"?(\d+)")
+
+
+def _body_path(url: str) -> Path:
+    return CACHE_DIR / (hashlib.sha1(url.encode()).hexdigest() + ".txt")
+
+
+def _parse_date(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness(headers, now: float) -> float | None:
+    """Absolute expiry time for a response, or None if it must not be stored."""
+    cache_control = (headers.get("Cache-Control") or "").lower()
+    if "no-store" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return now  # storable, but revalidate before every use
+    m = _MAX_AGE.search(cache_control)
+    if m:
+        return now + int(m.group(1)) - int(headers.get("Age") or 0)
+    expires = _parse_date(headers.get("Expires"))
+    if expires is not None:
+        date = _parse_date(headers.get("Date")) or now
+        return now + (expires - date)
+    last_modified = _parse_date(headers.get("Last-Modified"))
+    if last_modified is not None:
+        # RFC 9111 heuristic: 10% of the time since the last modification
+        return now + min(max(0.0, (now - last_modified) * 0.1), MAX_HEURISTIC_TTL)
+    return now + DEFAULT_TTL
+
+
+class CachedPage:
+    __slots__ = ("url", "text", "etag", "last_modified", "expires")
+
+    def __init__(self, url, text, etag, last_modified, expires):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def validators(self) -> dict:
+        """Conditional request headers for revalidating this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class WebCache:
+    def __init__(self):
+        self._index: dict | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        if self._index is None:
+            try:
+                self._index = json.loads(INDEX_PATH.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._index = {}
+        return self._index
+
+    def _save(self):
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = INDEX_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self._index))
+        tmp.replace(INDEX_PATH)
+
+    def _drop(self, url: str):
+        self._index.pop(url, None)
+        _body_path(url).unlink(missing_ok=True)
+
+    def get(self, url: str) -> CachedPage | None:
+        with self._lock:
+            meta = self._load().get(url)
+            if meta is None:
+                return None
+            try:
+                text = _body_path(url).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                self._drop(url)
+                self._save()
+                return None
+            meta["used"] = time.time()  # persisted by the next put/revalidated
+            return CachedPage(url, text, meta.get("etag"), meta.get("last_modified"), meta["expires"])
+
+    def put(self, url: str, headers, text: str):
+        """Store a 200 response's extracted text, unless its headers forbid it."""
+        now = time.time()
+        expires = freshness(headers, now)
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            index = self._load()
+            if expires is None or size > MAX_ENTRY_BYTES:
+                if url in index:
+                    self._drop(url)
+                    self._save()
+                return
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            _body_path(url).write_text(text, encoding="utf-8")
+            index[url] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "expires": expires,
+                "size": size,
+                "used": now,
+            }
+            self._evict()
+            self._save()
+
+    def revalidated(self, url: str, headers):
+        """A 304 confirmed the cached entry: take the new lifetime (and validators, if sent)."""
+        with self._lock:
+            meta = self._load().get(url)
+            if meta is None:
+                return
+            now = time.time()
+            expires = freshness(headers, now)
+            meta["expires"] = now if expires is None else expires
+            meta["etag"] = headers.get("ETag") or meta.get("etag")
+            meta["last_modified"] = headers.get("Last-Modified") or meta.get("last_modified")
+            meta["used"] = now
+            self._save()
+
+    def _evict(self):
+        total = sum(m["size"] for m in self._index.values())
+        for url in sorted(self._index, key=lambda u: self._index[u]["used"]):
+            if total <= MAX_BYTES:
+                break
+            total -= self._index[url]["size"]
+            self._drop(url)
+
+
+cache = WebCache()
+
+
+# --- search results ---
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    def __init__(self):
+        self._entries: dict | None = None
+        self._inflight: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    @staticmethod
+    def key(query: str, limit: int) -> str:
+        return f"{limit}|{' '.join(query.lower().split())}"
+
+    def _load(self) -> dict:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(SEARCH_PATH.read_text())
+            except (FileNotFoundError, json.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def _store(self, key: str, result: str):
+        now = time.time()
+        entries = self._load()
+        for k in [k for k, e in entries.items() if e["expires"] <= now]:
+            del entries[k]
+        entries[key] = {"result": result, "expires": now + SEARCH_TTL}
+        while len(entries) > MAX_SEARCH_ENTRIES:
+            del entries[min(entries, key=lambda k: entries[k]["expires"])]
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = SEARCH_PATH.with_suffix(".tmp")
+        tmp.write_text(json.dumps(entries))
+        tmp.replace(SEARCH_PATH)
+
+    def get_or_fetch(self, query: str, limit: int, fetch) -> str:
+        """Cached result for (query, limit), else fetch() — shared with any identical call in flight.
+        Exceptions from fetch() are raised to every waiting caller and not cached."""
+        key = self.key(query, limit)
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is not None and entry["expires"] > time.time():
+                self._stats["hits"] += 1
+                return entry["result"]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                try:
+                    if flight.error is None:
+                        self._store(key, flight.result)
+                except Exception as e:  # an unwritable cache must not strand the waiters
+                    print(f"[web_cache] search cache write failed: {e}")
+                finally:
+                    del self._inflight[key]
+                    flight.done.set()
+        return flight.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "entries": len(self._load()), "in_flight": len(self._inflight)}
+
+
+search_cache = SearchCache()
@@ -1,24 +1,290 @@
-"""Shared HTTP utilities."""
+"""Shared HTTP utilities.
 
+Outgoing HTTP goes through one process-wide keep-alive pool, so repeated calls
+to the same host (the discord bot, Brave, docs sites) reuse a connection
+instead of paying TCP/TLS setup each time:
+
+- `pool` — sync pool of http.client connections, at most MAX_PER_HOST live
+  per host. Used by tools, which run in worker threads.
+- `post_json_async` — async adapter for callers on the event loop, backed by
+  one aiohttp session owned by the main loop (same per-host limit), so they
+  no longer occupy a default-executor thread per request.
+
+Both honour the HTTP(S)_PROXY / NO_PROXY environment variables.
+"""
+
+import asyncio
+import base64
+import http.client
 import json
+import ssl
+import threading
+import urllib.parse
 import urllib.request
-import urllib.error
+import uuid
+from collections import defaultdict
+
+MAX_PER_HOST = 6         # live connections per (scheme, host, port)
+IDLE_PER_HOST = 4        # kept open between requests
+CONNECT_WAIT = 30        # seconds to wait for a free per-host slot
+MAX_REDIRECTS = 5
+USER_AGENT = "Zipper/1.0"
+
+_RETRYABLE = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+
+class Response:
+    """Streaming response. Close it (or use `with`) to hand the connection back to the pool."""
+
+    def __init__(self, pool, key, conn, resp, url: str):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._resp = resp
+        self.url = url
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+
+    def read(self, amt: int = None) -> bytes:
+        return self._resp.read(amt)
+
+    def json(self):
+        return json.loads(self.read())
+
+    def close(self):
+        if self._conn is None:
+            return
+        # reusable only if the body was fully consumed and the server keeps the connection
+        reusable = self._resp.isclosed() and not self._resp.will_close
+        if not reusable:
+            self._resp.close()
+            self._conn.close()
+        self._pool._release(self._key, self._conn if reusable else None)
+        self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _proxy_for(scheme: str, host: str) -> tuple | None:
+    """(host, port, Proxy-Authorization value or None) from the *_PROXY environment variables,
+    or None for a direct connection (no proxy set, or host matched by NO_PROXY)."""
+    url = urllib.request.getproxies().get(scheme)
+    if not url or urllib.request.proxy_bypass(host):
+        return None
+    proxy = urllib.parse.urlsplit(url if "://" in url else f"http://{url}")
+    auth = None
+    if proxy.username:
+        credentials = f"{urllib.parse.unquote(proxy.username)}:{urllib.parse.unquote(proxy.password or '')}"
+        auth = "Basic " + base64.b64encode(credentials.encode()).decode()
+    return proxy.hostname, proxy.port or 80, auth
+
+
+class HTTPPool:
+    def __init__(self):
+        self._idle = defaultdict(list)
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(MAX_PER_HOST))
+        self._lock = threading.Lock()
+        self._ssl = ssl.create_default_context()
+
+    def _acquire(self, key, timeout: float):
+        with self._lock:
+            slots = self._slots[key]
+        if not slots.acquire(timeout=CONNECT_WAIT):
+            raise TimeoutError(f"no free connection to {key[1]} after {CONNECT_WAIT}s")
+        with self._lock:
+            idle = self._idle[key]
+            conn = idle.pop() if idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port, proxy = key
+        if proxy is None:
+            if scheme == "https":
+                return http.client.HTTPSConnection(host, port, timeout=timeout, context=self._ssl), False
+            return http.client.HTTPConnection(host, port, timeout=timeout), False
+        proxy_host, proxy_port, auth = proxy
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(proxy_host, proxy_port, timeout=timeout, context=self._ssl)
+            conn.set_tunnel(host, port, headers={"Proxy-Authorization": auth} if auth else None)
+            return conn, False
+        return http.client.HTTPConnection(proxy_host, proxy_port, timeout=timeout), False
+
+    def _release(self, key, conn):
+        if conn is not None:
+            with self._lock:
+                idle = self._idle[key]
+                if len(idle) < IDLE_PER_HOST:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        self._slots[key].release()
+
+    def open(self, method: str, url: str, headers: dict = None, body: bytes = None,
+             timeout: float = 10, follow_redirects: bool = True) -> Response:
+        """Send a request and return the streaming Response (any status; redirects followed)."""
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._send(method, url, headers or {}, body, timeout)
+            location = resp.headers.get("Location")
+            if not (follow_redirects and resp.status in (301, 302, 303, 307, 308) and location):
+                return resp
+            resp.read()
+            resp.close()
+            url = urllib.parse.urljoin(url, location)
+            if resp.status == 303 or (resp.status in (301, 302) and method == "POST"):
+                method, body = "GET", None
+        raise http.client.HTTPException(f"too many redirects (last: {url})")
+
+    def _send(self, method, url, headers, body, timeout) -> Response:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https"):
+            raise ValueError(f"unsupported URL scheme: {parts.scheme or url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        proxy = _proxy_for(parts.scheme, parts.hostname)
+        key = (parts.scheme, parts.hostname, port, proxy)
+        target = parts.path or "/"
+        if parts.query:
+            target += "?" + parts.query
+        headers = {"User-Agent": USER_AGENT, **headers}
+        if proxy is not None and parts.scheme == "http":
+            target = f"http://{parts.netloc.rpartition('@')[2]}{target}"  # plain HTTP proxies take the absolute URL
+            if proxy[2]:
+                headers["Proxy-Authorization"] = proxy[2]
+
+        conn, reused = self._acquire(key, timeout)
+        try:
+            try:
+                conn.request(method, target, body=body, headers=headers)
+                resp = conn.getresponse()
+            except _RETRYABLE:
+                if not reused:
+                    raise
+                # the server closed an idle keep-alive connection; retry once on a fresh one
+                conn.close()
+                conn.request(method, target, body=body, headers=headers)
+                resp = conn.getresponse()
+        except BaseException:
+            conn.close()
+            self._release(key, None)
+            raise
+        return Response(self, key, conn, resp, url)
+
+    def request(self, method: str, url: str, headers: dict = None, body: bytes = None,
+                timeout: float = 10) -> tuple[int, object, bytes]:
+        """Send a request and read the whole body: (status, headers, body)."""
+        with self.open(method, url, headers, body, timeout) as resp:
+            return resp.status, resp.headers, resp.read()
+
+
+pool = HTTPPool()
+
+
+def _json_result(status: int, reason: str, raw: bytes) -> dict:
+    if status >= 400:
+        body = raw.decode("utf-8", errors="replace").strip()
+        return {"error": f"HTTP {status}: {body or reason}"}
+    return json.loads(raw)
 
 
 def post_json(url: str, data: dict, timeout: int = 10) -> dict:
     """POST JSON to url, return parsed response dict."""
-    payload = json.dumps(data).encode()
-    req = urllib.request.Request(
-        url,
-        data=payload,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
     try:
-        with urllib.request.urlopen(req, timeout=timeout) as r:
-            return json.loads(r.read())
-    except urllib.error.HTTPError as e:
-        body = e.read().decode("utf-8", errors="replace").strip()
-        return {"error": f"HTTP {e.code}: {body}"}
+        with pool.open("POST", url, {"Content-Type": "application/json"}, json.dumps(data).encode(), timeout) as r:
+            return _json_result(r.status, r.reason, r.read())
     except Exception as e:
         return {"error": str(e)}
+
+
+def _form_quote(value) -> str:
+    """Escape a Content-Disposition name/filename the way browsers do, so quotes and newlines
+    in it cannot end the parameter or inject headers."""
+    return str(value).replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+def post_multipart(url: str, files: dict, data: dict = None, timeout: int = 60) -> dict:
+    """POST multipart/form-data. files maps field -> (filename, bytes)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in (data or {}).items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{_form_quote(name)}"\r\n\r\n{value}\r\n'.encode()
+        )
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{_form_quote(name)}"; '
+            f'filename="{_form_quote(filename)}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+        )
+    parts.append(f"--{boundary}--\r\n".encode())
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    try:
+        with pool.open("POST", url, headers, b"".join(parts), timeout) as r:
+            return _json_result(r.status, r.reason, r.read())
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# --- async adapter ---
+
+_shared = None  # (event loop, aiohttp session): the session owned by the process's main loop
+
+
+def _new_session():
+    import aiohttp
+
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_PER_HOST, keepalive_timeout=30)
+    # trust_env: honour HTTP(S)_PROXY / NO_PROXY like the sync pool
+    return aiohttp.ClientSession(connector=connector, headers={"User-Agent": USER_AGENT}, trust_env=True)
+
+
+def _session():
+    """The shared aiohttp session if this loop owns it (the first loop to ask does, until it closes),
+    else None: callers on other, short-lived loops use a session of their own for the call."""
+    global _shared
+    loop = asyncio.get_running_loop()
+    if _shared is None or _shared[0].is_closed():
+        _shared = (loop, _new_session())
+    owner, session = _shared
+    if owner is not loop:
+        return None
+    if session.closed:
+        session = _new_session()
+        _shared = (loop, session)
+    return session
+
+
+async def post_json_async(url: str, data: dict, timeout: int = 10) -> dict:
+    """POST JSON to url from the event loop, return parsed response dict."""
+    try:
+        import aiohttp
+    except ImportError:
+        return await asyncio.to_thread(post_json, url, data, timeout)
+
+    async def post(session) -> dict:
+        async with session.post(url, json=data, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            return _json_result(r.status, r.reason or "", await r.read())
+
+    try:
+        session = _session()
+        if session is not None:
+            return await post(session)
+        async with _new_session() as session:
+            return await post(session)
+    except Exception as e:
+        return {"error": str(e) or type(e).__name__}
+
+
+async def close_sessions():
+    """Close the shared aiohttp session if this loop owns it (call on shutdown)."""
+    global _shared
+    if _shared is not None and _shared[0] is asyncio.get_running_loop():
+        session = _shared[1]
+        _shared = None
+        await session.close()
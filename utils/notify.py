@@ -1,9 +1,7 @@
 """Shared notification utilities."""
 
-import asyncio
-
 from utils.constants import BOT_URL
-from utils.http_utils import post_json
+from utils.http_utils import post_json, post_json_async
 
 
 def notify_discord(message: str, thread_id: int = None):
@@ -18,5 +16,9 @@ def notify_discord(message: str, thread_id: int = None):
 
 async def notify_discord_async(message: str, thread_id: int = None):
     """Send a message to Discord via the bot endpoint (async)."""
-    loop = asyncio.get_event_loop()
-    await loop.run_in_executor(None, notify_discord, message, thread_id)
+    body = {"message": message}
+    if thread_id:
+        body["thread_id"] = thread_id
+    result = await post_json_async(f"{BOT_URL}/send", body)
+    if "error" in result:
+        print(f"[utils] failed to notify discord: {result['error']}")